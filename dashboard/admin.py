@@ -1,8 +1,12 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin as DefaultUserAdmin
-from django.utils.safestring import mark_safe
-from .models import HomePage, PortalPage, Course, Enrollment, Grade, Transaction, LibraryItem, Event, Profile, FAQ
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from .models import HomePage, PortalPage, PortalSection, Course, Enrollment, Grade, Transaction, LibraryItem, Event, Profile, FAQ, StudentLedger, ImportRun, ProfilingSession, ProfileCapture, GeneratedDocument, DocumentBatch, Job, Roster
+from . import images, jobs, profiling, provisioning
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
 # ===== Inline Admins for User =====
@@ -42,24 +46,25 @@ class HomePageAdmin(admin.ModelAdmin):
 
     def preview_background(self, obj):
         if obj.background_image:
-            return mark_safe(f'<img src="{obj.background_image.url}" style="max-height:100px;">')
+            return images.picture_html(obj.background_image, 'hero', sizes='180px', style='max-height:100px; width:auto;')
         return "No image"
     preview_background.short_description = "Background Preview"
 
 # ===== PortalPage Admin =====
+class PortalSectionInline(admin.StackedInline):
+    model = PortalSection
+    extra = 0
+
 @admin.register(PortalPage)
 class PortalPageAdmin(admin.ModelAdmin):
     list_display = ('page_key', 'heading')
-    search_fields = (
-        'heading', 'main_content', 'courses_content', 'grades_content',
-        'finance_content', 'library_content', 'events_content',
-        'help_content', 'profile_content'
-    )
+    search_fields = ('heading', 'sections__content')
+    inlines = [PortalSectionInline]
 
 # ===== Course Admin =====
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ('code', 'name')
+    list_display = ('code', 'name', 'credit_units')
     search_fields = ('code', 'name')
     ordering = ('code',)
 
@@ -94,6 +99,7 @@ class LibraryItemAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'date_added')
     search_fields = ('title', 'author', 'description')
     list_filter = ('date_added',)
+    readonly_fields = ('pdf_size', 'pdf_sha256')
     
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
@@ -111,7 +117,7 @@ class ProfileInline(admin.StackedInline):
 
     def profile_picture_preview(self, obj):
         if obj.profile_picture:
-            return mark_safe(f'<img src="{obj.profile_picture.url}" style="max-height:80px; border-radius:50%;">')
+            return images.picture_html(obj.profile_picture, 'thumb', sizes='80px', width=80, height=80, style='object-fit:cover; border-radius:50%;')
         return "No image"
     profile_picture_preview.short_description = "Profile Picture"
 
@@ -133,7 +139,7 @@ class ProfileAdmin(admin.ModelAdmin):
 
     def profile_picture_preview(self, obj):
         if obj.profile_picture:
-            return mark_safe(f'<img src="{obj.profile_picture.url}" style="max-height:50px; border-radius:50%;">')
+            return images.picture_html(obj.profile_picture, 'thumb', sizes='50px', width=50, height=50, style='object-fit:cover; border-radius:50%;')
         return "No image"
     profile_picture_preview.short_description = "Profile Picture"
 
@@ -142,4 +148,180 @@ class ProfileAdmin(admin.ModelAdmin):
 class FAQAdmin(admin.ModelAdmin):
     list_display = ('question', 'category')
     search_fields = ('question', 'answer')
-    
\ No newline at end of file
+
+
+# ===== Student Ledger Admin (maintained automatically from transactions) =====
+@admin.register(StudentLedger)
+class StudentLedgerAdmin(admin.ModelAdmin):
+    list_display = ('student', 'balance', 'total_debit', 'total_credit', 'transaction_count', 'updated_at')
+    search_fields = ('student__username',)
+    readonly_fields = ('student', 'balance', 'total_debit', 'total_credit', 'transaction_count', 'updated_at')
+    list_select_related = ('student',)
+
+    def has_add_permission(self, request):
+        return False
+
+
+# ===== Bulk imports (run from the import page or the import_records command) =====
+@admin.register(ImportRun)
+class ImportRunAdmin(admin.ModelAdmin):
+    list_display = ('source', 'kind', 'status', 'dry_run', 'rows_processed', 'created_count',
+                    'updated_count', 'error_count', 'started_by', 'started_at')
+    list_filter = ('kind', 'status', 'dry_run')
+    search_fields = ('source', 'checksum')
+    list_select_related = ('started_by',)
+    readonly_fields = [field.name for field in ImportRun._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+# ===== Intake rosters (see dashboard/provisioning.py; also the provision_students command) =====
+@admin.register(Roster)
+class RosterAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'rows_processed', 'created_count', 'error_count', 'uploaded_by', 'created_at',
+                    'finished_at')
+    list_filter = ('status',)
+    search_fields = ('name',)
+    list_select_related = ('uploaded_by',)
+    fields = ('name', 'file', 'status', 'rows_processed', 'created_count', 'error_count', 'errors', 'failure',
+              'uploaded_by', 'created_at', 'finished_at', 'credentials_taken_at')
+    readonly_fields = ('status', 'rows_processed', 'created_count', 'error_count', 'errors', 'failure',
+                       'uploaded_by', 'created_at', 'finished_at', 'credentials_taken_at')
+    actions = ['provision', 'download_credentials']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.uploaded_by = request.user
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description="Create the accounts on the selected rosters")
+    def provision(self, request, queryset):
+        count = 0
+        for roster in queryset.filter(status__in=('uploaded', 'failed')).exclude(file=''):
+            Roster.objects.filter(pk=roster.pk).update(status='queued')
+            jobs.enqueue('accounts.provision', roster.pk, dedupe_key=f'accounts.provision:{roster.pk}')
+            count += 1
+        self.message_user(request, f"Queued {count} rosters; refresh to follow their progress.", messages.SUCCESS)
+
+    def has_credentials_permission(self, request):
+        return request.user.is_superuser
+
+    @admin.action(permissions=['credentials'],
+                  description="Download the initial passwords of the selected rosters (CSV, once)")
+    def download_credentials(self, request, queryset):
+        # Not while running: the provisioning job still appends to them
+        report = provisioning.take_credentials(queryset.filter(status__in=('finished', 'failed')))
+        if report is None:
+            self.message_user(request, "None of the selected finished rosters has passwords left to download; "
+                                       "they are handed out only once.", messages.WARNING)
+            return None
+        response = HttpResponse(report, content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="credentials.csv"'
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+# ===== Live request profiling (see dashboard/profiling.py) =====
+class ProfileCaptureInline(admin.TabularInline):
+    model = ProfileCapture
+    fields = ('path', 'duration_ms', 'samples', 'captured_at')
+    readonly_fields = fields
+    extra = 0
+    max_num = 0
+    can_delete = False
+    ordering = ('-duration_ms',)
+    show_change_link = False
+
+
+@admin.register(ProfilingSession)
+class ProfilingSessionAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'mode', 'route', 'sample_rate', 'min_duration_ms', 'captured', 'max_captures',
+                    'active', 'started_by')
+    list_filter = ('mode', 'active')
+    list_select_related = ('started_by',)
+    readonly_fields = ('captured', 'started_by', 'started_at', 'stopped_at')
+    inlines = [ProfileCaptureInline]
+    actions = ['stop_sessions', 'download_profile']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.started_by = request.user
+        if obj.active:
+            # One session at a time: starting this one stops the others
+            ProfilingSession.objects.filter(active=True).exclude(pk=obj.pk).update(active=False, stopped_at=timezone.now())
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description="Stop the selected sessions")
+    def stop_sessions(self, request, queryset):
+        for session in queryset.filter(active=True):
+            profiling.stop(session)
+
+    @admin.action(description="Download the merged profile (one session)")
+    def download_profile(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one session to download.", messages.WARNING)
+            return None
+        session = queryset.get()
+        if session.mode == 'cprofile':
+            content, name = profiling.merged_stats(session), f'profile-{session.pk}.prof'
+        else:
+            content, name = profiling.merged_stacks(session), f'profile-{session.pk}.folded'
+        if not content:
+            self.message_user(request, "This session has not captured any requests yet.", messages.WARNING)
+            return None
+        response = HttpResponse(content, content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        return response
+
+
+# ===== PDF documents (see dashboard/documents.py) =====
+@admin.register(GeneratedDocument)
+class GeneratedDocumentAdmin(admin.ModelAdmin):
+    list_display = ('student', 'kind', 'status', 'size', 'requested_at', 'rendered_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('student__username', 'content_hash')
+    list_select_related = ('student',)
+    readonly_fields = [field.name for field in GeneratedDocument._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(DocumentBatch)
+class DocumentBatchAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'done', 'total', 'rendered', 'unchanged', 'failed', 'workers',
+                    'started_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = [field.name for field in DocumentBatch._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+# ===== Job queue (see dashboard/jobs.py; depth and latency on the job queue page) =====
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'priority', 'attempts', 'max_attempts', 'run_at', 'started_at',
+                    'finished_at', 'error_summary')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'dedupe_key')
+    readonly_fields = [field.name for field in Job._meta.fields]
+    actions = ['run_again']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Run the selected jobs again now")
+    def run_again(self, request, queryset):
+        count = 0
+        for job in queryset.exclude(status__in=('queued', 'running')):
+            try:
+                with transaction.atomic():
+                    Job.objects.filter(pk=job.pk).update(
+                        status='queued', run_at=timezone.now(), attempts=0, finished_at=None)
+                count += 1
+            except IntegrityError:
+                pass  # The same work is already queued
+        self.message_user(request, f"Queued {count} jobs again.", messages.SUCCESS)
+
@@ -0,0 +1,222 @@
+"""
+Grade analytics on the 4-point scale.
+
+Letter grades map to points through ``GRADE_POINTS`` and are weighted by
+``Course.credit_units``; anything else in ``Grade.grade`` (e.g. "I" for
+incomplete) is counted in the distributions but left out of averages.
+
+Grades are loaded in bulk into NumPy arrays, one element per grade and no
+model instances, and every result comes from a few vectorized passes:
+
+- per student, the CGPA over all graded courses and a GPA per term (the
+  term of the enrollment date for the same course, as in dashboard.ledger);
+- per course, the letter distribution and the mean and percentiles of the
+  grade points.
+
+The results are stored in ``StudentGPA`` and ``CourseGradeSummary``. Grade
+signal handlers call ``refresh`` with the students and courses a change
+touches, so only those rows are recomputed; ``rebuild`` recomputes
+everything after bulk loads, and ``grade_report`` builds faculty reports
+straight from the Grade table.
+"""
+import datetime
+from dataclasses import dataclass
+
+import numpy as np
+from django.db import connection, transaction as db_transaction
+from django.db.models import OuterRef, Subquery
+
+from .ledger import term_for_date
+from .models import Enrollment, Grade, StudentGPA, CourseGradeSummary
+
+
+GRADE_POINTS = {
+    'A': 4.0, 'A-': 3.7,
+    'B+': 3.3, 'B': 3.0, 'B-': 2.7,
+    'C+': 2.3, 'C': 2.0, 'C-': 1.7,
+    'D+': 1.3, 'D': 1.0, 'D-': 0.7,
+    'F': 0.0,
+}
+PERCENTILES = (25, 50, 75, 90)
+
+
+@dataclass
+class GradeArrays:
+    """Grades as parallel arrays, one element per Grade row."""
+    student: np.ndarray  # Student ids
+    course: np.ndarray  # Course ids
+    letter: np.ndarray  # Index into ``letters``
+    letters: list  # Distinct letters, upper-cased
+    points: np.ndarray  # Grade points, NaN for letters not in GRADE_POINTS
+    credits: np.ndarray  # The course's credit units
+    term: np.ndarray  # Index into ``terms``, -1 without a matching enrollment
+    terms: list  # Distinct terms, in order
+
+    def __len__(self):
+        return len(self.student)
+
+
+def load_grades(student_ids=None, course_ids=None):
+    """Load every grade, or those of the given students or courses, as ``GradeArrays``."""
+    enrolled = Enrollment.objects.filter(
+        student_id=OuterRef('student_id'), course_id=OuterRef('course_id')
+    ).order_by('date_enrolled').values('date_enrolled')[:1]
+    rows = Grade.objects.order_by()
+    if student_ids is not None:
+        rows = rows.filter(student_id__in=student_ids)
+    if course_ids is not None:
+        rows = rows.filter(course_id__in=course_ids)
+    rows = rows.annotate(enrolled=Subquery(enrolled)).values_list(
+        'student_id', 'course_id', 'grade', 'course__credit_units', 'enrolled'
+    )
+    # Straight from the cursor: the ORM's per-row converters cost more than
+    # the query. Dates may then be strings; only the distinct ones are parsed.
+    sql, params = rows.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    students, courses, grades, credits, dates = zip(*rows) if rows else ((),) * 5
+
+    # Distinct raw letters first, so only those are cleaned up
+    raw_letters, letter = np.unique(np.array(grades, dtype='U2'), return_inverse=True)
+    letters, cleaned = np.unique(np.char.upper(np.char.strip(raw_letters)), return_inverse=True)
+    letter = cleaned[letter]
+    letters = letters.tolist()
+    points_by_letter = np.array([GRADE_POINTS.get(code, np.nan) for code in letters], dtype=np.float64)
+
+    term_of_date = {
+        day: term_for_date(day if isinstance(day, datetime.date) else datetime.date.fromisoformat(day))
+        for day in set(dates) if day is not None
+    }
+    terms = sorted(set(term_of_date.values()))
+    term_index = {term: index for index, term in enumerate(terms)}
+    term = np.fromiter((term_index[term_of_date[day]] if day is not None else -1 for day in dates),
+                       dtype=np.int64, count=len(dates))
+
+    return GradeArrays(
+        student=np.array(students, dtype=np.int64),
+        course=np.array(courses, dtype=np.int64),
+        letter=letter.astype(np.int64),
+        letters=letters,
+        points=points_by_letter[letter],
+        credits=np.array(credits, dtype=np.float64),
+        term=term,
+        terms=terms,
+    )
+
+
+def _ratio(numerator, denominator):
+    # bincount of an empty selection comes back as integers
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+
+
+def grouped_percentile(values, starts, counts, p):
+    """Percentile ``p`` (linear interpolation, as ``np.percentile``) of every group of ``values``.
+
+    ``values`` is sorted within each group; group ``i`` is
+    ``values[starts[i]:starts[i] + counts[i]]``. Empty groups give 0.
+    """
+    if not len(values):
+        return np.zeros(len(counts))
+    position = starts + np.maximum(counts - 1, 0) * (p / 100)
+    low = np.minimum(np.floor(position).astype(np.int64), len(values) - 1)
+    high = np.minimum(np.ceil(position).astype(np.int64), len(values) - 1)
+    result = values[low] + (values[high] - values[low]) * (position - low)
+    return np.where(counts > 0, result, 0.0)
+
+
+def student_results(grades):
+    """``{student_id: (cgpa, credit_units, quality_points, terms)}`` for every student in ``grades``."""
+    students, student = np.unique(grades.student, return_inverse=True)
+    graded = ~np.isnan(grades.points)
+    credits = np.where(graded, grades.credits, 0.0)
+    quality = np.where(graded, grades.points, 0.0) * credits
+    total_credits = np.bincount(student, weights=credits, minlength=len(students))
+    total_quality = np.bincount(student, weights=quality, minlength=len(students))
+    cgpa = _ratio(total_quality, total_credits)
+
+    # One bin per (student, term) pair that has a graded course
+    in_term = graded & (grades.term >= 0)
+    term_count = max(len(grades.terms), 1)
+    pairs, pair = np.unique(student[in_term] * term_count + grades.term[in_term], return_inverse=True)
+    pair_credits = np.bincount(pair, weights=credits[in_term], minlength=len(pairs))
+    pair_gpa = _ratio(np.bincount(pair, weights=quality[in_term], minlength=len(pairs)), pair_credits)
+    terms = [[] for _ in range(len(students))]
+    for key, gpa, units in zip(pairs.tolist(), pair_gpa.tolist(), pair_credits.tolist()):
+        terms[key // term_count].append({
+            'term': grades.terms[key % term_count], 'gpa': round(gpa, 2), 'credit_units': int(units),
+        })
+
+    return {
+        student_id: (gpa, int(units), points, student_terms)
+        for student_id, gpa, units, points, student_terms in zip(
+            students.tolist(), cgpa.tolist(), total_credits.tolist(), total_quality.tolist(), terms)
+    }
+
+
+def course_results(grades):
+    """``{course_id: {...}}`` with the fields of ``CourseGradeSummary`` for every course in ``grades``."""
+    courses, course = np.unique(grades.course, return_inverse=True)
+    letter_count = len(grades.letters)
+    distribution = np.bincount(
+        course * letter_count + grades.letter, minlength=len(courses) * letter_count
+    ).reshape(len(courses), letter_count)
+
+    graded = ~np.isnan(grades.points)
+    graded_course, points = course[graded], grades.points[graded]
+    sorted_points = points[np.lexsort((points, graded_course))]
+    counts = np.bincount(graded_course, minlength=len(courses))
+    starts = np.cumsum(counts) - counts
+    means = _ratio(np.bincount(graded_course, weights=points, minlength=len(courses)), counts)
+    p25, median, p75, p90 = (grouped_percentile(sorted_points, starts, counts, p).tolist() for p in PERCENTILES)
+
+    return {
+        course_id: {
+            'graded_count': int(counts[i]),
+            'mean_points': means[i].item(),
+            'p25_points': p25[i],
+            'median_points': median[i],
+            'p75_points': p75[i],
+            'p90_points': p90[i],
+            'distribution': {grades.letters[j]: int(n) for j, n in enumerate(distribution[i].tolist()) if n},
+        }
+        for i, course_id in enumerate(courses.tolist())
+    }
+
+
+def _store_students(grades, student_ids=None):
+    rows = StudentGPA.objects.all()
+    if student_ids is not None:
+        rows = rows.filter(student_id__in=student_ids)
+    rows.delete()
+    return len(StudentGPA.objects.bulk_create([
+        StudentGPA(student_id=student_id, cgpa=cgpa, credit_units=units, quality_points=points, terms=terms)
+        for student_id, (cgpa, units, points, terms) in student_results(grades).items()
+    ], batch_size=1000))
+
+
+def _store_courses(grades, course_ids=None):
+    rows = CourseGradeSummary.objects.all()
+    if course_ids is not None:
+        rows = rows.filter(course_id__in=course_ids)
+    rows.delete()
+    return len(CourseGradeSummary.objects.bulk_create([
+        CourseGradeSummary(course_id=course_id, **fields) for course_id, fields in course_results(grades).items()
+    ], batch_size=1000))
+
+
+def refresh(student_ids=(), course_ids=()):
+    """Recompute the stored results of these students and courses from their grades."""
+    student_ids, course_ids = set(student_ids), set(course_ids)
+    with db_transaction.atomic():
+        if student_ids:
+            _store_students(load_grades(student_ids=student_ids), student_ids)
+        if course_ids:
+            _store_courses(load_grades(course_ids=course_ids), course_ids)
+
+
+def rebuild():
+    """Recompute every stored result; return the number of students and courses with grades."""
+    grades = load_grades()
+    with db_transaction.atomic():
+        return _store_students(grades), _store_courses(grades)
@@ -5,4 +5,5 @@ class DashboardConfig(AppConfig):
     name = 'dashboard'
 
     def ready(self):
-        import dashboard.signals
\ No newline at end of file
+        import dashboard.signals
+        import dashboard.tasks
\ No newline at end of file
@@ -0,0 +1,12 @@
+"""
+The dashboard's URLs with the read-only pages served by dashboard.async_views.
+
+Included instead of dashboard.urls when ``settings.PORTAL_ASYNC_VIEWS`` is on.
+"""
+from . import async_views
+from .urls import build_urlpatterns
+
+
+app_name = 'dashboard'
+
+urlpatterns = build_urlpatterns(async_views)
@@ -0,0 +1,88 @@
+"""
+Async versions of the read-only portal and admin views.
+
+Routed through dashboard/async_urls.py instead of their counterparts in
+views.py when ``settings.PORTAL_ASYNC_VIEWS`` is on and the site is served
+through ``university_portal.asgi``. Independent queries run concurrently
+through ``run_concurrently``; templates are rendered in the request's sync
+thread because they may still touch the ORM. Forms (register, profile)
+stay synchronous.
+
+The views carry the same ``@query_budget`` as their sync versions. Only
+queries run on the request's own thread are counted, so work handed to
+``run_concurrently`` is not; the budgets are upper bounds either way.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.http import Http404
+from django.shortcuts import render
+
+from .models import PortalPage, FAQ
+from .read_models import QUERY_BUDGETS, StudentPortal
+from .conditional import conditional_page
+from .concurrency import run_concurrently
+from .instrumentation import query_budget
+from .response_cache import cache_portal_tab
+from .views import admin_dashboard_context, course_enrollment_counts, grade_distribution
+from . import cache, stats
+
+
+async def _render(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@query_budget(5)
+@conditional_page('home')
+async def home(request):
+    home_page, pages = await run_concurrently(cache.home_page, cache.portal_nav_pages)
+    return await _render(request, 'dashboard/home.html', {'home_page': home_page, 'pages': pages})
+
+
+@query_budget(QUERY_BUDGETS)
+@login_required
+@conditional_page()
+@cache_portal_tab()
+async def portal_page(request, page_key):
+    portal = StudentPortal(await request.auser())
+    page, tab = await run_concurrently(
+        lambda: PortalPage.objects.filter(page_key=page_key).first(),
+        lambda: portal.tab_context(page_key, request.GET),
+    )
+    if page is None:
+        raise Http404('No PortalPage matches the given query.')
+    return await _render(request, 'dashboard/page.html', {'page': page, **tab})
+
+
+@login_required
+@conditional_page('landing')
+async def portal_landing(request):
+    pages = await sync_to_async(cache.portal_nav_pages)()
+    return await _render(request, 'dashboard/portal_landing.html', {'pages': pages})
+
+
+@query_budget(6)
+@staff_member_required
+async def admin_dashboard(request):
+    snapshot, courses, grades = await run_concurrently(stats.snapshot, course_enrollment_counts, grade_distribution)
+    return await _render(request, 'dashboard/admin_dashboard.html', admin_dashboard_context(snapshot, courses, grades))
+
+
+@query_budget(QUERY_BUDGETS['help'])
+@login_required
+@conditional_page('help')
+async def help_page(request):
+    portal = StudentPortal(await request.auser())
+    page, faqs = await run_concurrently(
+        lambda: PortalPage.objects.filter(page_key='help').first(),
+        lambda: portal.faqs(request.GET),
+    )
+    if page is None:
+        raise Http404('No PortalPage matches the given query.')
+    return await _render(request, 'dashboard/help.html', {
+        'page': page,
+        'faqs': faqs,
+        'search_query': request.GET.get('search', ''),
+        'category_filter': request.GET.get('category', ''),
+        'categories': FAQ.CATEGORY_CHOICES,
+    })
@@ -0,0 +1,291 @@
+"""
+Latency benchmark for every dashboard URL.
+
+``run`` requests each route in dashboard/urls.py from several concurrent
+sessions, either in-process through Django's test client or over HTTP
+against a running server, and reports latency percentiles, throughput and,
+in-process, the SQL query count, database writes and database time per
+request. Students come from ``generate_dataset``; staff-only pages are
+requested as a staff user. ``run_logins`` measures the login form the same
+way, which shows what every sign-in writes.
+
+Results are plain dicts so they can be saved as JSON; ``compare`` checks a
+run against a saved baseline and lists the routes that got slower or run
+more queries.
+"""
+import http.cookiejar
+import math
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from .models import PortalPage
+from . import response_cache
+
+
+# Views behind staff_member_required
+STAFF_ROUTES = {'admin_dashboard', 'import_records', 'query_report', 'job_queue'}
+# POST-only or side-effecting routes
+SKIPPED_ROUTES = {'logout'}
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str
+    path: str
+    staff: bool = False
+
+
+def discover_routes():
+    """Return a Route for every GET-able pattern in dashboard/urls.py, one per page key where needed."""
+    from . import urls
+
+    page_keys = list(PortalPage.objects.order_by('page_key').values_list('page_key', flat=True))
+    routes, seen = [], set()
+    for pattern in urls.urlpatterns:
+        name = pattern.name
+        if name in SKIPPED_ROUTES:
+            continue
+        converters = set(pattern.pattern.converters)
+        if converters == {'page_key'}:
+            candidates = [(f'{name}[{key}]', reverse(f'dashboard:{name}', kwargs={'page_key': key})) for key in page_keys]
+        elif converters or '<' in str(pattern.pattern):
+            continue  # Other parameters, or a malformed route
+        else:
+            candidates = [(name, reverse(f'dashboard:{name}'))]
+        for label, path in candidates:
+            if path not in seen:
+                seen.add(path)
+                routes.append(Route(label, path, staff=name in STAFF_ROUTES))
+    return routes
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty sorted list."""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(samples, elapsed):
+    """Aggregate ``(seconds, status, queries, db_seconds, writes)`` samples of one route."""
+    latencies = sorted(sample[0] for sample in samples)
+    errors = sum(1 for sample in samples if sample[1] >= 400)
+    measured = [sample for sample in samples if sample[2] is not None]
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'queries_mean': None,
+        'writes_mean': None,
+        'db_ms_mean': None,
+    }
+    if measured:
+        summary['queries_mean'] = round(sum(sample[2] for sample in measured) / len(measured), 2)
+        summary['writes_mean'] = round(sum(sample[4] for sample in measured) / len(measured), 2)
+        summary['db_ms_mean'] = round(sum(sample[3] for sample in measured) / len(measured) * 1000, 3)
+    return summary
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` that counts queries, the writes among them, and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.writes = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.writes += sql.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE')
+            self.seconds += time.perf_counter() - started
+
+
+class ClientSession:
+    """One logged-in browser, served in-process by the test client."""
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def get(self, path):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.client.get(path)
+        return time.perf_counter() - started, response.status_code, recorder.count, recorder.seconds, recorder.writes
+
+    def close(self):
+        connections.close_all()  # This thread's connections; the thread is about to end
+
+
+class HttpSession:
+    """One logged-in browser talking to a running server."""
+
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        login_url = self.base_url + reverse('dashboard:login')
+        self.opener.open(login_url).read()
+        token = next((cookie.value for cookie in self.cookies if cookie.name == settings.CSRF_COOKIE_NAME), '')
+        data = urllib.parse.urlencode({'username': username, 'password': password, 'csrfmiddlewaretoken': token})
+        request = urllib.request.Request(login_url, data=data.encode(), headers={'Referer': login_url})
+        self.opener.open(request).read()
+        if not any(cookie.name == settings.SESSION_COOKIE_NAME for cookie in self.cookies):
+            raise ValueError(f"Could not log in as {username!r} at {login_url}.")
+
+    def get(self, path):
+        started = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + path) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as exc:
+            status = exc.code
+        return time.perf_counter() - started, status, None, None, None
+
+    def close(self):
+        pass
+
+
+def login(username, password):
+    """Sign in through the login form in a new test client session; return a sample like ``ClientSession.get``."""
+    client = Client()
+    recorder = QueryRecorder()
+    started = time.perf_counter()
+    with connection.execute_wrapper(recorder):
+        response = client.post(reverse('dashboard:login'), {'username': username, 'password': password})
+    # The form is shown again when the credentials are refused
+    status = 401 if response.status_code == 200 else response.status_code
+    return time.perf_counter() - started, status, recorder.count, recorder.seconds, recorder.writes
+
+
+def run(routes, students, staff=None, requests_per_route=50, concurrency=4, base_url=None, password=None,
+        staff_password=None, cold=False):
+    """Benchmark ``routes`` and return the results as a JSON-ready dict.
+
+    ``students`` are the users the sessions log in as (one per concurrent
+    session, reused round-robin); staff routes need ``staff``. Without
+    ``base_url`` requests go through the test client in this process; with
+    it, they go over HTTP and need the users' passwords. ``cold`` empties
+    the response cache before every in-process request.
+    """
+    def session_for(user, user_password):
+        if base_url:
+            return HttpSession(base_url, user.username, user_password)
+        return ClientSession(user)
+
+    def worker(session, route, count):
+        try:
+            samples = []
+            started = time.perf_counter()
+            for _ in range(count):
+                if cold and not base_url:
+                    response_cache.responses.clear()
+                samples.append(session.get(route.path))
+            return started, time.perf_counter(), samples
+        finally:
+            session.close()
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for route in routes:
+            if route.staff and staff is None:
+                continue
+            shares = [requests_per_route // concurrency + (i < requests_per_route % concurrency)
+                      for i in range(concurrency)]
+            # Log in one session at a time: logins write, and SQLite takes one writer at a time
+            sessions = [
+                session_for(staff, staff_password) if route.staff else session_for(students[i % len(students)], password)
+                for i, share in enumerate(shares) if share
+            ]
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                futures = [pool.submit(worker, session, route, share)
+                           for session, share in zip(sessions, filter(None, shares))]
+                outcomes = [future.result() for future in futures]
+            samples = [sample for _, _, worker_samples in outcomes for sample in worker_samples]
+            elapsed = max(end for _, end, _ in outcomes) - min(start for start, _, _ in outcomes)
+            results[route.name] = {'path': route.path, **summarize(samples, elapsed)}
+
+    return results_dict(results, base_url or 'test client', requests_per_route, concurrency, cold)
+
+
+def run_logins(students, password, logins=200, concurrency=4):
+    """Sign in ``logins`` times from ``concurrency`` threads, cycling through ``students``.
+
+    Each login is a new session posting the login form in-process. The
+    results are those of a route named ``login``, so they are reported,
+    saved and compared like any other run.
+    """
+    def worker(offset, count):
+        try:
+            started = time.perf_counter()
+            samples = [login(students[(offset + i * concurrency) % len(students)].username, password)
+                       for i in range(count)]
+            return started, time.perf_counter(), samples
+        finally:
+            connections.close_all()
+
+    shares = [logins // concurrency + (i < logins % concurrency) for i in range(concurrency)]
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(worker, offset, share) for offset, share in enumerate(shares) if share]
+            outcomes = [future.result() for future in futures]
+    samples = [sample for _, _, worker_samples in outcomes for sample in worker_samples]
+    elapsed = max(end for _, end, _ in outcomes) - min(start for start, _, _ in outcomes)
+    results = {'login': {'path': reverse('dashboard:login'), **summarize(samples, elapsed)}}
+    return results_dict(results, 'test client', logins, concurrency, False)
+
+
+def results_dict(routes, target, requests_per_route, concurrency, cold):
+    return {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'target': target,
+        'release': settings.PORTAL_RELEASE,
+        'database': connection.vendor,
+        'requests_per_route': requests_per_route,
+        'concurrency': concurrency,
+        'cold': cold,
+        'routes': routes,
+    }
+
+
+def compare(current, baseline, threshold=0.2, min_delta_ms=2.0):
+    """Return one message per route that regressed against ``baseline``.
+
+    A route regresses when its p95 latency grows by more than ``threshold``
+    (a fraction) and at least ``min_delta_ms``, when it makes more queries
+    or writes, or when it starts failing.
+    """
+    problems = []
+    for name, now in current['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if before is None:
+            continue
+        if now['p95_ms'] > before['p95_ms'] * (1 + threshold) and now['p95_ms'] - before['p95_ms'] >= min_delta_ms:
+            problems.append(f"{name}: p95 {before['p95_ms']:.1f} ms -> {now['p95_ms']:.1f} ms")
+        if now['queries_mean'] is not None and before.get('queries_mean') is not None \
+                and now['queries_mean'] > before['queries_mean']:
+            problems.append(f"{name}: {before['queries_mean']:g} -> {now['queries_mean']:g} queries per request")
+        if now.get('writes_mean') is not None and before.get('writes_mean') is not None \
+                and now['writes_mean'] > before['writes_mean']:
+            problems.append(f"{name}: {before['writes_mean']:g} -> {now['writes_mean']:g} writes per request")
+        if now['errors'] > before.get('errors', 0):
+            problems.append(f"{name}: {now['errors']} failed requests (was {before.get('errors', 0)})")
+    return problems
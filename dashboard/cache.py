@@ -0,0 +1,90 @@
+"""
+Process-local caches with cross-process invalidation.
+
+Each gunicorn worker keeps its own copy of rarely changing data (the navbar
+pages, the home page) in memory. A ``VersionStamp`` file shared by all
+workers on the box holds a random token that is replaced whenever the data
+changes; every lookup compares the token with the one the local copy was
+built under, so stale entries are dropped by the next request in every
+worker. No cache service is needed: this works with ``settings.CACHES``
+unset.
+"""
+import os
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+
+from .models import HomePage, PortalPage
+
+
+class VersionStamp:
+    """A token shared by all worker processes, replaced whenever the data it guards changes."""
+
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def path(self):
+        return Path(settings.PORTAL_CACHE_DIR) / f'{self.name}.version'
+
+    def read(self):
+        try:
+            return self.path.read_text()
+        except FileNotFoundError:
+            return ''
+
+    def bump(self):
+        # A fresh random token rather than a counter, so two concurrent bumps
+        # can never leave the stamp at a value a reader has already seen.
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f'.{self.name}.')
+        with os.fdopen(fd, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp, self.path)
+
+
+class VersionedCache:
+    """A per-process dict that empties itself whenever its ``VersionStamp`` changes."""
+
+    def __init__(self, name):
+        self.stamp = VersionStamp(name)
+        self._version = None
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get_or_set(self, key, loader):
+        version = self.stamp.read()
+        with self._lock:
+            if version != self._version:
+                self._data = {}
+                self._version = version
+            if key in self._data:
+                return self._data[key]
+        value = loader()
+        with self._lock:
+            if version == self._version:
+                self._data[key] = value
+        return value
+
+    def invalidate(self):
+        """Drop this process's copy now and every other worker's once the change commits."""
+        with self._lock:
+            self._data = {}
+            self._version = None
+        db_transaction.on_commit(self.stamp.bump)
+
+
+navigation = VersionedCache('navigation')
+
+
+def portal_nav_pages():
+    """PortalPages for the navbar and landing cards, with only page_key and heading loaded."""
+    return navigation.get_or_set('portal_pages', lambda: list(PortalPage.objects.only('page_key', 'heading')))
+
+
+def home_page():
+    return navigation.get_or_set('home_page', lambda: HomePage.objects.first())
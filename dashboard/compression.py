@@ -0,0 +1,146 @@
+"""
+Compression of dynamic responses.
+
+``CompressionMiddleware`` compresses the pages and other text responses
+the views return: Brotli for browsers that accept it (every current one,
+over HTTPS), gzip otherwise. Static files are not its concern; they are
+compressed ahead of time (dashboard/static_assets.py) and served before
+this middleware runs.
+
+- Only text formats in ``COMPRESSIBLE_TYPES`` are compressed. Bodies under
+  ``PORTAL_COMPRESS_MIN_SIZE`` bytes, partial (206) responses, responses
+  already encoded and ``Cache-Control: no-transform`` are sent as they are.
+- Brotli runs at ``PORTAL_BROTLI_QUALITY`` (5 by default): per request,
+  past that the extra CPU time buys little.
+- Streaming responses, sync or async, are compressed chunk by chunk and
+  flushed after each chunk, so the browser can render what has arrived.
+- BREACH: a page holding a secret (per-student data, the CSRF token) that
+  also echoes what the request sent lets an attacker guess the secret
+  from compressed sizes. Requests with a query string (``?search=``,
+  pagination cursors) or a body may be echoed, so they are never sent
+  Brotli, which has nowhere to hide padding; they get gzip or nothing.
+  Every gzip response carries a random file name of up to
+  ``RANDOM_PADDING`` bytes in its header, as Django's GZipMiddleware does,
+  so its length no longer tells what matched.
+- ETags are made weak (``W/"..."``): the bytes differ per encoding but the
+  page is the same. Django's conditional views compare ETags weakly, so a
+  browser sending back the weak tag still gets its 304.
+"""
+import gzip
+import secrets
+
+import brotli
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import StreamingBuffer, compress_string
+
+from .static_assets import accepted_encodings
+
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript', 'text/xml', 'application/javascript',
+    'application/json', 'application/ld+json', 'application/xml', 'image/svg+xml',
+}
+ENCODINGS = ('br', 'gzip')  # In order of preference
+GZIP_LEVEL = 6
+RANDOM_PADDING = 100  # Bytes at most, as Django's GZipMiddleware
+
+
+def reflects_input(request):
+    """Whether the page may echo what the request sent: a query string or a body."""
+    return bool(request.META.get('QUERY_STRING')) or request.method not in ('GET', 'HEAD')
+
+
+def padding():
+    return b'a' * secrets.randbelow(RANDOM_PADDING)
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=settings.PORTAL_BROTLI_QUALITY, mode=brotli.MODE_TEXT)
+    return compress_string(data, max_random_bytes=RANDOM_PADDING)
+
+
+def stream_compressor(encoding):
+    """``(process, finish)``: ``process(chunk)`` returns the compressed bytes to send for it, flushed."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=settings.PORTAL_BROTLI_QUALITY, mode=brotli.MODE_TEXT)
+        return (lambda chunk: compressor.process(chunk) + compressor.flush()), compressor.finish
+    buffer = StreamingBuffer()
+    gzip_file = gzip.GzipFile(filename=padding(), mode='wb', compresslevel=GZIP_LEVEL, fileobj=buffer, mtime=0)
+
+    def process(chunk):
+        gzip_file.write(chunk)
+        gzip_file.flush()
+        return buffer.read()
+
+    def finish():
+        gzip_file.close()
+        return buffer.read()
+
+    return process, finish
+
+
+def compress_stream(chunks, encoding):
+    process, finish = stream_compressor(encoding)
+    for chunk in chunks:
+        if chunk:
+            yield process(chunk)
+    yield finish()
+
+
+async def acompress_stream(chunks, encoding):
+    process, finish = stream_compressor(encoding)
+    async for chunk in chunks:
+        if chunk:
+            yield process(chunk)
+    yield finish()
+
+
+def compressible(response):
+    if response.has_header('Content-Encoding') or response.status_code == 206:
+        return False
+    if 'no-transform' in response.get('Cache-Control', '').lower():
+        return False
+    if response.get('Content-Type', '').split(';')[0].strip().lower() not in COMPRESSIBLE_TYPES:
+        return False
+    if response.streaming:
+        length = response.get('Content-Length')  # Unknown for most streams
+        return length is None or int(length) >= settings.PORTAL_COMPRESS_MIN_SIZE
+    return len(response.content) >= settings.PORTAL_COMPRESS_MIN_SIZE
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not compressible(response):
+            return response
+        patch_vary_headers(response, ['Accept-Encoding'])
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        offered = ('gzip',) if reflects_input(request) else ENCODINGS
+        encoding = next((encoding for encoding in offered if encoding in accepted), None)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            content = compress(response.content, encoding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = len(content)
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
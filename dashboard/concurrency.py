@@ -0,0 +1,55 @@
+"""
+Run independent ORM work concurrently from async views.
+
+Each call goes to its own worker thread (and so its own database
+connection), letting one ASGI worker keep several queries in flight.
+Connections are released through ``close_old_connections`` afterwards, so
+``CONN_MAX_AGE`` still decides how long they live.
+
+Inside a transaction the calls run one after another on the request's own
+connection instead: other connections would not see its uncommitted rows.
+
+``process_pool`` is for CPU-bound work run from commands and the job
+worker (PDF rendering, image resizing).
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+
+def _in_transaction():
+    return connection.in_atomic_block
+
+
+def _released(call):
+    def run():
+        try:
+            return call()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def run_concurrently(*calls):
+    """Run blocking callables at the same time and return their results in order."""
+    if not settings.PORTAL_CONCURRENT_QUERIES or await sync_to_async(_in_transaction)():
+        return [await sync_to_async(call)() for call in calls]
+    return await asyncio.gather(*(sync_to_async(_released(call), thread_sensitive=False)() for call in calls))
+
+
+def _start_worker():
+    import django
+
+    django.setup()
+
+
+def process_pool(workers):
+    """A pool of ``workers`` processes with Django set up, for CPU-bound work."""
+    # Spawned, not forked: the parent may be a threaded server holding open connections
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=_start_worker,
+    )
@@ -0,0 +1,97 @@
+"""
+Conditional GET for portal and public pages.
+
+Every page is built from rows whose changes are recorded by change stamps
+(dashboard/stamps.py): the student's own enrollments, grades and
+transactions, and the shared portal pages, events, library items, FAQs and
+home page. ``conditional_page`` derives an ETag from those stamp versions
+and a Last-Modified date from their latest change, so a browser revisiting
+an unchanged page gets a 304 after a single stamp query, before the view
+runs any listing query or renders a template.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import stamps
+from .response_cache import TAB_DEPENDENCIES, normalized_query, user_fingerprint
+
+
+# Stamp groups behind each page, besides the portal pages in the navbar
+PAGE_DEPENDENCIES = {
+    **TAB_DEPENDENCIES,
+    'home': ('homepage',),
+    'landing': (),
+}
+
+
+def page_stamps(request, page):
+    """Return ``{key: (version, changed_at)}`` for the stamps ``page`` is built from."""
+    user_id = request.user.pk if request.user.is_authenticated else None
+    keys = ['portalpage'] + [stamps.key_for(group, user_id) for group in PAGE_DEPENDENCIES[page]]
+    return stamps.read_for_request(request, keys)
+
+
+def page_etag(request, page):
+    # The release tag covers template changes shipped without any data change;
+    # the fingerprint covers the user's name in the navbar and the CSRF token.
+    parts = [settings.PORTAL_RELEASE, page, normalized_query(request.GET), user_fingerprint(request)]
+    parts += [f'{key}={version}' for key, (version, _) in sorted(page_stamps(request, page).items())]
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+def page_last_modified(request, page):
+    changes = [changed_at for _, changed_at in page_stamps(request, page).values() if changed_at]
+    return max(changes) if changes else None
+
+
+def conditional_page(page=None):
+    """Send ETag and Last-Modified for a view and answer 304 when they match.
+
+    ``page`` names the entry in PAGE_DEPENDENCIES; when omitted the view's
+    ``page_key`` argument is used. Responses are marked private and must be
+    revalidated on every visit. Works on sync and async views.
+    """
+    def page_for(kwargs):
+        name = page or kwargs.get('page_key')
+        return name if name in PAGE_DEPENDENCIES else None
+
+    def etag(request, *args, **kwargs):
+        name = page_for(kwargs)
+        return page_etag(request, name) if name else None
+
+    def last_modified(request, *args, **kwargs):
+        name = page_for(kwargs)
+        return page_last_modified(request, name) if name else None
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        def finish(request, response, kwargs):
+            if request.method in ('GET', 'HEAD') and page_for(kwargs):
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # The user login_required loaded with auser(); request.user would query it again
+                request.user = await request.auser()
+                name = page_for(kwargs)
+                if name:
+                    # Load the user and stamps up front; the validators then run without queries
+                    await sync_to_async(page_stamps)(request, name)
+                response = await conditional_view(request, *args, **kwargs)
+                return finish(request, response, kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return finish(request, conditional_view(request, *args, **kwargs), kwargs)
+        return wrapper
+    return decorator
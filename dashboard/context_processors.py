@@ -1,8 +1,8 @@
-from .models import PortalPage
+from . import cache
 
 def portal_pages(request):
     """
     Adds all portal pages to the template context so navbar can loop through them.
+    Served from the process-local navigation cache; only page_key and heading are loaded.
     """
-    pages = PortalPage.objects.all()
-    return {'portal_pages': pages}
\ No newline at end of file
+    return {'portal_pages': cache.portal_nav_pages()}
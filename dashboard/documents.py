@@ -0,0 +1,154 @@
+"""
+PDF transcripts and fee statements.
+
+A transcript is built from the student's grades (with the course code,
+name and credit units) and their CGPA and term GPAs, a fee statement from
+their transactions. ``content_hash`` is a SHA-256 of that content, the
+student's name, the template and ``PORTAL_RELEASE``; the PDF is stored in
+``default_storage`` under that hash, so a document is rendered again only
+when what it shows has changed. For the same reason documents carry no
+issue date, which would change the hash every day.
+
+Rendering takes WeasyPrint seconds per document, so it never happens on
+the request path: ``request_document`` returns the stored document when it
+is current and otherwise queues ``build`` on the job queue (dashboard.jobs)
+while the page polls. The generate_documents command renders a whole cohort
+across every core.
+"""
+import datetime
+import hashlib
+import json
+import logging
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import jobs
+from .models import Grade, Transaction, GeneratedDocument, StudentGPA
+
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES = {
+    'transcript': 'dashboard/documents/transcript.html',
+    'fee_statement': 'dashboard/documents/fee_statement.html',
+}
+# A render still pending after this long is assumed lost (e.g. its job failed outright)
+STALE_AFTER = datetime.timedelta(minutes=10)
+
+
+def document_content(kind, student):
+    """What a document shows: ``rows`` in the order it shows them and, for a transcript, the ``gpa``."""
+    if kind == 'transcript':
+        gpa = StudentGPA.objects.filter(student=student).values('cgpa', 'credit_units', 'terms').first()
+        return {
+            'rows': list(Grade.objects.filter(student=student).order_by('course__code', 'id').values_list(
+                'course__code', 'course__name', 'course__credit_units', 'grade')),
+            'gpa': gpa or {'cgpa': 0, 'credit_units': 0, 'terms': []},
+        }
+    return {'rows': list(Transaction.objects.filter(student=student).order_by('date', 'id').values_list(
+        'date', 'description', 'amount', 'is_credit'))}
+
+
+def content_hash(kind, student, content):
+    payload = [TEMPLATES[kind], settings.PORTAL_RELEASE, student.username, student.get_full_name(), content]
+    return hashlib.sha256(json.dumps(payload, default=str).encode()).hexdigest()
+
+
+def storage_path(digest):
+    return f'documents/{digest[:2]}/{digest}.pdf'
+
+
+def render_html(kind, student, content):
+    context = {'student': student}
+    if kind == 'transcript':
+        context['grades'] = [
+            {'code': code, 'name': name, 'credit_units': units, 'grade': grade}
+            for code, name, units, grade in content['rows']
+        ]
+        context['gpa'] = content['gpa']
+    else:
+        balance = Decimal('0.00')
+        context['transactions'] = []
+        for day, description, amount, is_credit in content['rows']:
+            balance += -amount if is_credit else amount  # Fees owed minus payments, as in the ledger
+            context['transactions'].append({
+                'date': day, 'description': description, 'amount': amount, 'is_credit': is_credit,
+                'balance': balance,
+            })
+        context['balance'] = balance
+    return render_to_string(TEMPLATES[kind], context)
+
+
+def render_pdf(html):
+    # Imported here: WeasyPrint loads Pango and friends, which only the render workers need
+    from weasyprint import HTML
+
+    return HTML(string=html, base_url=str(settings.BASE_DIR)).write_pdf()
+
+
+def build(kind, student_id):
+    """Bring one stored document up to date; return 'rendered', 'unchanged' or 'failed'.
+
+    Runs in a worker process.
+    """
+    student = User.objects.get(pk=student_id)
+    content = document_content(kind, student)
+    digest = content_hash(kind, student, content)
+    document = GeneratedDocument.objects.filter(student=student, kind=kind).first()
+    if document and document.status == 'ready' and document.content_hash == digest:
+        return 'unchanged'
+
+    path = storage_path(digest)
+    now = timezone.now()
+    try:
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(render_pdf(render_html(kind, student, content))))
+        fields = {'status': 'ready', 'path': path, 'size': default_storage.size(path), 'failure': '', 'rendered_at': now}
+    except Exception as exc:
+        logger.exception("Could not render the %s of student %s", kind, student_id)
+        fields = {'status': 'failed', 'failure': f"{type(exc).__name__}: {exc}"}
+
+    fields['content_hash'] = digest
+    GeneratedDocument.objects.update_or_create(
+        student=student, kind=kind, defaults=fields, create_defaults={**fields, 'requested_at': now},
+    )
+    if fields['status'] == 'failed':
+        return 'failed'
+    if document and document.path and document.path != path:
+        default_storage.delete(document.path)  # Hashes include the student, so no one else's document uses it
+    return 'rendered'
+
+
+def build_many(kind, student_ids):
+    """Build the documents of several students; return how many ended in each state."""
+    return Counter(build(kind, student_id) for student_id in student_ids)
+
+
+def request_document(kind, student, retry=False):
+    """Return the student's GeneratedDocument, queueing a render unless it is current or already queued.
+
+    A failed render of the same content is queued again only with ``retry``.
+    """
+    content = document_content(kind, student)
+    digest = content_hash(kind, student, content)
+    document = GeneratedDocument.objects.filter(student=student, kind=kind).first()
+    now = timezone.now()
+    if document and document.content_hash == digest and (
+            document.status == 'ready'
+            or document.status == 'failed' and not retry
+            or document.status == 'pending' and now - document.requested_at < STALE_AFTER):
+        return document
+
+    document, _ = GeneratedDocument.objects.update_or_create(
+        student=student, kind=kind,
+        defaults={'content_hash': digest, 'status': 'pending', 'failure': '', 'requested_at': now},
+    )
+    jobs.enqueue('documents.build', kind, student.pk, dedupe_key=f'documents.build:{kind}:{student.pk}')
+    return document
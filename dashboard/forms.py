@@ -1,7 +1,13 @@
 from django import forms
-from .models import Profile
+from .models import Profile, ImportRun
 
 class ProfileForm(forms.ModelForm):
     class Meta:
         model = Profile
-        fields = ['phone', 'address', 'profile_picture']
\ No newline at end of file
+        fields = ['phone', 'address', 'profile_picture']
+
+class ImportForm(forms.Form):
+    kind = forms.ChoiceField(choices=ImportRun.KIND_CHOICES)
+    file = forms.FileField(help_text="CSV with a header row, or JSONL (one object per line).")
+    dry_run = forms.BooleanField(required=False, help_text="Validate and report without writing anything.")
+    resume = forms.BooleanField(required=False, help_text="Continue an interrupted import of this same file.")
@@ -0,0 +1,203 @@
+"""
+Resized copies of uploaded images.
+
+Each image field in ``FIELDS`` gets fixed-size variants: every width of a
+variant in ``VARIANTS``, as WebP and as JPEG, stored next to the original
+(``profile_pics/ada.jpg`` gives ``profile_pics/ada.thumb-64.webp`` and so
+on). Variants are encoded from the pixels alone, so EXIF (GPS position,
+camera) and other metadata in the upload are not carried over. Images are
+never enlarged: widths above the original's are left out.
+
+Saving a model whose image changed queues ``build`` on the job queue
+(dashboard.jobs). The result is kept in the model's ``<field>_variants``
+JSON field, which is all ``picture_html`` and the ``{% picture %}`` tag
+read, so a page costs no extra queries or storage lookups. Until the
+variants exist the original is shown, and so is the field's default (the
+picture every new profile starts with): it gets no variants, so signups
+queue no builds and no two jobs rewrite the same shared files.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+from PIL import Image, ImageOps
+
+from . import jobs
+from .models import HomePage, Profile
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Variant:
+    widths: tuple
+    aspect: float = None  # Width / height to crop to; None keeps the original's
+    sizes: str = '100vw'  # Default ``sizes`` attribute: how wide the image is shown
+
+
+VARIANTS = {
+    'thumb': Variant(widths=(64, 128), aspect=1.0, sizes='64px'),  # Admin lists and previews
+    'card': Variant(widths=(160, 320), aspect=1.0, sizes='160px'),  # The profile page
+    'hero': Variant(widths=(640, 1280, 1920)),  # Full-width backgrounds
+}
+# The variants built for each image field
+FIELDS = {
+    Profile: {'profile_picture': ('thumb', 'card')},
+    HomePage: {'background_image': ('hero',)},
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def variants_field(field_name):
+    return f'{field_name}_variants'
+
+
+def variant_path(name, variant, width, image_format):
+    stem, _ = os.path.splitext(name)
+    return f'{stem}.{variant}-{width}.{EXTENSIONS[image_format]}'
+
+
+def output_sizes(variant, source_width, source_height):
+    """``[(width, height), ...]`` of one variant of a source this size, smallest first."""
+    if variant.aspect:
+        source_width = min(source_width, round(source_height * variant.aspect))
+        aspect = variant.aspect
+    else:
+        aspect = source_width / source_height
+    widths = sorted({min(width, source_width) for width in variant.widths})
+    return [(width, max(1, round(width / aspect))) for width in widths]
+
+
+def encode(image, image_format):
+    name, options = FORMATS[image_format]
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        # No alpha in JPEG: flatten onto white
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, name, **options)  # Nothing passed for exif/icc_profile, so no metadata is written
+    return buffer.getvalue()
+
+
+def render(name, variant_names):
+    """Write the variants of the stored image ``name``; return what ``<field>_variants`` records."""
+    with default_storage.open(name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))  # Apply the camera's rotation before dropping it
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    data = {'source': name}
+    for variant_name in variant_names:
+        variant = VARIANTS[variant_name]
+        files = {image_format: [] for image_format in FORMATS}
+        sizes = output_sizes(variant, *image.size)
+        for width, height in sizes:
+            if variant.aspect:
+                resized = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+            else:
+                resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            for image_format in FORMATS:
+                path = variant_path(name, variant_name, width, image_format)
+                if default_storage.exists(path):
+                    default_storage.delete(path)  # Rebuilding: replace rather than save under a new name
+                files[image_format].append([width, default_storage.save(path, ContentFile(encode(resized, image_format)))])
+        data[variant_name] = {'width': sizes[-1][0], 'height': sizes[-1][1], 'files': files}
+    return data
+
+
+def stored_paths(data):
+    return {path for key, built in data.items() if key != 'source'
+            for paths in built['files'].values() for _, path in paths}
+
+
+def build(model_label, pk, field_name, rendered=None):
+    """Bring the variants of one object's image up to date. Runs as a job.
+
+    ``rendered`` maps source names to variants already written in this run
+    (e.g. the default picture many profiles share), which are reused.
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    image = getattr(instance, field_name)
+    previous = getattr(instance, variants_field(field_name)) or {}
+    if not image or is_default(instance, field_name):
+        data = {}
+    elif not default_storage.exists(image.name):
+        logger.warning("%s %s: %s is missing from storage", model_label, pk, image.name)
+        data = {'source': image.name}  # Recorded, so saving the object again does not queue another build
+    elif rendered is not None and image.name in rendered:
+        data = rendered[image.name]
+    else:
+        data = render(image.name, FIELDS[model][field_name])
+        if rendered is not None:
+            rendered[image.name] = data
+
+    current = model.objects.filter(pk=pk).values_list(field_name, flat=True).first()
+    if current != image.name:
+        # Replaced while we worked; its own build is queued
+        for path in stored_paths(data) - stored_paths(previous):
+            default_storage.delete(path)
+        return
+    setattr(instance, variants_field(field_name), data)
+    instance.save(update_fields=[variants_field(field_name)])  # Through save(), so cached pages are invalidated
+
+    for path in stored_paths(previous) - stored_paths(data):
+        default_storage.delete(path)
+
+
+def is_default(instance, field_name):
+    return getattr(instance, field_name).name == instance._meta.get_field(field_name).default
+
+
+def needs_build(instance, field_name):
+    built = (getattr(instance, variants_field(field_name)) or {}).get('source', '')
+    if is_default(instance, field_name):
+        return bool(built)  # Only to remove the variants of the upload it replaced
+    return (getattr(instance, field_name).name or '') != built
+
+
+def queue(instance, field_name):
+    label = instance._meta.label_lower
+    jobs.enqueue('images.build', label, instance.pk, field_name,
+                 dedupe_key=f'images.build:{label}:{instance.pk}:{field_name}')
+
+
+def picture_html(image, variant, alt='', sizes=None, **attrs):
+    """A ``<picture>`` of one variant of ``image`` (a FieldFile), or an ``<img>`` of the original until it is built.
+
+    Other keyword arguments become attributes of the ``<img>``; images load
+    lazily unless ``loading`` says otherwise.
+    """
+    if not image:
+        return ''
+    attrs = {'alt': alt, 'loading': 'lazy', **attrs}
+    data = getattr(image.instance, variants_field(image.field.name), None) or {}
+    built = data.get(variant) if data.get('source') == image.name else None
+    if built is None:
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+
+    def srcset(image_format):
+        return ', '.join(f'{default_storage.url(path)} {width}w' for width, path in built['files'][image_format])
+
+    sizes = sizes or VARIANTS[variant].sizes
+    img = {
+        'src': default_storage.url(built['files']['jpeg'][-1][1]), 'srcset': srcset('jpeg'), 'sizes': sizes,
+        'width': built['width'], 'height': built['height'], **attrs,
+    }
+    return format_html('<picture><source type="image/webp" srcset="{}" sizes="{}"><img{}></picture>',
+                       srcset('webp'), sizes, flatatt(img))
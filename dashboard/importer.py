@@ -0,0 +1,334 @@
+"""
+Bulk import of enrollments, grades and transactions from CSV or JSONL.
+
+Files are streamed in chunks of ``CHUNK_SIZE`` rows. Student usernames and
+course codes are resolved through lookup maps loaded once per import; each
+chunk is written with ``bulk_create``/``bulk_update`` in its own database
+transaction together with the ``ImportRun`` checkpoint, so a failed import
+of the same file resumes after the last committed chunk.
+
+Bulk writes bypass the model signals, so every chunk also rebuilds the
+ledgers or GPAs of the students it touched and moves their change stamps;
+the admin statistics and course grade summaries are recomputed once the
+file is done.
+
+The import_records command imports a file as it runs. Files uploaded on
+the import page are stored and imported by an ``imports.run`` job
+(``queue_import``); the page of the ImportRun follows its progress.
+
+Columns (CSV header names or JSON keys):
+
+- enrollment: ``student``, ``course``
+- grade: ``student``, ``course``, ``grade`` (an existing grade for the same
+  student and course is updated)
+- transaction: ``student``, ``amount``, ``description``, ``date``
+  (YYYY-MM-DD, default today), ``is_credit`` (true/false)
+
+``student`` is a username and ``course`` a course code. Invalid rows are
+skipped and reported with their row number (data rows count from 1).
+"""
+import csv
+import datetime
+import hashlib
+import io
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .models import Course, Enrollment, Grade, Transaction, ImportRun
+from . import analytics, jobs, ledger, stamps, stats
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+MAX_STORED_ERRORS = 1000
+MAX_AMOUNT = Decimal('99999999.99')  # Transaction.amount is max_digits=10, decimal_places=2
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'credit'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n', 'debit'}
+
+
+class RowError(Exception):
+    """A row that cannot be imported; the message is shown in the error report."""
+
+
+def file_format(name):
+    return 'jsonl' if name.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def checksum(fileobj):
+    """SHA-256 of a binary file, which is then rewound."""
+    digest = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(1024 * 1024), b''):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def read_records(fileobj, fmt):
+    """Yield ``(row_number, record)`` from a binary file; unreadable rows yield a RowError."""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'jsonl':
+            number = 0
+            for line in text:
+                if not line.strip():
+                    continue
+                number += 1
+                try:
+                    record = json.loads(line)
+                except ValueError as exc:
+                    yield number, RowError(f"invalid JSON: {exc}")
+                    continue
+                if not isinstance(record, dict):
+                    yield number, RowError("expected a JSON object")
+                    continue
+                yield number, {str(key).strip().lower(): value for key, value in record.items()}
+        else:
+            reader = csv.DictReader(text)
+            for number, record in enumerate(reader, start=1):
+                yield number, {(key or '').strip().lower(): value for key, value in record.items()}
+    finally:
+        text.detach()
+
+
+def _text(record, field, required=True):
+    value = record.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f"missing {field}")
+    return value
+
+
+class Importer:
+    """Validates rows of one kind and writes them in bulk."""
+
+    def __init__(self, kind):
+        if kind not in dict(ImportRun.KIND_CHOICES):
+            raise ValueError(f"unknown import kind {kind!r}")
+        self.kind = kind
+        self.graded_courses = set()  # Course summaries are recomputed once, at the end
+        self.students = dict(User.objects.values_list('username', 'id'))
+        self.courses = {}
+        self.ambiguous_courses = set()
+        for code, course_id in Course.objects.order_by('id').values_list('code', 'id'):
+            if code in self.courses:
+                self.ambiguous_courses.add(code)
+            self.courses.setdefault(code, course_id)
+
+    def student(self, record):
+        username = _text(record, 'student')
+        if username not in self.students:
+            raise RowError(f"unknown student {username!r}")
+        return self.students[username]
+
+    def course(self, record):
+        code = _text(record, 'course')
+        if code not in self.courses:
+            raise RowError(f"unknown course {code!r}")
+        if code in self.ambiguous_courses:
+            raise RowError(f"course code {code!r} is used by more than one course")
+        return self.courses[code]
+
+    def parse(self, record):
+        """Return the validated values of one row, or raise RowError."""
+        if self.kind == 'enrollment':
+            return self.student(record), self.course(record)
+
+        if self.kind == 'grade':
+            grade = _text(record, 'grade').upper()
+            if len(grade) > 2:
+                raise RowError(f"grade {grade!r} is longer than 2 characters")
+            return self.student(record), self.course(record), grade
+
+        student_id = self.student(record)
+        try:
+            amount = Decimal(_text(record, 'amount')).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise RowError(f"invalid amount {record.get('amount')!r}")
+        if not Decimal(0) < amount <= MAX_AMOUNT:
+            raise RowError(f"amount {amount} is out of range")
+        description = _text(record, 'description')
+        if len(description) > 255:
+            raise RowError("description is longer than 255 characters")
+        day = _text(record, 'date', required=False)
+        try:
+            day = datetime.date.fromisoformat(day) if day else timezone.localdate()
+        except ValueError:
+            raise RowError(f"invalid date {day!r}")
+        flag = _text(record, 'is_credit', required=False).lower()
+        if flag not in TRUE_VALUES | FALSE_VALUES:
+            raise RowError(f"invalid is_credit {flag!r}")
+        return student_id, amount, description, day, flag in TRUE_VALUES
+
+    def write(self, rows):
+        """Write validated rows; return ``(created, updated, skipped)``."""
+        return getattr(self, f'_write_{self.kind}')(rows)
+
+    def _write_enrollment(self, rows):
+        pairs = list(dict.fromkeys(rows))
+        existing = set(
+            Enrollment.objects.filter(
+                student_id__in={s for s, _ in pairs}, course_id__in={c for _, c in pairs}
+            ).values_list('student_id', 'course_id')
+        )
+        new = [pair for pair in pairs if pair not in existing]
+        Enrollment.objects.bulk_create(
+            [Enrollment(student_id=student_id, course_id=course_id) for student_id, course_id in new],
+            batch_size=500,
+        )
+        return len(new), 0, len(rows) - len(new)
+
+    def _write_grade(self, rows):
+        latest = {(student_id, course_id): grade for student_id, course_id, grade in rows}
+        self.graded_courses.update(course_id for _, course_id in latest)
+        existing = {
+            (student_id, course_id): (grade_id, grade)
+            for student_id, course_id, grade_id, grade in Grade.objects.filter(
+                student_id__in={s for s, _ in latest}, course_id__in={c for _, c in latest}
+            ).order_by('id').values_list('student_id', 'course_id', 'id', 'grade')
+        }
+        new, changed = [], []
+        for (student_id, course_id), grade in latest.items():
+            if (student_id, course_id) not in existing:
+                new.append(Grade(student_id=student_id, course_id=course_id, grade=grade))
+            elif existing[student_id, course_id][1] != grade:
+                changed.append(Grade(id=existing[student_id, course_id][0], grade=grade))
+        Grade.objects.bulk_create(new, batch_size=500)
+        Grade.objects.bulk_update(changed, ['grade'], batch_size=500)
+        return len(new), len(changed), len(rows) - len(new) - len(changed)
+
+    def _write_transaction(self, rows):
+        objs = [
+            Transaction(student_id=student_id, amount=amount, description=description, is_credit=is_credit)
+            for student_id, amount, description, _, is_credit in rows
+        ]
+        Transaction.objects.bulk_create(objs, batch_size=500)
+        # ``date`` is auto_now_add, so bulk_create stamps today; set the imported dates afterwards
+        dated = []
+        for obj, row in zip(objs, rows):
+            if obj.date != row[3]:
+                obj.date = row[3]
+                dated.append(obj)
+        Transaction.objects.bulk_update(dated, ['date'], batch_size=500)
+        return len(objs), 0, 0
+
+    def refresh(self, student_ids):
+        """Bring the data maintained by signal handlers up to date for these students."""
+        if self.kind == 'transaction':
+            ledger.rebuild(student_ids)
+        else:
+            analytics.refresh(student_ids)
+        stamps.touch_many(stamps.key_for(self.kind, student_id) for student_id in student_ids)
+
+
+def _record_errors(run, errors):
+    run.error_count += len(errors)
+    room = MAX_STORED_ERRORS - len(run.errors)
+    run.errors.extend({'row': row, 'message': message} for row, message in errors[:max(room, 0)])
+
+
+def open_run(kind, digest, source, dry_run=False, resume=False, user=None, status='running'):
+    """The ImportRun of a new import of the file with checksum ``digest``.
+
+    With ``resume`` it is the unfinished run of the same file, if there is
+    one, set to ``status`` again.
+    """
+    run = None
+    if resume and not dry_run:
+        run = (ImportRun.objects.filter(kind=kind, checksum=digest, dry_run=False)
+               .exclude(status='finished').first())
+    if run is None:
+        return ImportRun.objects.create(
+            kind=kind, source=source, checksum=digest, dry_run=dry_run, status=status, started_by=user,
+        )
+    run.status = status
+    run.failure = ''
+    run.save(update_fields=['status', 'failure'])
+    return run
+
+
+def run_import(kind, fileobj, source, fmt=None, dry_run=False, resume=False, user=None, chunk_size=CHUNK_SIZE):
+    """Import ``fileobj`` (a binary file) and return its ImportRun.
+
+    With ``dry_run`` every row is validated and reported but nothing is
+    written. With ``resume`` an unfinished run of the same file continues
+    from its checkpoint. A failure is logged and recorded on the run, whose
+    status is then ``failed``.
+    """
+    run = open_run(kind, checksum(fileobj), source, dry_run=dry_run, resume=resume, user=user)
+    return process(run, fileobj, fmt=fmt, chunk_size=chunk_size)
+
+
+def queue_import(kind, upload, dry_run=False, resume=False, user=None):
+    """Store an uploaded file and queue a job to import it; return its ImportRun, ``queued``."""
+    run = open_run(kind, checksum(upload), upload.name, dry_run=dry_run, resume=resume, user=user, status='queued')
+    if run.file:
+        run.file.delete(save=False)  # An earlier upload of the same file
+    run.file.save(upload.name, upload)
+    jobs.enqueue('imports.run', run.pk, dedupe_key=f'imports.run:{run.pk}')
+    return run
+
+
+def run_queued(run_id, chunk_size=CHUNK_SIZE):
+    """Import the stored file of a queued ImportRun. Runs as a job."""
+    run = ImportRun.objects.get(pk=run_id)
+    with run.file.open('rb') as fileobj:
+        process(run, fileobj.file, chunk_size=chunk_size)
+    if run.status == 'finished':
+        run.file.delete()  # A failed import keeps it until the file is uploaded again to resume
+
+
+def process(run, fileobj, fmt=None, chunk_size=CHUNK_SIZE):
+    """Import ``fileobj`` into ``run``, from its checkpoint on, and return the run."""
+    if run.status != 'running':
+        run.status = 'running'
+        run.save(update_fields=['status'])
+    source, dry_run = run.source, run.dry_run
+    try:
+        importer = Importer(run.kind)
+        records = islice(read_records(fileobj, fmt or file_format(source)), run.rows_processed, None)
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            valid, errors = [], []
+            for number, record in chunk:
+                try:
+                    if isinstance(record, RowError):
+                        raise record
+                    valid.append(importer.parse(record))
+                except RowError as exc:
+                    errors.append((number, str(exc)))
+
+            with db_transaction.atomic():
+                if valid and not dry_run:
+                    created, updated, skipped = importer.write(valid)
+                    importer.refresh({row[0] for row in valid})
+                    run.created_count += created
+                    run.updated_count += updated
+                    run.skipped_count += skipped
+                _record_errors(run, errors)
+                run.rows_processed = chunk[-1][0]
+                run.save()
+    except Exception as exc:
+        logger.exception("Import %s of %s failed", run.pk, source)
+        run.refresh_from_db()  # Drop the counts of the chunk that rolled back
+        run.status = 'failed'
+        run.failure = f"{type(exc).__name__}: {exc}"
+        run.save(update_fields=['status', 'failure'])
+        return run
+
+    if not dry_run:
+        stats.reconcile()
+        analytics.refresh(course_ids=importer.graded_courses)
+    run.status = 'finished'
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'finished_at'])
+    return run
@@ -0,0 +1,220 @@
+"""
+Per-request SQL instrumentation.
+
+``QueryInstrumentationMiddleware`` wraps every request in a
+``connection.execute_wrapper`` that counts queries, times them and groups
+them by fingerprint: the SQL shape (parameters and ``IN`` lists collapsed)
+plus where it was issued from, i.e. the template line being rendered or
+else the project code that ran it. The same fingerprint seen
+``PORTAL_REPEATED_QUERY_THRESHOLD`` times in one request is an N+1 and is
+logged.
+
+Views declare a budget with ``@query_budget``; going over it is logged, or
+raises ``QueryBudgetExceeded`` when ``PORTAL_QUERY_BUDGET_MODE`` is
+``"raise"``. Staff responses carry the numbers in ``X-DB-*`` headers, and
+the last ``PORTAL_QUERY_REPORT_SIZE`` requests are kept in memory for the
+query report page.
+
+Only queries run on the request's own thread are seen: work handed to
+other threads by ``run_concurrently`` is not counted.
+
+Every inspected query pays for a stack walk and a hash, so the middleware
+is off unless ``PORTAL_QUERY_INSTRUMENTATION`` is set (it follows DEBUG by
+default), and then inspects a ``PORTAL_QUERY_SAMPLE_RATE`` share of
+requests.
+"""
+import hashlib
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger('dashboard.queries')
+
+PROJECT_DIR = str(settings.BASE_DIR)
+THIS_FILE = os.path.abspath(__file__)
+
+IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)')
+NUMBER = re.compile(r'\b\d+\b')
+WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(budget):
+    """Declare how many queries a view may run.
+
+    ``budget`` is a number, or a mapping looked up with the view's
+    ``page_key`` argument (e.g. ``read_models.QUERY_BUDGETS``).
+    """
+    def decorator(view):
+        view.query_budget = budget
+        return view
+    return decorator
+
+
+def budget_for(view_func, view_kwargs):
+    budget = getattr(view_func, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(view_kwargs.get('page_key'))
+    return budget
+
+
+def sql_shape(sql):
+    sql = IN_LIST.sub('IN (...)', sql)
+    sql = NUMBER.sub('?', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def query_origin(frame):
+    """Describe where a query comes from: the template line being rendered and/or the project code."""
+    code_line = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                template_line = f'{origin.template_name or origin.name}:{token.lineno}'
+                return f'{template_line} via {code_line}' if code_line else template_line
+        elif (code_line is None and code.co_filename.startswith(PROJECT_DIR)
+              and code.co_filename != THIS_FILE and 'site-packages' not in code.co_filename):
+            code_line = f'{os.path.relpath(code.co_filename, PROJECT_DIR)}:{frame.f_lineno}'
+        frame = frame.f_back
+    return code_line or 'unknown'
+
+
+class QueryInspector:
+    """``execute_wrapper`` collecting the queries of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = {}  # fingerprint -> [sql, origin, count, seconds]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            shape, origin = sql_shape(sql), query_origin(sys._getframe(1))
+            key = hashlib.sha1(f'{shape}\0{origin}'.encode()).hexdigest()[:12]
+            entry = self.fingerprints.setdefault(key, [shape, origin, 0, 0.0])
+            entry[2] += 1
+            entry[3] += elapsed
+
+    def repeated(self, threshold):
+        """Fingerprints run at least ``threshold`` times, most frequent first."""
+        found = [
+            {'fingerprint': key, 'sql': sql, 'origin': origin, 'count': count, 'ms': round(seconds * 1000, 3)}
+            for key, (sql, origin, count, seconds) in self.fingerprints.items()
+            if count >= threshold
+        ]
+        return sorted(found, key=lambda item: -item['count'])
+
+
+class QueryReport:
+    """The most recent requests' query statistics, in memory."""
+
+    def __init__(self, size):
+        self.entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, entry):
+        with self._lock:
+            self.entries.append(entry)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def summary(self):
+        """Per-view totals over the recorded requests, busiest first."""
+        with self._lock:
+            entries = list(self.entries)
+        views = {}
+        for entry in entries:
+            view = views.setdefault(entry['view'], {
+                'view': entry['view'], 'requests': 0, 'queries': 0, 'max_queries': 0, 'ms': 0.0, 'max_ms': 0.0,
+                'budget': entry['budget'], 'over_budget': 0, 'repeated': {},
+            })
+            view['requests'] += 1
+            view['queries'] += entry['queries']
+            view['max_queries'] = max(view['max_queries'], entry['queries'])
+            view['ms'] += entry['ms']
+            view['max_ms'] = max(view['max_ms'], entry['ms'])
+            view['over_budget'] += entry['over_budget']
+            for item in entry['repeated']:
+                seen = view['repeated'].setdefault(item['fingerprint'], {**item, 'requests': 0})
+                seen['requests'] += 1
+                seen['count'] = max(seen['count'], item['count'])
+        for view in views.values():
+            view['mean_queries'] = round(view['queries'] / view['requests'], 2)
+            view['mean_ms'] = round(view['ms'] / view['requests'], 3)
+            view['repeated'] = sorted(view['repeated'].values(), key=lambda item: -item['requests'])
+        return sorted(views.values(), key=lambda view: -view['ms'])
+
+
+report = QueryReport(getattr(settings, 'PORTAL_QUERY_REPORT_SIZE', 500))
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PORTAL_QUERY_INSTRUMENTATION or random.random() >= settings.PORTAL_QUERY_SAMPLE_RATE:
+            return self.get_response(request)
+
+        inspector = QueryInspector()
+        with connection.execute_wrapper(inspector):
+            response = self.get_response(request)
+
+        view = getattr(request, '_query_view', None) or request.path
+        budget = getattr(request, '_query_budget', None)
+        over_budget = budget is not None and inspector.count > budget
+        repeated = inspector.repeated(settings.PORTAL_REPEATED_QUERY_THRESHOLD)
+        milliseconds = round(inspector.seconds * 1000, 3)
+        report.record({
+            'view': view, 'path': request.path, 'queries': inspector.count, 'ms': milliseconds,
+            'budget': budget, 'over_budget': over_budget, 'repeated': repeated,
+        })
+
+        for item in repeated:
+            logger.warning("%s ran the same query %d times from %s: %s",
+                           view, item['count'], item['origin'], item['sql'])
+        if over_budget:
+            message = f"{view} ran {inspector.count} queries, over its budget of {budget}"
+            if settings.PORTAL_QUERY_BUDGET_MODE == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated and user.is_staff:
+            response['X-DB-Queries'] = str(inspector.count)
+            response['X-DB-Time-ms'] = f'{milliseconds:.1f}'
+            response['X-DB-Repeated'] = str(len(repeated))
+            if budget is not None:
+                response['X-DB-Budget'] = str(budget)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = request.resolver_match.view_name if request.resolver_match else view_func.__name__
+        if 'page_key' in view_kwargs:
+            name = f"{name}[{view_kwargs['page_key']}]"
+        request._query_view = name
+        request._query_budget = budget_for(view_func, view_kwargs)
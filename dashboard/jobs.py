@@ -0,0 +1,302 @@
+"""
+Deferred work on a queue kept in the ``Job`` table.
+
+No broker is involved, so this works on one box with SQLite. Tasks are
+plain functions registered by name (see dashboard/tasks.py). ``enqueue``
+inserts a Job row, inside the caller's transaction when there is one, and
+the run_jobs command claims due jobs and runs them in a thread or process
+pool:
+
+- Jobs are claimed highest ``priority`` first, then in ``run_at`` order.
+  Each claim is a conditional UPDATE, so several workers can share one
+  queue without row locks.
+- Jobs with a ``run_at`` in the future wait until then. Tasks registered
+  with ``every`` reschedule themselves after each run.
+- A ``dedupe_key`` allows one queued job per key. Enqueueing the key again
+  returns the queued job, moved earlier if the new one is due sooner.
+- A job that raises is retried after ``PORTAL_JOB_RETRY_DELAY`` seconds,
+  doubling on each attempt, until ``max_attempts``; then it is left failed.
+  A job still running after the task's timeout is taken to have lost its
+  worker and is handled the same way.
+
+``queue_stats`` gives the queue depth and latencies shown on the job queue
+page.
+"""
+import datetime
+import logging
+import math
+import os
+import random
+import socket
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction as db_transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .concurrency import process_pool
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+# Longest wait between attempts, however many there have been
+MAX_RETRY_DELAY = datetime.timedelta(hours=1)
+# How often a worker looks for jobs whose worker was lost
+RECOVER_EVERY = datetime.timedelta(minutes=1)
+
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    func: object
+    priority: int = 0
+    max_attempts: int = 3
+    timeout: int = None  # Seconds; defaults to PORTAL_JOB_TIMEOUT
+    every: datetime.timedelta = None  # Run periodically
+    manual: bool = False  # Offered on the job queue page; takes no arguments
+
+
+registry = {}
+
+
+def register(name, func, **options):
+    registry[name] = Task(name, func, **options)
+    return func
+
+
+def task(name, **options):
+    """Decorator form of ``register``."""
+    def decorator(func):
+        return register(name, func, **options)
+    return decorator
+
+
+def enqueue(name, *args, priority=None, dedupe_key=None, run_at=None, delay=None, max_attempts=None, **kwargs):
+    """Queue the task ``name`` to run with ``args`` and ``kwargs``, which must be JSON-serializable.
+
+    It runs at ``run_at``, after ``delay`` (a timedelta), or as soon as a
+    worker is free. Returns the Job.
+    """
+    registered = registry[name]
+    run_at = run_at or timezone.now() + (delay or datetime.timedelta())
+    priority = registered.priority if priority is None else priority
+    if dedupe_key:
+        job = _queued_duplicate(dedupe_key, run_at, priority)
+        if job is not None:
+            return job
+    try:
+        with db_transaction.atomic():
+            return Job.objects.create(
+                task=name, args=list(args), kwargs=kwargs, priority=priority, dedupe_key=dedupe_key or None,
+                run_at=run_at, max_attempts=max_attempts or registered.max_attempts,
+            )
+    except IntegrityError:
+        # Queued by someone else since we looked
+        job = _queued_duplicate(dedupe_key, run_at, priority) if dedupe_key else None
+        if job is None:
+            raise
+        return job
+
+
+def _queued_duplicate(dedupe_key, run_at, priority):
+    job = Job.objects.filter(dedupe_key=dedupe_key, status='queued').first()
+    if job is not None and (run_at < job.run_at or priority > job.priority):
+        job.run_at, job.priority = min(run_at, job.run_at), max(priority, job.priority)
+        Job.objects.filter(pk=job.pk, status='queued').update(run_at=job.run_at, priority=job.priority)
+    return job
+
+
+def claim(limit, worker, now=None):
+    """Mark up to ``limit`` due jobs as running on ``worker`` and return them."""
+    now = now or timezone.now()
+    candidates = Job.objects.filter(status='queued', run_at__lte=now).order_by('-priority', 'run_at', 'pk')
+    claimed = []
+    # A few spare candidates, in case other workers take some first
+    for pk in candidates.values_list('pk', flat=True)[:limit * 2]:
+        if len(claimed) == limit:
+            break
+        if Job.objects.filter(pk=pk, status='queued').update(
+                status='running', worker=worker, started_at=now, finished_at=None, attempts=F('attempts') + 1):
+            claimed.append(pk)
+    return list(Job.objects.filter(pk__in=claimed).order_by('-priority', 'run_at', 'pk'))
+
+
+def run_task(name, args, kwargs):
+    registered = registry.get(name)
+    if registered is None:
+        raise LookupError(f"No task is registered as {name!r}.")
+    registered.func(*args, **kwargs)
+
+
+def _run_in_pool(name, args, kwargs):
+    try:
+        run_task(name, args, kwargs)
+    finally:
+        close_old_connections()
+
+
+def finish(job, error=None):
+    """Record the outcome of a claimed job: success, or ``error`` (the exception it raised)."""
+    if error is not None:
+        logger.error("Job %s (%s) failed on attempt %d", job.pk, job.task, job.attempts, exc_info=error)
+        _failed(job, ''.join(traceback.format_exception(error)))
+        return
+    Job.objects.filter(pk=job.pk, status='running', attempts=job.attempts).update(
+        status='succeeded', finished_at=timezone.now(), last_error='')
+    registered = registry.get(job.task)
+    if registered is not None and registered.every:
+        schedule_periodic(registered)
+
+
+def retry_delay(attempts):
+    """How long to wait after the ``attempts``-th failed attempt, with a little jitter."""
+    delay = datetime.timedelta(seconds=settings.PORTAL_JOB_RETRY_DELAY * 2 ** (attempts - 1))
+    return min(delay, MAX_RETRY_DELAY) * random.uniform(0.9, 1.1)
+
+
+def _failed(job, error):
+    now = timezone.now()
+    running = Job.objects.filter(pk=job.pk, status='running', attempts=job.attempts)
+    if job.attempts < job.max_attempts:
+        try:
+            with db_transaction.atomic():
+                running.update(status='queued', run_at=now + retry_delay(job.attempts), last_error=error)
+            return
+        except IntegrityError:
+            error += "\nNot retried: a newer job with the same dedupe key is queued."
+    running.update(status='failed', finished_at=now, last_error=error)
+    registered = registry.get(job.task)
+    if registered is not None and registered.every:
+        schedule_periodic(registered)
+
+
+def recover_lost(now=None):
+    """Retry or fail the running jobs that have outlived their task's timeout; return how many."""
+    now = now or timezone.now()
+    lost = 0
+    for job in Job.objects.filter(status='running').only('task', 'worker', 'started_at', 'attempts', 'max_attempts'):
+        registered = registry.get(job.task)
+        timeout = (registered and registered.timeout) or settings.PORTAL_JOB_TIMEOUT
+        if job.started_at < now - datetime.timedelta(seconds=timeout):
+            logger.warning("Job %s (%s) has run for over %ds; its worker is assumed lost", job.pk, job.task, timeout)
+            _failed(job, f"Still running after {timeout}s on {job.worker or 'unknown worker'}; assumed lost.")
+            lost += 1
+    return lost
+
+
+def schedule_periodic(registered=None):
+    """Queue the next run of one periodic task, or of all, unless one is already queued or running."""
+    for periodic in [registered] if registered else [t for t in registry.values() if t.every]:
+        if Job.objects.filter(task=periodic.name, status__in=('queued', 'running')).exists():
+            continue
+        last = (Job.objects.filter(task=periodic.name, finished_at__isnull=False)
+                .order_by('-finished_at').values_list('finished_at', flat=True).first())
+        enqueue(periodic.name, run_at=last + periodic.every if last else None, dedupe_key=f'every:{periodic.name}')
+
+
+def prune():
+    """Delete succeeded jobs older than ``PORTAL_JOB_RETENTION_DAYS``; return how many."""
+    cutoff = timezone.now() - datetime.timedelta(days=settings.PORTAL_JOB_RETENTION_DAYS)
+    return Job.objects.filter(status='succeeded', finished_at__lt=cutoff).delete()[0]
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_worker(workers=2, processes=False, burst=False, poll_interval=1.0, stop=None):
+    """Claim and run jobs until ``stop`` (a threading.Event) is set; return how many ran.
+
+    ``workers`` jobs run at a time, in threads or, with ``processes``, in
+    separate processes for CPU-bound tasks; one thread runs them in this
+    thread. Claims and outcomes are written from this thread only, so the
+    queue's own writes never compete with each other. With ``burst`` it
+    returns once nothing is due.
+    """
+    stop = stop or threading.Event()
+    name = worker_name()
+    schedule_periodic()
+    inline = workers == 1 and not processes
+    pool = None if inline else process_pool(workers) if processes else ThreadPoolExecutor(max_workers=workers)
+    in_flight, ran, recovered_at = {}, 0, None  # Future -> Job
+    try:
+        while not stop.is_set():
+            now = timezone.now()
+            if recovered_at is None or now - recovered_at >= RECOVER_EVERY:
+                recover_lost(now)
+                recovered_at = now
+            claimed = claim(workers - len(in_flight), name, now) if len(in_flight) < workers else []
+            for job in claimed:
+                if inline:
+                    try:
+                        run_task(job.task, job.args, job.kwargs)
+                    except Exception as exc:
+                        finish(job, exc)
+                    else:
+                        finish(job)
+                else:
+                    in_flight[pool.submit(_run_in_pool, job.task, job.args, job.kwargs)] = job
+            ran += len(claimed)
+
+            if len(in_flight) >= workers or in_flight and not claimed:
+                # Every slot busy, or nothing due: wait for a job to finish (polling again while slots are free)
+                done, _ = wait(in_flight, timeout=None if len(in_flight) >= workers else poll_interval,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(in_flight.pop(future), future.exception())
+            elif not claimed:
+                if burst:
+                    break
+                stop.wait(poll_interval)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)  # Let running jobs finish and record their outcome
+            for future, job in in_flight.items():
+                finish(job, future.exception())
+    return ran
+
+
+def _percentile(values, p):
+    """Nearest-rank percentile of a sorted list, or None when it is empty."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def queue_stats(now=None, sample=500):
+    """Per task: jobs by state, the age of the oldest due job, and wait and run times of recent jobs."""
+    now = now or timezone.now()
+    due = Q(status='queued', run_at__lte=now)
+    tasks = {row['task']: row for row in Job.objects.order_by().values('task').annotate(
+        due=Count('pk', filter=due),
+        scheduled=Count('pk', filter=Q(status='queued', run_at__gt=now)),
+        running=Count('pk', filter=Q(status='running')),
+        succeeded=Count('pk', filter=Q(status='succeeded')),
+        failed=Count('pk', filter=Q(status='failed')),
+        oldest_due=Min('run_at', filter=due),
+    )}
+
+    timings = {}
+    recent = (Job.objects.filter(status='succeeded').order_by('-finished_at')
+              .values_list('task', 'run_at', 'started_at', 'finished_at')[:sample])
+    for name, run_at, started_at, finished_at in recent:
+        waits, runs = timings.setdefault(name, ([], []))
+        waits.append(max((started_at - run_at).total_seconds(), 0.0))  # Retries start their wait from run_at too
+        runs.append((finished_at - started_at).total_seconds())
+
+    rows = []
+    for name, row in sorted(tasks.items()):
+        waits, runs = (sorted(values) for values in timings.get(name, ([], [])))
+        rows.append({
+            **row,
+            'oldest_due_seconds': (now - row['oldest_due']).total_seconds() if row['oldest_due'] else None,
+            'wait_p50': _percentile(waits, 50), 'wait_p95': _percentile(waits, 95),
+            'run_p50': _percentile(runs, 50), 'run_p95': _percentile(runs, 95),
+            'sampled': len(runs),
+        })
+    return rows
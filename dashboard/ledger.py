@@ -0,0 +1,153 @@
+"""
+Incrementally maintained student ledger.
+
+Every Transaction save or delete posts its delta to the student's
+``StudentLedger`` row and to the ``LedgerTermTotal`` row of the term it falls
+in, so balances are read in O(1) instead of summing the whole history.
+``rebuild`` and ``check`` recompute everything from the Transaction table and
+back the ``rebuild_ledger`` management command.
+"""
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Transaction, StudentLedger, LedgerTermTotal
+
+
+ZERO = Decimal('0.00')
+
+
+def term_for_date(day):
+    """Return the academic term a date falls in.
+
+    Sessions start in September: the first semester runs from September to
+    January and the second from February to August.
+    """
+    start_year = day.year if day.month >= 9 else day.year - 1
+    semester = 'First' if day.month >= 9 or day.month == 1 else 'Second'
+    return f"{start_year}/{start_year + 1} {semester} Semester"
+
+
+def post(student_id, day, amount, is_credit, sign=1):
+    """Apply one transaction (``sign=1``) or its reversal (``sign=-1``) to the ledger."""
+    amount = Decimal(amount) * sign
+    credit = amount if is_credit else ZERO
+    debit = ZERO if is_credit else amount
+
+    with db_transaction.atomic():
+        StudentLedger.objects.get_or_create(student_id=student_id)
+        StudentLedger.objects.filter(student_id=student_id).update(
+            total_credit=F('total_credit') + credit,
+            total_debit=F('total_debit') + debit,
+            balance=F('balance') + debit - credit,
+            transaction_count=F('transaction_count') + sign,
+        )
+        LedgerTermTotal.objects.get_or_create(student_id=student_id, term=term_for_date(day))
+        LedgerTermTotal.objects.filter(student_id=student_id, term=term_for_date(day)).update(
+            total_credit=F('total_credit') + credit,
+            total_debit=F('total_debit') + debit,
+            transaction_count=F('transaction_count') + sign,
+        )
+
+
+def _totals(student_ids=None):
+    """Recompute ledger and per-term totals straight from the Transaction table."""
+    transactions = Transaction.objects.all()
+    if student_ids is not None:
+        transactions = transactions.filter(student_id__in=student_ids)
+
+    ledgers = {}
+    terms = {}
+    rows = (
+        transactions.values('student_id', 'date')
+        .annotate(
+            credit=Sum('amount', filter=Q(is_credit=True)),
+            debit=Sum('amount', filter=Q(is_credit=False)),
+            count=Count('id'),
+        )
+    )
+    for row in rows:
+        credit = row['credit'] or ZERO
+        debit = row['debit'] or ZERO
+        ledger = ledgers.setdefault(row['student_id'], [ZERO, ZERO, 0])
+        term = terms.setdefault((row['student_id'], term_for_date(row['date'])), [ZERO, ZERO, 0])
+        for totals in (ledger, term):
+            totals[0] += credit
+            totals[1] += debit
+            totals[2] += row['count']
+    return ledgers, terms
+
+
+def rebuild(student_ids=None):
+    """Replace the ledger rows of the given students (or everyone) with fresh totals.
+
+    Returns the number of student ledgers written.
+    """
+    ledgers, terms = _totals(student_ids)
+
+    with db_transaction.atomic():
+        ledger_rows = StudentLedger.objects.all()
+        term_rows = LedgerTermTotal.objects.all()
+        if student_ids is not None:
+            ledger_rows = ledger_rows.filter(student_id__in=student_ids)
+            term_rows = term_rows.filter(student_id__in=student_ids)
+        ledger_rows.delete()
+        term_rows.delete()
+
+        StudentLedger.objects.bulk_create([
+            StudentLedger(
+                student_id=student_id, total_credit=credit, total_debit=debit,
+                balance=debit - credit, transaction_count=count,
+            )
+            for student_id, (credit, debit, count) in ledgers.items()
+        ], batch_size=500)
+        LedgerTermTotal.objects.bulk_create([
+            LedgerTermTotal(
+                student_id=student_id, term=term, total_credit=credit,
+                total_debit=debit, transaction_count=count,
+            )
+            for (student_id, term), (credit, debit, count) in terms.items()
+        ], batch_size=500)
+    return len(ledgers)
+
+
+def check(student_ids=None):
+    """Compare stored ledger rows against fresh totals.
+
+    Returns a list of human-readable discrepancies; empty when the ledger is
+    consistent.
+    """
+    ledgers, terms = _totals(student_ids)
+    problems = []
+
+    stored = StudentLedger.objects.all()
+    stored_terms = LedgerTermTotal.objects.all()
+    if student_ids is not None:
+        stored = stored.filter(student_id__in=student_ids)
+        stored_terms = stored_terms.filter(student_id__in=student_ids)
+
+    seen = set()
+    for row in stored:
+        seen.add(row.student_id)
+        credit, debit, count = ledgers.get(row.student_id, (ZERO, ZERO, 0))
+        actual = (row.total_credit, row.total_debit, row.balance, row.transaction_count)
+        expected = (credit, debit, debit - credit, count)
+        if actual != expected:
+            problems.append(f"student {row.student_id}: ledger {actual} != transactions {expected}")
+    for student_id in ledgers.keys() - seen:
+        problems.append(f"student {student_id}: no ledger row")
+
+    seen = set()
+    for row in stored_terms:
+        key = (row.student_id, row.term)
+        seen.add(key)
+        credit, debit, count = terms.get(key, (ZERO, ZERO, 0))
+        actual = (row.total_credit, row.total_debit, row.transaction_count)
+        expected = (credit, debit, count)
+        if actual != expected:
+            problems.append(f"student {row.student_id} {row.term}: subtotal {actual} != transactions {expected}")
+    for student_id, term in terms.keys() - seen:
+        problems.append(f"student {student_id} {term}: no term subtotal row")
+
+    return problems
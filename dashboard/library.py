@@ -0,0 +1,167 @@
+"""
+Downloads of library PDFs.
+
+Media is only served by Django when DEBUG is on (university_portal/urls.py),
+so signed-in users get a LibraryItem's PDF from ``pdf_response``:
+
+- Each upload's SHA-256 and size are stored with the item (``record_pdf``,
+  run before save). An upload identical to a file already stored for
+  another item is pointed at that file rather than stored a second time.
+- The digest is the download's ETag: a browser holding the file gets a 304,
+  and ``If-Range`` resumes only while the file is unchanged.
+- A single-range ``Range`` request is answered with 206 and just those
+  bytes, so interrupted downloads resume and PDF viewers can fetch pages on
+  demand. Whole files go through the WSGI server's file wrapper.
+- With ``PORTAL_SENDFILE`` set, the response only names the file and the
+  front-end server (nginx's X-Accel-Redirect, Apache's or lighttpd's
+  X-Sendfile) sends it, ranges included, without holding a Python worker.
+"""
+import hashlib
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header, parse_etags
+from django.utils.text import slugify
+
+from .models import LibraryItem
+
+
+CHUNK_SIZE = 256 * 1024
+SENDFILE_HEADERS = {'x-accel-redirect': 'X-Accel-Redirect', 'x-sendfile': 'X-Sendfile'}
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+def file_digest(file):
+    """``(sha256 hex digest, size)`` of an open file, read in chunks."""
+    digest, size = hashlib.sha256(), 0
+    file.seek(0)
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return digest.hexdigest(), size
+
+
+def record_pdf(item):
+    """Record the digest and size of a newly uploaded ``pdf_file``; reuse the stored copy of an identical file."""
+    pdf = item.pdf_file
+    if not pdf:
+        item.pdf_sha256, item.pdf_size = '', None
+        return
+    if pdf._committed:
+        return  # Not a new upload
+    item.pdf_sha256, item.pdf_size = file_digest(pdf.file)
+    stored = (LibraryItem.objects.filter(pdf_sha256=item.pdf_sha256).exclude(pdf_file='').exclude(pk=item.pk)
+              .values_list('pdf_file', flat=True).first())
+    if stored and default_storage.exists(stored):
+        pdf.name = stored
+        pdf._committed = True  # So FileField.pre_save does not store the upload again
+
+
+def ensure_recorded(item):
+    """Fill in the digest of a file uploaded before digests were recorded."""
+    if item.pdf_sha256:
+        return
+    try:
+        with default_storage.open(item.pdf_file.name) as file:
+            item.pdf_sha256, item.pdf_size = file_digest(file)
+    except FileNotFoundError:
+        raise Http404("The file is missing from storage.")
+    # update(), not save(): nothing shown on any page changed
+    LibraryItem.objects.filter(pk=item.pk).update(pdf_sha256=item.pdf_sha256, pdf_size=item.pdf_size)
+
+
+def requested_range(header, size):
+    """``(first, last)`` byte offsets asked for by a ``Range`` header, or None to send the whole file.
+
+    Multiple ranges, other units and malformed headers get the whole file,
+    as RFC 9110 allows. Raises ValueError when the range lies past the end.
+    """
+    match = RANGE_RE.fullmatch(header.strip()) if header else None
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the final ``last`` bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError(header)
+        return max(size - int(last), 0), size - 1
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= size:
+        raise ValueError(header)
+    return first, min(int(last), size - 1) if last else size - 1
+
+
+def read_range(file, first, length):
+    try:
+        file.seek(first)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def sendfile_response(name):
+    header = SENDFILE_HEADERS.get(settings.PORTAL_SENDFILE)
+    if header is None:
+        raise ImproperlyConfigured(
+            f"PORTAL_SENDFILE must be one of {', '.join(SENDFILE_HEADERS)}, not {settings.PORTAL_SENDFILE!r}.")
+    response = HttpResponse(content_type='application/pdf')
+    if header == 'X-Accel-Redirect':
+        # An nginx ``internal`` location aliased to MEDIA_ROOT
+        response[header] = quote(f"{settings.PORTAL_SENDFILE_PREFIX.rstrip('/')}/{name}")
+    else:
+        response[header] = default_storage.path(name)
+    return response
+
+
+def pdf_response(request, item):
+    """The response to a GET of ``item``'s PDF: the file, part of it, a 304 or a 416."""
+    if not item.pdf_file:
+        raise Http404("This library item has no PDF.")
+    ensure_recorded(item)
+    name, size, etag = item.pdf_file.name, item.pdf_size, f'"{item.pdf_sha256}"'
+
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    elif settings.PORTAL_SENDFILE:
+        response = sendfile_response(name)
+    else:
+        byte_range = None
+        if request.headers.get('If-Range', etag) == etag:  # A changed file is sent whole
+            try:
+                byte_range = requested_range(request.headers.get('Range'), size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+        try:
+            file = default_storage.open(name)
+        except FileNotFoundError:
+            raise Http404("The file is missing from storage.")
+        if byte_range is None:
+            response = FileResponse(file, content_type='application/pdf')
+            response.block_size = CHUNK_SIZE
+        else:
+            first, last = byte_range
+            response = StreamingHttpResponse(read_range(file, first, last - first + 1),
+                                             status=206, content_type='application/pdf')
+            response['Content-Length'] = last - first + 1
+            response['Content-Range'] = f'bytes {first}-{last}/{size}'
+
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = content_disposition_header(False, f'{slugify(item.title) or "document"}.pdf')
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
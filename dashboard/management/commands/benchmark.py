@@ -0,0 +1,111 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import benchmark
+from dashboard.management.commands.generate_dataset import PASSWORD, USERNAME_PREFIX
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every dashboard URL with concurrent logged-in sessions, through the test client "
+        "or against a running server (--url), or with --logins the login form itself. Saves the results "
+        "as JSON and, with --compare, fails when a route regressed against a saved run. Run "
+        "generate_dataset first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Base URL of a running server, e.g. http://127.0.0.1:8000. "
+                                          "Default: serve in-process through the test client.")
+        parser.add_argument('--requests', type=int, default=50, help="Requests per route (default 50).")
+        parser.add_argument('--concurrency', type=int, default=4, help="Concurrent sessions (default 4).")
+        parser.add_argument('--route', action='append', dest='routes',
+                            help="Only routes whose name contains this text (repeatable).")
+        parser.add_argument('--password', default=PASSWORD, help="Students' password (--url only).")
+        parser.add_argument('--staff', help="Staff username for staff pages. Default: the first active staff user.")
+        parser.add_argument('--staff-password', help="Staff password (--url only).")
+        parser.add_argument('--cold', action='store_true', help="Empty the response cache before every request.")
+        parser.add_argument('--logins', type=int, metavar='N',
+                            help="Instead of the routes, sign in N times through the login form (in-process), "
+                                 "counting the queries and writes each login costs.")
+        parser.add_argument('--output', help="Where to save the JSON results. Default: var/benchmarks/<time>.json.")
+        parser.add_argument('--compare', metavar='BASELINE', help="Saved results to compare against.")
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help="Allowed p95 slowdown in percent before --compare fails (default 20).")
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help="Ignore p95 changes smaller than this (default 2 ms).")
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        if options['logins'] and options['url']:
+            raise CommandError("--logins runs in-process; it cannot be combined with --url.")
+        students = list(User.objects.filter(username__startswith=USERNAME_PREFIX, is_active=True)
+                        .order_by('username')[:max(concurrency, options['logins'] or 0)])  # A login each, if enough
+        if not students:
+            raise CommandError("No synthetic students found; run generate_dataset first.")
+        staff = User.objects.filter(is_staff=True, is_active=True).order_by('pk')
+        staff = staff.filter(username=options['staff']).first() if options['staff'] else staff.first()
+        if options['url'] and staff and not options['staff_password']:
+            staff = None
+        if staff is None:
+            self.stderr.write("No staff user to log in as (or no --staff-password); skipping staff pages.")
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read {options['compare']}: {exc}")
+
+        routes = benchmark.discover_routes()
+        if options['routes']:
+            routes = [route for route in routes if any(text in route.name for text in options['routes'])]
+
+        try:
+            if options['logins']:
+                results = benchmark.run_logins(students, options['password'], logins=options['logins'],
+                                               concurrency=concurrency)
+            else:
+                results = benchmark.run(
+                    routes, students, staff=staff, requests_per_route=options['requests'], concurrency=concurrency,
+                    base_url=options['url'], password=options['password'], staff_password=options['staff_password'],
+                    cold=options['cold'],
+                )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        self.report(results)
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'var', 'benchmarks', time.strftime('%Y%m%d-%H%M%S') + '.json'
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(f"Saved to {output}")
+
+        if baseline is not None:
+            problems = benchmark.compare(results, baseline, options['threshold'] / 100, options['min_delta_ms'])
+            for problem in problems:
+                self.stderr.write(problem)
+            if problems:
+                raise CommandError(f"{len(problems)} regressions against {options['compare']}.")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}."))
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'route':<28}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'writes':>8}"
+            f"{'db ms':>8}{'errors':>8}"
+        )
+        for name, route in results['routes'].items():
+            queries = '-' if route['queries_mean'] is None else f"{route['queries_mean']:g}"
+            writes = '-' if route.get('writes_mean') is None else f"{route['writes_mean']:g}"
+            db_ms = '-' if route['db_ms_mean'] is None else f"{route['db_ms_mean']:.1f}"
+            self.stdout.write(
+                f"{name:<28}{route['throughput_rps']:>9.1f}{route['p50_ms']:>9.1f}{route['p95_ms']:>9.1f}"
+                f"{route['p99_ms']:>9.1f}{queries:>9}{writes:>8}{db_ms:>8}{route['errors']:>8}"
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import images
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the resized variants of stored profile pictures and homepage backgrounds that do not have "
+        "them yet, e.g. after a bulk load or a change to dashboard.images.VARIANTS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild every image, not just the missing ones.")
+        parser.add_argument('--queue', action='store_true', help="Queue the builds for run_jobs instead.")
+
+    def handle(self, *args, **options):
+        rendered = {}  # Source name -> variants, so a picture many profiles share is resized once
+        for model, fields in images.FIELDS.items():
+            for field_name in fields:
+                count = 0
+                for instance in model.objects.exclude(**{field_name: ''}).iterator():
+                    if not options['force'] and not images.needs_build(instance, field_name):
+                        continue
+                    if options['queue']:
+                        images.queue(instance, field_name)
+                    else:
+                        images.build(model._meta.label_lower, instance.pk, field_name, rendered=rendered)
+                    count += 1
+                self.stdout.write(f"{model._meta.verbose_name} {field_name}: "
+                                  f"{count} {'queued' if options['queue'] else 'built'}")
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,106 @@
+import asyncio
+import statistics
+import time
+from contextlib import contextmanager
+from importlib import import_module
+from types import ModuleType
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import URLResolver, include, path
+
+from dashboard import response_cache
+
+
+DEFAULT_PATHS = ['/portal/dashboard/', '/portal/finance/', '/portal/courses/', '/portal/events/']
+
+
+@contextmanager
+def serving_async_views():
+    """Route the read-only pages to dashboard.async_views for the duration of the block.
+
+    For comparing both paths in one process (this command and the tests);
+    the site itself picks them with PORTAL_ASYNC_VIEWS.
+    """
+    urlconf = ModuleType('async_site_urls')
+    urlconf.urlpatterns = [
+        path('', include('dashboard.async_urls', namespace='dashboard'))
+        if isinstance(pattern, URLResolver) and pattern.namespace == 'dashboard' else pattern
+        for pattern in import_module(settings.ROOT_URLCONF).urlpatterns
+    ]
+    with override_settings(ROOT_URLCONF=urlconf):
+        yield
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the same portal pages through the sync views (WSGI handler, one request at a time, "
+        "like a sync gunicorn worker) and the async views (ASGI handler, --concurrency requests in "
+        "flight on one event loop), against the current database, and compare throughput and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help="Student to log in as.")
+        parser.add_argument('--path', action='append', dest='paths', help="Page to request (repeatable).")
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--cold', action='store_true', help="Empty the response cache before every request.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}.")
+        paths = options['paths'] or DEFAULT_PATHS
+        urls = [paths[i % len(paths)] for i in range(options['requests'])]
+
+        # The test clients send Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            sync_result = self.run_sync(user, urls, options)
+            with serving_async_views():
+                async_result = asyncio.run(self.run_async(user, urls, options))
+
+        for label, (elapsed, latencies) in (('sync', sync_result), (f"async x{options['concurrency']}", async_result)):
+            self.stdout.write(
+                f"{label:>12}: {len(latencies) / elapsed:8.1f} req/s   "
+                f"mean {statistics.mean(latencies) * 1000:7.1f} ms   "
+                f"p95 {statistics.quantiles(latencies, n=20)[-1] * 1000:7.1f} ms"
+            )
+
+    def check_response(self, url, response):
+        if response.status_code != 200:
+            raise CommandError(f"{url} returned {response.status_code}.")
+
+    def run_sync(self, user, urls, options):
+        client = Client()
+        client.force_login(user)
+        latencies = []
+        started = time.perf_counter()
+        for url in urls:
+            if options['cold']:
+                response_cache.responses.clear()
+            began = time.perf_counter()
+            self.check_response(url, client.get(url))
+            latencies.append(time.perf_counter() - began)
+        return time.perf_counter() - started, latencies
+
+    async def run_async(self, user, urls, options):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        limit = asyncio.Semaphore(options['concurrency'])
+        latencies = []
+
+        async def fetch(url):
+            async with limit:
+                if options['cold']:
+                    response_cache.responses.clear()
+                began = time.perf_counter()
+                self.check_response(url, await client.get(url))
+                latencies.append(time.perf_counter() - began)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(fetch(url) for url in urls))
+        return time.perf_counter() - started, latencies
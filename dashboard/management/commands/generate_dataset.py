@@ -0,0 +1,237 @@
+import datetime
+import functools
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, transaction as db_transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from dashboard import analytics, ledger, search, stamps, stats
+from dashboard.models import (
+    PortalPage, Course, Enrollment, Grade, Transaction, LibraryItem, Event, FAQ, Profile,
+    StudentLedger, LedgerTermTotal, CourseStats, GradeStats, ChangeStamp, StudentGPA, CourseGradeSummary,
+    GeneratedDocument,
+)
+
+
+USERNAME_PREFIX = 'stu'
+PASSWORD = 'password123'
+DEFAULT_PICTURE = Profile._meta.get_field('profile_picture').default
+
+FIRST_NAMES = ['Ada', 'Chinedu', 'Fatima', 'Grace', 'Ibrahim', 'James', 'Kemi', 'Liam', 'Maryam', 'Noah',
+               'Olivia', 'Samuel', 'Tunde', 'Uche', 'Victoria', 'Yusuf', 'Zainab', 'Daniel', 'Esther', 'Musa']
+LAST_NAMES = ['Adeyemi', 'Brown', 'Chukwu', 'Davies', 'Eze', 'Johnson', 'Okafor', 'Smith', 'Bello', 'Williams',
+              'Nwosu', 'Taylor', 'Abubakar', 'Martin', 'Ogunleye', 'Clark', 'Ibrahim', 'Lewis', 'Obi', 'Walker']
+DEPARTMENTS = {
+    'CSC': 'Computer Science', 'MTH': 'Mathematics', 'PHY': 'Physics', 'CHM': 'Chemistry', 'BIO': 'Biology',
+    'ENG': 'English', 'HIS': 'History', 'ECO': 'Economics', 'ACC': 'Accounting', 'LAW': 'Law',
+}
+TOPICS = ['Foundations', 'Methods', 'Theory', 'Practice', 'Analysis', 'Systems', 'Design', 'Seminar',
+          'Laboratory', 'Research']
+GRADES = ['A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D', 'F']
+GRADE_WEIGHTS = [12, 10, 12, 14, 12, 10, 10, 8, 7, 5]
+CREDIT_UNITS = [2, 3, 3, 4]
+EVENT_KINDS = ['Orientation', 'Career Fair', 'Guest Lecture', 'Workshop', 'Tournament', 'Seminar', 'Open Day']
+FAQ_CATEGORIES = [key for key, _ in FAQ.CATEGORY_CHOICES]
+EVENT_CATEGORIES = [key for key, _ in Event.CATEGORY_CHOICES]
+FEES = [('Tuition Fee', Decimal('250000.00')), ('Lab Fee', Decimal('15000.00')), ('Library Fee', Decimal('5000.00'))]
+CHARGES = [('Library Fine', Decimal('1000.00')), ('Printing Charges', Decimal('500.00')), ('Hostel Fee', Decimal('80000.00'))]
+
+
+def insert_rows(cursor, model, fields, rows):
+    """INSERT ``rows`` (tuples of database-ready values for ``fields``) into ``model``'s table."""
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    cursor.executemany(f"INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})", rows)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic dataset (students, courses, enrollments, grades, transactions, "
+        f"events, library items, FAQs) with bulk inserts. Every student's password is {PASSWORD!r}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=100, help="Number of students (10 to 500000).")
+        parser.add_argument('--seed', type=int, default=1, help="Random seed; the same seed gives the same data.")
+        parser.add_argument(
+            '--reset', action='store_true',
+            help=f"First delete the students whose username starts with {USERNAME_PREFIX!r} and their records, "
+                 "and all courses, events, library items and FAQs. Refused while other students have records.",
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help="Students written per transaction.")
+
+    def handle(self, *args, students, seed, reset, batch_size, **options):
+        if not 10 <= students <= 500000:
+            raise CommandError("--students must be between 10 and 500000.")
+        if reset:
+            self.reset()
+        elif User.objects.filter(username__startswith=USERNAME_PREFIX).exists() or Course.objects.exists():
+            raise CommandError("The database already has data; rerun with --reset to replace it.")
+
+        started = time.monotonic()
+        rng = random.Random(seed)
+        self.password = make_password(PASSWORD)  # Hashed once and shared by every student
+        today = timezone.localdate()
+        self.year = today.year - (1 if today.month < 9 else 0)  # Start of the current academic year
+
+        for key, label in PortalPage.PAGE_CHOICES:
+            PortalPage.objects.get_or_create(page_key=key, defaults={'heading': label})
+        course_ids = self.create_courses(rng, max(10, min(2000, students // 100)))
+        self.create_catalogue(rng, students)
+
+        self.next_user_id = User.objects.aggregate(last=Max('id'))['last'] or 0
+        for start in range(0, students, batch_size):
+            with db_transaction.atomic():
+                self.create_students(rng, range(start, min(start + batch_size, students)), course_ids)
+            self.stdout.write(f"  {min(start + batch_size, students)} / {students} students")
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [User, Profile, Enrollment, Grade, Transaction]):
+                cursor.execute(sql)
+
+        # Bulk inserts skip the signal handlers; rebuild what they maintain
+        ledger.rebuild()
+        stats.reconcile()
+        analytics.rebuild()
+        search.rebuild()
+        stamps.touch('portalpage')  # Every cached page and ETag depends on it
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {students} students, {len(course_ids)} courses, {Enrollment.objects.count()} enrollments, "
+            f"{Grade.objects.count()} grades and {Transaction.objects.count()} transactions "
+            f"in {time.monotonic() - started:.1f}s. Log in as {USERNAME_PREFIX}000001 / {PASSWORD}."
+        ))
+
+    def reset(self):
+        students = User.objects.filter(username__startswith=USERNAME_PREFIX, is_staff=False, is_superuser=False)
+        # The catalogue goes too, so it must not hold anyone else's records
+        for model in (Enrollment, Grade, Transaction):
+            if model.objects.exclude(student__in=students).exists():
+                raise CommandError(
+                    f"Students other than the generated ones have {model._meta.verbose_name_plural}; "
+                    "--reset would delete them with the courses."
+                )
+
+        # Raw deletes skip the cascade collector and the per-row signal
+        # handlers, which would take minutes on large datasets; what those
+        # handlers maintain is brought up to date below.
+        for model in (Enrollment, Grade, Transaction, StudentLedger, LedgerTermTotal, StudentGPA):
+            model.objects.filter(student__in=students)._raw_delete(model.objects.db)
+        for model in (CourseStats, GradeStats, CourseGradeSummary, Course, Event, LibraryItem, FAQ):
+            model.objects.all()._raw_delete(model.objects.db)
+        Profile.objects.filter(user__in=students)._raw_delete(Profile.objects.db)
+        documents = GeneratedDocument.objects.filter(student__in=students)
+        for path in documents.exclude(path='').values_list('path', flat=True):
+            default_storage.delete(path)
+        documents._raw_delete(GeneratedDocument.objects.db)
+        students._raw_delete(User.objects.db)
+
+        search.rebuild()
+        stats.reconcile()
+        # New students reuse the deleted ids, so their stamps move on rather than start over
+        ChangeStamp.objects.filter(key__startswith='user:').update(version=F('version') + 1, changed_at=timezone.now())
+        stamps.touch('course', 'event', 'libraryitem', 'faq')
+
+    def create_courses(self, rng, count):
+        courses = []
+        for i in range(count):
+            prefix = list(DEPARTMENTS)[i % len(DEPARTMENTS)]
+            level = 100 * (1 + (i // len(DEPARTMENTS)) % 4) + i // (4 * len(DEPARTMENTS))
+            topic = rng.choice(TOPICS)
+            courses.append(Course(
+                code=f'{prefix}{level}',
+                name=f'{DEPARTMENTS[prefix]} {topic} {level // 100}',
+                description=f'<p>{topic} in {DEPARTMENTS[prefix].lower()} for level {level // 100} students.</p>',
+                credit_units=rng.choice(CREDIT_UNITS),
+            ))
+        return [course.pk for course in Course.objects.bulk_create(courses, batch_size=500)]
+
+    def create_catalogue(self, rng, students):
+        start = datetime.date(self.year, 9, 1)
+        Event.objects.bulk_create([
+            Event(
+                title=f'{rng.choice(EVENT_KINDS)} {i + 1}',
+                date=start + datetime.timedelta(days=rng.randrange(300)),
+                location=rng.choice(['Main Auditorium', 'Exhibition Hall', 'Room 204', 'Sports Complex']),
+                description='<p>Open to all students.</p>',
+                category=rng.choice(EVENT_CATEGORIES),
+            )
+            for i in range(max(20, min(5000, students // 50)))
+        ], batch_size=500)
+        # Raw inserts: bulk_create would stamp today on the auto_now_add date_added
+        day = connection.ops.adapt_datefield_value
+        with connection.cursor() as cursor:
+            insert_rows(cursor, LibraryItem, ['title', 'author', 'description', 'pdf_file', 'pdf_sha256', 'date_added'], [
+                (
+                    f'{rng.choice(list(DEPARTMENTS.values()))} {rng.choice(TOPICS)}, Volume {i + 1}',
+                    f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                    f'<p>Reference text covering {rng.choice(TOPICS).lower()}.</p>',
+                    '', '', day(start - datetime.timedelta(days=rng.randrange(2000))),
+                )
+                for i in range(max(20, min(50000, students // 10)))
+            ])
+        FAQ.objects.bulk_create([
+            FAQ(
+                question=f'Question {i + 1} about {category}?',
+                answer=f'<p>Answer {i + 1}: contact the {category} office.</p>',
+                category=category,
+            )
+            for i, category in enumerate(rng.choice(FAQ_CATEGORIES) for _ in range(50))
+        ], batch_size=500)
+
+    def create_students(self, rng, numbers, course_ids):
+        # The student tables are written with executemany and explicit ids:
+        # building model instances costs more than the inserts themselves.
+        ops = connection.ops
+        joined = ops.adapt_datetimefield_value(timezone.now())
+        today = timezone.localdate()
+        day = functools.lru_cache(maxsize=None)(ops.adapt_datefield_value)
+        money = functools.lru_cache(maxsize=None)(lambda amount: ops.adapt_decimalfield_value(amount, 10, 2))
+        first_term, second_term = datetime.date(self.year, 9, 15), datetime.date(self.year + 1, 2, 15)
+        # Enrollments open at the start of each term of the last two years, so term GPAs span several terms
+        enrollment_terms = [term for year in (self.year - 1, self.year)
+                            for term in (datetime.date(year, 9, 1), datetime.date(year + 1, 2, 1)) if term <= today]
+        term_fees = sum(amount for _, amount in FEES)
+
+        users, profiles, enrollments, grades, transactions = [], [], [], [], []
+        for n in numbers:
+            self.next_user_id += 1
+            user_id = self.next_user_id
+            username = f'{USERNAME_PREFIX}{n + 1:06d}'
+            users.append((user_id, self.password, False, username, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                          f'{username}@students.example.edu', False, True, joined))
+            profiles.append((user_id, DEFAULT_PICTURE, '{}'))  # The shared default gets no variants
+            for course_id in rng.sample(course_ids, k=min(len(course_ids), rng.randint(4, 6))):
+                enrolled = min(rng.choice(enrollment_terms) + datetime.timedelta(days=rng.randrange(14)), today)
+                enrollments.append((user_id, course_id, day(enrolled)))
+                if rng.random() < 0.8:
+                    grades.append((user_id, course_id, rng.choices(GRADES, GRADE_WEIGHTS)[0]))
+            for term_start in (first_term, second_term):
+                for description, amount in FEES:
+                    transactions.append((user_id, money(amount), description, day(term_start), False))
+                paid = rng.choice([Decimal('1'), Decimal('1'), Decimal('0.5'), Decimal('0')])
+                if paid:
+                    payment_day = term_start + datetime.timedelta(days=rng.randrange(1, 60))
+                    transactions.append((user_id, money((term_fees * paid).quantize(Decimal('0.01'))),
+                                         'Fee Payment', day(payment_day), True))
+                if rng.random() < 0.3:
+                    description, amount = rng.choice(CHARGES)
+                    charge_day = term_start + datetime.timedelta(days=rng.randrange(1, 120))
+                    transactions.append((user_id, money(amount), description, day(charge_day), False))
+
+        with connection.cursor() as cursor:
+            insert_rows(cursor, User, ['id', 'password', 'is_superuser', 'username', 'first_name', 'last_name',
+                                       'email', 'is_staff', 'is_active', 'date_joined'], users)
+            insert_rows(cursor, Profile, ['user', 'profile_picture', 'profile_picture_variants'], profiles)
+            insert_rows(cursor, Enrollment, ['student', 'course', 'date_enrolled'], enrollments)
+            insert_rows(cursor, Grade, ['student', 'course', 'grade'], grades)
+            insert_rows(cursor, Transaction, ['student', 'amount', 'description', 'date', 'is_credit'], transactions)
@@ -0,0 +1,63 @@
+import os
+import time
+from collections import Counter
+from concurrent.futures import as_completed
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from dashboard import documents
+from dashboard.concurrency import process_pool
+from dashboard.models import DocumentBatch
+
+
+class Command(BaseCommand):
+    help = (
+        "Bring every student's transcript or fee statement up to date, rendering only those whose rows "
+        "changed since the stored PDF. Progress is kept in a DocumentBatch, visible in the admin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(documents.TEMPLATES))
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Render processes (default: one per core); 1 renders in this process.")
+        parser.add_argument('--chunk-size', type=int, default=50, help="Students handed to a worker at a time.")
+
+    def handle(self, *args, **options):
+        kind, workers, chunk_size = options['kind'], options['workers'], options['chunk_size']
+        if workers < 1 or chunk_size < 1:
+            raise CommandError("--workers and --chunk-size must be at least 1.")
+
+        student_ids = list(User.objects.filter(is_staff=False, is_active=True).order_by('pk')
+                           .values_list('pk', flat=True))
+        chunks = [student_ids[start:start + chunk_size] for start in range(0, len(student_ids), chunk_size)]
+        batch = DocumentBatch.objects.create(kind=kind, total=len(student_ids), workers=workers)
+        counts = Counter()
+        started = time.monotonic()
+
+        def record(result):
+            counts.update(result)
+            DocumentBatch.objects.filter(pk=batch.pk).update(
+                rendered=counts['rendered'], unchanged=counts['unchanged'], failed=counts['failed'],
+            )
+            self.stdout.write(f"{sum(counts.values())} / {len(student_ids)}")
+
+        try:
+            if workers == 1:
+                for chunk in chunks:
+                    record(documents.build_many(kind, chunk))
+            else:
+                with process_pool(workers) as pool:
+                    futures = [pool.submit(documents.build_many, kind, chunk) for chunk in chunks]
+                    for future in as_completed(futures):
+                        record(future.result())
+        except BaseException:
+            DocumentBatch.objects.filter(pk=batch.pk).update(status='failed', finished_at=timezone.now())
+            raise
+        DocumentBatch.objects.filter(pk=batch.pk).update(status='finished', finished_at=timezone.now())
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['rendered']} rendered, {counts['unchanged']} unchanged, {counts['failed']} failed "
+            f"of {len(student_ids)} in {time.monotonic() - started:.1f}s with {workers} workers."
+        ))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import importer
+from dashboard.models import ImportRun
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import enrollments, grades or transactions from a CSV or JSONL file "
+        "(see dashboard/importer.py for the columns)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=[kind for kind, _ in ImportRun.KIND_CHOICES])
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Default: from the file extension.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and report without writing.")
+        parser.add_argument(
+            '--resume', action='store_true',
+            help="Continue an unfinished import of the same file from its checkpoint.",
+        )
+        parser.add_argument('--chunk-size', type=int, default=importer.CHUNK_SIZE)
+        parser.add_argument('--show-errors', type=int, default=20, help="Row errors to print (default 20).")
+
+    def handle(self, *args, **options):
+        try:
+            fileobj = open(options['path'], 'rb')
+        except OSError as exc:
+            raise CommandError(f"Cannot open {options['path']}: {exc}")
+        with fileobj:
+            run = importer.run_import(
+                options['kind'], fileobj, options['path'], fmt=options['format'],
+                dry_run=options['dry_run'], resume=options['resume'], chunk_size=options['chunk_size'],
+            )
+
+        for error in run.errors[:options['show_errors']]:
+            self.stderr.write(f"row {error['row']}: {error['message']}")
+        if run.error_count > options['show_errors']:
+            self.stderr.write(f"... and {run.error_count - options['show_errors']} more row errors.")
+
+        summary = (
+            f"{run.rows_processed} rows read: {run.created_count} created, {run.updated_count} updated, "
+            f"{run.skipped_count} unchanged, {run.error_count} rejected."
+        )
+        if run.status == 'failed':
+            raise CommandError(
+                f"Import #{run.pk} failed after {run.rows_processed} rows: {run.failure}\n"
+                f"Fix the cause and rerun with --resume to continue from there."
+            )
+        prefix = "Dry run, nothing written. " if run.dry_run else f"Import #{run.pk} finished. "
+        self.stdout.write(self.style.SUCCESS(prefix + summary))
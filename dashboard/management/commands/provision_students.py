@@ -0,0 +1,65 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from dashboard import provisioning
+from dashboard.models import Roster
+
+
+class Command(BaseCommand):
+    help = (
+        "Create student accounts from an intake roster (CSV or JSONL: username, first_name, last_name, email), "
+        "hashing the initial passwords across a process pool, and write the credentials report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Default: from the file extension.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Hashing processes (default: one per core); 1 hashes in this process.")
+        parser.add_argument('--batch-size', type=int, default=provisioning.BATCH_SIZE,
+                            help="Rows hashed and inserted per transaction.")
+        parser.add_argument('--report', help="Where to write usernames and initial passwords (CSV, readable by "
+                                             "you only). Default: <roster>-credentials.csv next to the roster.")
+        parser.add_argument('--show-errors', type=int, default=20, help="Row errors to print (default 20).")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--workers and --batch-size must be at least 1.")
+        report = options['report'] or f"{os.path.splitext(options['path'])[0]}-credentials.csv"
+        try:
+            fileobj = open(options['path'], 'rb')
+        except OSError as exc:
+            raise CommandError(f"Cannot open {options['path']}: {exc}")
+
+        try:
+            report_file = provisioning.open_credentials(report, append=False)
+        except OSError as exc:
+            fileobj.close()
+            raise CommandError(f"Cannot write {report}: {exc}")
+
+        started = time.monotonic()
+        # Kept even after a failure: it holds the only copy of the passwords already issued
+        with fileobj, report_file:
+            report_file.write(provisioning.credentials_header())
+            roster = Roster.objects.create(name=options['path'])
+            provisioning.provision(roster, fileobj, report_file, fmt=options['format'],
+                                   workers=options['workers'], batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        Roster.objects.filter(pk=roster.pk).update(credentials_taken_at=timezone.now())
+
+        for error in roster.errors[:options['show_errors']]:
+            self.stderr.write(f"row {error['row']}: {error['message']}")
+        if roster.error_count > options['show_errors']:
+            self.stderr.write(f"... and {roster.error_count - options['show_errors']} more row errors.")
+
+        summary = (
+            f"{roster.created_count} accounts created, {roster.error_count} rows rejected, in {elapsed:.1f}s "
+            f"with {options['workers']} workers. Initial passwords are in {report}."
+        )
+        if roster.status == 'failed':
+            raise CommandError(f"Roster #{roster.pk} failed after {roster.rows_processed} rows: {roster.failure}\n"
+                               f"{summary}")
+        self.stdout.write(self.style.SUCCESS(f"Roster #{roster.pk} finished. {summary}"))
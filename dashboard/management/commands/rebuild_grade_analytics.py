@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard import analytics
+
+
+class Command(BaseCommand):
+    help = "Recompute every student's GPAs and every course's grade summary from the Grade table."
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        students, courses = analytics.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt GPAs of {students} students and summaries of {courses} courses "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import ledger
+
+
+class Command(BaseCommand):
+    help = "Rebuild student ledgers from the Transaction table, or check them for drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only compare stored ledgers against the transactions; exit non-zero on drift.",
+        )
+        parser.add_argument(
+            '--student', type=int, action='append', dest='student_ids',
+            help="Limit to this student id (can be repeated).",
+        )
+
+    def handle(self, *args, check=False, student_ids=None, **options):
+        if check:
+            problems = ledger.check(student_ids)
+            for problem in problems:
+                self.stderr.write(problem)
+            if problems:
+                raise CommandError(f"{len(problems)} ledger discrepancies found.")
+            self.stdout.write(self.style.SUCCESS("Ledger matches the transaction history."))
+            return
+
+        count = ledger.rebuild(student_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} student ledgers."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for library items, FAQs and courses."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sources', nargs='*',
+            help=f"Only rebuild these sources: {', '.join(sorted(search.SOURCES))} (default: all).",
+        )
+
+    def handle(self, *args, sources=None, **options):
+        if not search.available():
+            raise CommandError("Full-text search needs SQLite with FTS5; the portal falls back to plain filters.")
+        unknown = set(sources) - set(search.SOURCES)
+        if unknown:
+            raise CommandError(f"Unknown search source(s): {', '.join(sorted(unknown))}")
+        for kind, count in search.rebuild(sources or None).items():
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} {kind} documents."))
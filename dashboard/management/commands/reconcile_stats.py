@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the admin dashboard statistics snapshot from scratch. A run_jobs worker does this hourly; "
+        "without one, run it periodically (e.g. hourly from cron)."
+    )
+
+    def handle(self, *args, **options):
+        snapshot = stats.reconcile()
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled: {snapshot.total_students} users, {snapshot.total_courses} courses, "
+            f"{snapshot.total_enrollments} enrollments, {snapshot.total_transactions} transactions."
+        ))
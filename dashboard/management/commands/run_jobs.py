@@ -0,0 +1,46 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued jobs until stopped (SIGINT or SIGTERM lets running jobs finish). Start one per box, "
+        "or more: workers share the queue safely."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Jobs run at a time (default: 2).")
+        parser.add_argument('--processes', action='store_true',
+                            help="Run jobs in separate processes, for CPU-bound tasks such as PDF rendering.")
+        parser.add_argument('--burst', action='store_true', help="Exit once no job is due.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds between looks at an idle queue (default: 1).")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1.")
+
+        stop = threading.Event()
+
+        def request_stop(signum, frame):
+            self.stdout.write("Stopping once the running jobs finish...")
+            stop.set()
+
+        previous = {signum: signal.signal(signum, request_stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+        self.stdout.write(
+            f"Worker {jobs.worker_name()} running {options['workers']} jobs at a time in "
+            f"{'processes' if options['processes'] else 'threads'}."
+        )
+        try:
+            ran = jobs.run_worker(
+                workers=options['workers'], processes=options['processes'], burst=options['burst'],
+                poll_interval=options['poll_interval'], stop=stop,
+            )
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(f"Ran {ran} jobs."))
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def term_for_date(day):
+    start_year = day.year if day.month >= 9 else day.year - 1
+    semester = 'First' if day.month >= 9 or day.month == 1 else 'Second'
+    return f"{start_year}/{start_year + 1} {semester} Semester"
+
+
+def build_ledger(apps, schema_editor):
+    Transaction = apps.get_model('dashboard', 'Transaction')
+    StudentLedger = apps.get_model('dashboard', 'StudentLedger')
+    LedgerTermTotal = apps.get_model('dashboard', 'LedgerTermTotal')
+
+    ledgers = {}
+    terms = {}
+    for t in Transaction.objects.values('student_id', 'date', 'amount', 'is_credit').iterator():
+        credit = t['amount'] if t['is_credit'] else 0
+        debit = 0 if t['is_credit'] else t['amount']
+        for totals in (
+            ledgers.setdefault(t['student_id'], [0, 0, 0]),
+            terms.setdefault((t['student_id'], term_for_date(t['date'])), [0, 0, 0]),
+        ):
+            totals[0] += credit
+            totals[1] += debit
+            totals[2] += 1
+
+    StudentLedger.objects.bulk_create([
+        StudentLedger(student_id=student_id, total_credit=credit, total_debit=debit,
+                      balance=debit - credit, transaction_count=count)
+        for student_id, (credit, debit, count) in ledgers.items()
+    ])
+    LedgerTermTotal.objects.bulk_create([
+        LedgerTermTotal(student_id=student_id, term=term, total_credit=credit,
+                        total_debit=debit, transaction_count=count)
+        for (student_id, term), (credit, debit, count) in terms.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_profile_bio_alter_profile_address_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_credit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_debit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerTermTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=40)),
+                ('total_credit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_debit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['term'],
+                'unique_together': {('student', 'term')},
+            },
+        ),
+        migrations.RunPython(build_ledger, migrations.RunPython.noop),
+    ]
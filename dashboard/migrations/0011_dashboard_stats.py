@@ -0,0 +1,50 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_student_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_students', models.IntegerField(default=0)),
+                ('total_courses', models.IntegerField(default=0)),
+                ('total_enrollments', models.IntegerField(default=0)),
+                ('total_transactions', models.IntegerField(default=0)),
+                ('total_credit', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_debit', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'dashboard stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='GradeStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grade', models.CharField(max_length=2, unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['grade'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enrollment_count', models.IntegerField(default=0)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='dashboard.course')),
+            ],
+        ),
+    ]
@@ -0,0 +1,57 @@
+from html import unescape
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+TABLES = {
+    'dashboard_search_library': 'LibraryItem',
+    'dashboard_search_faq': 'FAQ',
+    'dashboard_search_course': 'Course',
+}
+
+
+def html_to_text(html):
+    return ' '.join(unescape(strip_tags(html or '')).split())
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    FAQ = apps.get_model('dashboard', 'FAQ')
+    categories = dict(FAQ._meta.get_field('category').choices)
+    documents = {
+        'LibraryItem': lambda obj: (obj.title, obj.author, html_to_text(obj.description)),
+        'FAQ': lambda obj: (obj.question, categories.get(obj.category, obj.category), html_to_text(obj.answer)),
+        'Course': lambda obj: (obj.name, obj.code, html_to_text(obj.description)),
+    }
+    for table, model_name in TABLES.items():
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+            f"title, byline, body, tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        model = apps.get_model('dashboard', model_name)
+        rows = [[obj.pk, *documents[model_name](obj)] for obj in model.objects.all()]
+        if rows:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {table} (rowid, title, byline, body) VALUES (%s, %s, %s, %s)", rows
+                )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in TABLES:
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_dashboard_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', 'date_enrolled', 'id'], name='dashboard_e_student_d2bc37_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date', 'id'], name='dashboard_e_date_876c67_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['category', 'date', 'id'], name='dashboard_e_categor_4cd9af_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libraryitem',
+            index=models.Index(fields=['title', 'id'], name='dashboard_l_title_c18b16_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['student', 'date', 'id'], name='dashboard_t_student_560d2a_idx'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:17
+
+import django.db.models.deletion
+import tinymce.models
+from django.db import migrations, models
+
+
+# Old PortalPage column -> PortalSection key
+COLUMNS = {
+    'main_content': 'main',
+    'courses_content': 'courses',
+    'grades_content': 'grades',
+    'finance_content': 'finance',
+    'library_content': 'library',
+    'events_content': 'events',
+    'help_content': 'help',
+    'profile_content': 'profile',
+}
+
+
+def move_content_to_sections(apps, schema_editor):
+    PortalPage = apps.get_model('dashboard', 'PortalPage')
+    PortalSection = apps.get_model('dashboard', 'PortalSection')
+    PortalSection.objects.bulk_create([
+        PortalSection(page=page, key=key, content=getattr(page, column))
+        for page in PortalPage.objects.all()
+        for column, key in COLUMNS.items()
+        if getattr(page, column)
+    ])
+
+
+def move_sections_to_content(apps, schema_editor):
+    PortalPage = apps.get_model('dashboard', 'PortalPage')
+    PortalSection = apps.get_model('dashboard', 'PortalSection')
+    fields = {key: column for column, key in COLUMNS.items()}
+    for page in PortalPage.objects.all():
+        for section in PortalSection.objects.filter(page=page):
+            setattr(page, fields[section.key], section.content)
+        page.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0013_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortalSection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(choices=[('main', 'Main'), ('courses', 'Courses'), ('grades', 'Grades'), ('finance', 'Finance'), ('library', 'Library'), ('events', 'Events'), ('help', 'Help'), ('profile', 'Profile')], max_length=20)),
+                ('content', tinymce.models.HTMLField(blank=True)),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sections', to='dashboard.portalpage')),
+            ],
+            options={
+                'ordering': ['page', 'key'],
+                'unique_together': {('page', 'key')},
+            },
+        ),
+        migrations.RunPython(move_content_to_sections, move_sections_to_content),
+        migrations.RemoveField(
+            model_name='portalpage',
+            name='courses_content',
+        ),
+        migrations.RemoveField(
+            model_name='portalpage',
+            name='events_content',
+        ),
+        migrations.RemoveField(
+            model_name='portalpage',
+            name='finance_content',
+        ),
+        migrations.RemoveField(
+            model_name='portalpage',
+            name='grades_content',
+        ),
+        migrations.RemoveField(
+            model_name='portalpage',
+            name='help_content',
+        ),
+        migrations.RemoveField(
+            model_name='portalpage',
+            name='library_content',
+        ),
+        migrations.RemoveField(
+            model_name='portalpage',
+            name='main_content',
+        ),
+        migrations.RemoveField(
+            model_name='portalpage',
+            name='profile_content',
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0016_import_runs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilingSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('sample', 'Statistical sampler (collapsed stacks)'), ('cprofile', 'cProfile (pstats)')], default='sample', max_length=10)),
+                ('route', models.CharField(blank=True, help_text='URL pattern such as /portal/<page_key>/; blank for every page.', max_length=255)),
+                ('sample_rate', models.FloatField(default=0.1, help_text='Share of matching requests to profile, from 0 to 1.')),
+                ('interval_ms', models.PositiveIntegerField(default=5, help_text='Time between stack samples (sampler only).')),
+                ('min_duration_ms', models.PositiveIntegerField(default=0, help_text='Discard profiles of faster requests.')),
+                ('max_captures', models.PositiveIntegerField(default=200, help_text='Stop after keeping this many profiles.')),
+                ('captured', models.PositiveIntegerField(default=0)),
+                ('active', models.BooleanField(default=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('stopped_at', models.DateTimeField(blank=True, null=True)),
+                ('started_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProfileCapture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500)),
+                ('duration_ms', models.FloatField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('stacks', models.TextField(blank=True)),
+                ('stats', models.BinaryField(blank=True, null=True)),
+                ('captured_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='captures', to='dashboard.profilingsession')),
+            ],
+            options={
+                'ordering': ['-captured_at'],
+            },
+        ),
+    ]
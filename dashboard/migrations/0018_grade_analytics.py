@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0017_profiling'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='credit_units',
+            field=models.PositiveSmallIntegerField(default=3),
+        ),
+        migrations.CreateModel(
+            name='CourseGradeSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('graded_count', models.IntegerField(default=0)),
+                ('mean_points', models.FloatField(default=0)),
+                ('p25_points', models.FloatField(default=0)),
+                ('median_points', models.FloatField(default=0)),
+                ('p75_points', models.FloatField(default=0)),
+                ('p90_points', models.FloatField(default=0)),
+                ('distribution', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='grade_summary', to='dashboard.course')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StudentGPA',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cgpa', models.FloatField(default=0)),
+                ('credit_units', models.IntegerField(default=0)),
+                ('quality_points', models.FloatField(default=0)),
+                ('terms', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='gpa', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0018_grade_analytics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('transcript', 'Transcript'), ('fee_statement', 'Fee statement')], max_length=20)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('failed', 'Failed'), ('finished', 'Finished')], default='running', max_length=10)),
+                ('total', models.IntegerField(default=0)),
+                ('rendered', models.IntegerField(default=0)),
+                ('unchanged', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('workers', models.IntegerField(default=1)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GeneratedDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('transcript', 'Transcript'), ('fee_statement', 'Fee statement')], max_length=20)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('path', models.CharField(blank=True, max_length=255)),
+                ('size', models.IntegerField(default=0)),
+                ('failure', models.TextField(blank=True)),
+                ('requested_at', models.DateTimeField()),
+                ('rendered_at', models.DateTimeField(blank=True, null=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('student', 'kind')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0020_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='homepage',
+            name='background_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='profile_picture_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0021_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libraryitem',
+            name='pdf_sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='libraryitem',
+            name='pdf_size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
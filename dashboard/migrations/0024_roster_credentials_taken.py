@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0023_roster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roster',
+            name='credentials_taken_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
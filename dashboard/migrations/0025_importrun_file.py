@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0024_roster_credentials_taken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importrun',
+            name='file',
+            field=models.FileField(blank=True, upload_to='imports/'),
+        ),
+        migrations.AlterField(
+            model_name='importrun',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('failed', 'Failed'), ('finished', 'Finished')], default='running', max_length=10),
+        ),
+    ]
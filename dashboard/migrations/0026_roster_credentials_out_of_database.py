@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:34
+
+import os
+
+from django.conf import settings
+from django.db import migrations
+
+
+def move_credentials_to_files(apps, schema_editor):
+    # Passwords not handed out yet go to the files take_credentials reads (dashboard/provisioning.py)
+    Roster = apps.get_model('dashboard', 'Roster')
+    for roster in Roster.objects.exclude(credentials=''):
+        os.makedirs(settings.PORTAL_CREDENTIALS_DIR, mode=0o700, exist_ok=True)
+        path = os.path.join(settings.PORTAL_CREDENTIALS_DIR, f'roster-{roster.pk}.csv')
+        with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600), 'a', newline='') as f:
+            f.write(roster.credentials)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0025_importrun_file'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_credentials_to_files, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='roster',
+            name='credentials',
+        ),
+    ]
@@ -1,9 +1,30 @@
 from django.db import models
+from django.db import transaction as db_transaction
 from django.contrib.auth.models import User
 from tinymce.models import HTMLField  
-from django.utils.safestring import mark_safe
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+
+
+class LoadedValuesMixin:
+    """Keeps the column values a row was loaded with in ``_loaded_values``.
+
+    The signal handlers in dashboard.signals apply edits as deltas against
+    them, without reading the stored row again before each save.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not models.DEFERRED
+        }
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        for field in self._meta.concrete_fields:
+            if (fields is None or field.name in fields or field.attname in fields) and field.attname in self.__dict__:
+                loaded[field.attname] = getattr(self, field.attname)
 
 
 class PortalPage(models.Model):
@@ -21,62 +42,91 @@ class PortalPage(models.Model):
     page_key = models.CharField(max_length=50, choices=PAGE_CHOICES, unique=True)
     heading = models.CharField(max_length=200)
 
-    # Main page content
-    main_content = HTMLField(blank=True, null=True)
-
-    # Section-specific rich text fields
-    courses_content = HTMLField(blank=True, null=True)
-    grades_content = HTMLField(blank=True, null=True)
-    finance_content = HTMLField(blank=True, null=True)
-    library_content = HTMLField(blank=True, null=True)
-    events_content = HTMLField(blank=True, null=True)
-    help_content = HTMLField(blank=True, null=True)
-    profile_content = HTMLField(blank=True, null=True)
+    # Rich text lives in PortalSection so navigation queries stay small
 
     def __str__(self):
         return self.heading
 
     def get_active_content(self):
-        """Return the correct content for this page based on page_key."""
-        mapping = {
-            'dashboard': self.main_content,
-            'courses': self.courses_content,
-            'grades': self.grades_content,
-            'finance': self.finance_content,
-            'library': self.library_content,
-            'events': self.events_content,
-            'help': self.help_content,
-            'profile': self.profile_content,
-        }
-        content = mapping.get(self.page_key, self.main_content)
+        """Return the correct content for this page based on page_key.
+
+        Only the one section this page shows is loaded, and only on first use.
+        """
+        if not hasattr(self, '_active_content'):
+            key = PortalSection.SECTION_FOR_PAGE.get(self.page_key, 'main')
+            self._active_content = (
+                self.sections.filter(key=key).values_list('content', flat=True).first()
+            )
+        content = self._active_content
         return content if content else "<p><em>Content coming soon...</em></p>"
 
+
+class PortalSection(models.Model):
+    """One rich-text section of a portal page, stored apart from the page row."""
+    SECTION_CHOICES = [
+        ('main', 'Main'),
+        ('courses', 'Courses'),
+        ('grades', 'Grades'),
+        ('finance', 'Finance'),
+        ('library', 'Library'),
+        ('events', 'Events'),
+        ('help', 'Help'),
+        ('profile', 'Profile'),
+    ]
+    # Section shown by each page; the dashboard shows the main content
+    SECTION_FOR_PAGE = {
+        'dashboard': 'main',
+        'courses': 'courses',
+        'grades': 'grades',
+        'finance': 'finance',
+        'library': 'library',
+        'events': 'events',
+        'help': 'help',
+        'profile': 'profile',
+    }
+
+    page = models.ForeignKey(PortalPage, on_delete=models.CASCADE, related_name='sections')
+    key = models.CharField(max_length=20, choices=SECTION_CHOICES)
+    content = HTMLField(blank=True)
+
+    class Meta:
+        unique_together = ('page', 'key')
+        ordering = ['page', 'key']
+
+    def __str__(self):
+        return f"{self.page.heading} - {self.get_key_display()}"
+
 class HomePage(models.Model):
     title = models.CharField(max_length=200)
     subtitle = models.CharField(max_length=300, blank=True)
     welcome_message = HTMLField(blank=True)  # Rich text for welcome message
     background_image = models.ImageField(upload_to='homepage/')  # Keep homepage background
+    background_image_variants = models.JSONField(default=dict, blank=True, editable=False)  # See dashboard.images
 
     def __str__(self):
         return self.title
 
-class Course(models.Model):
+class Course(LoadedValuesMixin, models.Model):
     code = models.CharField(max_length=10)
     name = models.CharField(max_length=200)
     description = HTMLField(blank=True)  # Rich text for course description
+    credit_units = models.PositiveSmallIntegerField(default=3)  # GPA weight; see dashboard.analytics
 
     def __str__(self):
         return f"{self.code} - {self.name}"
 
-class Enrollment(models.Model):
+class Enrollment(LoadedValuesMixin, models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     date_enrolled = models.DateField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['student', 'date_enrolled', 'id'])]
+
     def __str__(self):
         return f"{self.student.username} - {self.course.name}"
 
-class Grade(models.Model):
+class Grade(LoadedValuesMixin, models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     grade = models.CharField(max_length=2)
@@ -84,13 +134,26 @@ class Grade(models.Model):
     def __str__(self):
         return f"{self.student.username} - {self.course.code}: {self.grade}"
 
-class Transaction(models.Model):
+class Transaction(LoadedValuesMixin, models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.CharField(max_length=255)
     date = models.DateField(auto_now_add=True)
     is_credit = models.BooleanField(default=False)  # True = Payment received, False = Fee
 
+    class Meta:
+        indexes = [models.Index(fields=['student', 'date', 'id'])]
+
+    # Saves and deletes run in one database transaction with the ledger
+    # update done by the signal handlers, so balances never drift.
+    def save(self, *args, **kwargs):
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with db_transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"{self.student.username} - {self.description} ({'Credit' if self.is_credit else 'Debit'})"
     
@@ -99,8 +162,14 @@ class LibraryItem(models.Model):
     author = models.CharField(max_length=200, blank=True)
     description = HTMLField(blank=True)
     pdf_file = models.FileField(upload_to='library_pdfs/', blank=True, null=True)
+    # Recorded on upload (dashboard/library.py): the download's ETag, and how identical uploads are found
+    pdf_sha256 = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    pdf_size = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
     date_added = models.DateField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['title', 'id'])]
+
     def __str__(self):
         return self.title
     
@@ -117,35 +186,16 @@ class Event(models.Model):
     description = HTMLField(blank=True)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, default='other')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id']),
+            models.Index(fields=['category', 'date', 'id']),
+        ]
+
     def __str__(self):
         return self.title
     
 
-class Profile(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
-    phone = models.CharField(max_length=20, blank=True)
-    address = models.TextField(blank=True)
-    profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)
-
-    def __str__(self):
-        return self.user.username
-
-    def image_tag(self):
-        if self.profile_picture:
-            return mark_safe(f'<img src="{self.profile_picture.url}" style="height:50px;"/>')
-        return "No Image"
-    image_tag.short_description = "Profile Picture"
-
-# ===== Signals to create/update Profile automatically =====
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        Profile.objects.create(user=instance)
-
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
-
 class FAQ(models.Model):
     CATEGORY_CHOICES = [
         ('admissions', 'Admissions'),
@@ -163,6 +213,11 @@ class FAQ(models.Model):
     
     
 class Profile(models.Model):
+    """Created the first time it is needed (``get_or_create``), not along with the User.
+
+    Saving a User, which every login does to set ``last_login``, never
+    touches the profile.
+    """
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
@@ -170,6 +225,352 @@ class Profile(models.Model):
     profile_picture = models.ImageField(
         upload_to='profile_pics/', default='profile_pics/default.png', blank=True
     )
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)  # See dashboard.images
+
+    def __str__(self):
+        return f"{self.user.username}'s Profile"
+
+class StudentLedger(models.Model):
+    """Running totals of a student's transactions, kept up to date by dashboard.ledger."""
+    student = models.OneToOneField(User, on_delete=models.CASCADE, related_name='ledger')
+    total_credit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_debit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Fees owed minus payments
+    transaction_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.student.username} - balance {self.balance}"
+
+
+class LedgerTermTotal(models.Model):
+    """Per-term subtotals of a student's transactions."""
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_terms')
+    term = models.CharField(max_length=40)
+    total_credit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_debit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('student', 'term')
+        ordering = ['term']
 
     def __str__(self):
-        return f"{self.user.username}'s Profile"
\ No newline at end of file
+        return f"{self.student.username} - {self.term}"
+
+
+class DashboardStats(models.Model):
+    """Site-wide counters behind the admin dashboard, kept up to date by dashboard.stats (single row)."""
+    total_students = models.IntegerField(default=0)
+    total_courses = models.IntegerField(default=0)
+    total_enrollments = models.IntegerField(default=0)
+    total_transactions = models.IntegerField(default=0)
+    total_credit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_debit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    reconciled_at = models.DateTimeField(blank=True, null=True)  # Last full recount
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "dashboard stats"
+
+    def __str__(self):
+        return f"Dashboard stats (reconciled {self.reconciled_at})"
+
+
+class CourseStats(models.Model):
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='stats')
+    enrollment_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.course.code}: {self.enrollment_count} enrollments"
+
+
+class GradeStats(models.Model):
+    grade = models.CharField(max_length=2, unique=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['grade']
+
+    def __str__(self):
+        return f"{self.grade}: {self.count}"
+
+
+class StudentGPA(models.Model):
+    """A student's grade point averages, kept up to date by dashboard.analytics.
+
+    ``terms`` holds one ``{"term", "gpa", "credit_units"}`` entry per term,
+    the term being taken from the date of the matching enrollment.
+    """
+    student = models.OneToOneField(User, on_delete=models.CASCADE, related_name='gpa')
+    cgpa = models.FloatField(default=0)
+    credit_units = models.IntegerField(default=0)  # Graded credit units counted in the CGPA
+    quality_points = models.FloatField(default=0)
+    terms = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.student.username} - CGPA {self.cgpa:.2f}"
+
+
+class CourseGradeSummary(models.Model):
+    """Grade statistics of one course on the 4-point scale, kept up to date by dashboard.analytics."""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='grade_summary')
+    graded_count = models.IntegerField(default=0)  # Grades with a known letter
+    mean_points = models.FloatField(default=0)
+    p25_points = models.FloatField(default=0)
+    median_points = models.FloatField(default=0)
+    p75_points = models.FloatField(default=0)
+    p90_points = models.FloatField(default=0)
+    distribution = models.JSONField(default=dict, blank=True)  # {"A": 12, "B+": 4, ...}, every letter seen
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.course.code}: mean {self.mean_points:.2f} over {self.graded_count} grades"
+
+
+class ChangeStamp(models.Model):
+    """Version and time of the last change to a group of rows, e.g. one student's grades.
+
+    Keys are either global ("course") or per user ("user:42:grade"); see
+    dashboard.stamps.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+
+class ImportRun(models.Model):
+    """One bulk import of enrollments, grades or transactions; see dashboard.importer.
+
+    ``rows_processed`` is the checkpoint: rows up to it are committed, so an
+    interrupted import of the same file resumes after it. Files uploaded on
+    the import page are kept in ``file`` until a job has imported them.
+    """
+    KIND_CHOICES = [
+        ('enrollment', 'Enrollments'),
+        ('grade', 'Grades'),
+        ('transaction', 'Transactions'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+        ('finished', 'Finished'),
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    source = models.CharField(max_length=255)  # File name or path
+    file = models.FileField(upload_to='imports/', blank=True)
+    checksum = models.CharField(max_length=64, db_index=True)  # SHA-256 of the file
+    dry_run = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    rows_processed = models.IntegerField(default=0)
+    created_count = models.IntegerField(default=0)
+    updated_count = models.IntegerField(default=0)
+    skipped_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # [{"row": n, "message": "..."}], capped
+    failure = models.TextField(blank=True)
+    started_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} from {self.source} ({self.get_status_display()})"
+
+
+class Roster(models.Model):
+    """An intake list of students to create accounts for; see dashboard.provisioning.
+
+    Uploaded in the admin and provisioned by an admin action, or created by
+    the provision_students command. ``rows_processed`` is the checkpoint:
+    each committed batch advances it and appends its accounts to the
+    roster's credentials file, so a failed roster provisioned again carries
+    on after it without losing the passwords already issued. Passwords are
+    never stored here; ``credentials_taken_at`` records when they were
+    handed out.
+    """
+    STATUS_CHOICES = [
+        ('uploaded', 'Uploaded'),
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+        ('finished', 'Finished'),
+    ]
+    name = models.CharField(max_length=255)
+    file = models.FileField(upload_to='rosters/', blank=True, help_text="CSV or JSONL: username, first_name, last_name, email.")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploaded')
+    rows_processed = models.IntegerField(default=0)
+    created_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # [{"row": n, "message": "..."}], capped
+    credentials_taken_at = models.DateTimeField(blank=True, null=True, editable=False)
+    failure = models.TextField(blank=True)
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+
+class ProfilingSession(models.Model):
+    """Profile a share of live requests until stopped; see dashboard.profiling.
+
+    Only one session is active at a time. ``route`` limits it to one URL
+    pattern (e.g. ``/portal/<page_key>/``) and ``min_duration_ms`` keeps only
+    the slow requests, so latency spikes can be caught under real load.
+    """
+    MODE_CHOICES = [
+        ('sample', 'Statistical sampler (collapsed stacks)'),
+        ('cprofile', 'cProfile (pstats)'),
+    ]
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default='sample')
+    route = models.CharField(max_length=255, blank=True, help_text="URL pattern such as /portal/<page_key>/; blank for every page.")
+    sample_rate = models.FloatField(default=0.1, help_text="Share of matching requests to profile, from 0 to 1.")
+    interval_ms = models.PositiveIntegerField(default=5, help_text="Time between stack samples (sampler only).")
+    min_duration_ms = models.PositiveIntegerField(default=0, help_text="Discard profiles of faster requests.")
+    max_captures = models.PositiveIntegerField(default=200, help_text="Stop after keeping this many profiles.")
+    captured = models.PositiveIntegerField(default=0)
+    active = models.BooleanField(default=True)
+    started_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    started_at = models.DateTimeField(auto_now_add=True)
+    stopped_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.get_mode_display()} of {self.route or 'every page'} from {self.started_at:%Y-%m-%d %H:%M}"
+
+
+class ProfileCapture(models.Model):
+    """The profile of one request: collapsed stacks (sampler) or marshalled pstats (cProfile)."""
+    session = models.ForeignKey(ProfilingSession, on_delete=models.CASCADE, related_name='captures')
+    path = models.CharField(max_length=500)
+    duration_ms = models.FloatField()
+    samples = models.PositiveIntegerField(default=0)
+    stacks = models.TextField(blank=True)
+    stats = models.BinaryField(blank=True, null=True)
+    captured_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-captured_at']
+
+    def __str__(self):
+        return f"{self.path} ({self.duration_ms:.0f} ms)"
+
+
+class GeneratedDocument(models.Model):
+    """A student's latest PDF of one kind; see dashboard.documents.
+
+    ``content_hash`` covers every row the document is built from, and the
+    file is stored under that hash, so a document is rendered again only
+    when those rows change.
+    """
+    KIND_CHOICES = [
+        ('transcript', 'Transcript'),
+        ('fee_statement', 'Fee statement'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='documents')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    content_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    path = models.CharField(max_length=255, blank=True)  # In default_storage
+    size = models.IntegerField(default=0)
+    failure = models.TextField(blank=True)
+    requested_at = models.DateTimeField()
+    rendered_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('student', 'kind')
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of {self.student.username} ({self.get_status_display()})"
+
+
+class DocumentBatch(models.Model):
+    """Progress of one run of the generate_documents command."""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+        ('finished', 'Finished'),
+    ]
+    kind = models.CharField(max_length=20, choices=GeneratedDocument.KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    total = models.IntegerField(default=0)
+    rendered = models.IntegerField(default=0)
+    unchanged = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    workers = models.IntegerField(default=1)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    @property
+    def done(self):
+        return self.rendered + self.unchanged + self.failed
+
+    def __str__(self):
+        return f"{self.get_kind_display()} batch: {self.done} / {self.total} ({self.get_status_display()})"
+
+
+class Job(models.Model):
+    """A unit of deferred work for the run_jobs worker; see dashboard.jobs."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    task = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    priority = models.SmallIntegerField(default=0)  # Higher runs first
+    # At most one queued job per key; enqueueing the same key again returns it
+    dedupe_key = models.CharField(max_length=200, blank=True, null=True)
+    run_at = models.DateTimeField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    last_error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at'], name='job_queue_idx'),
+            models.Index(fields=['task', 'status'], name='job_task_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['dedupe_key'], condition=models.Q(status='queued'),
+                                    name='job_queued_dedupe_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def error_summary(self):
+        """The last line of ``last_error``, i.e. the exception of a traceback."""
+        lines = self.last_error.strip().splitlines()
+        return lines[-1] if lines else ''
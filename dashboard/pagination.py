@@ -0,0 +1,178 @@
+"""
+Keyset (cursor) pagination for the portal listings.
+
+Pages are addressed by the sort key of the last (``?after=``) or first
+(``?before=``) row shown rather than by an OFFSET, so every page costs one
+indexed range scan however deep the user goes. Cursors are opaque
+URL-safe tokens; every other query parameter (search, filters) is carried
+over into the next/previous links.
+"""
+import base64
+import binascii
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from . import search
+
+
+PAGE_SIZE = 25
+
+
+def encode_cursor(values):
+    data = json.dumps(list(values), cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the key values stored in ``cursor``, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class KeysetPage:
+    """One page of results plus the cursors to its neighbours.
+
+    Iterating, ``len()`` and truth-testing act on the rows, so templates can
+    use a page wherever they used the full queryset.
+    """
+
+    def __init__(self, object_list, params, next_key=None, previous_key=None):
+        self.object_list = object_list
+        self.params = params
+        self.next_cursor = encode_cursor(next_key) if next_key is not None else None
+        self.previous_cursor = encode_cursor(previous_key) if previous_key is not None else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def next_query(self):
+        return self._query('after', self.next_cursor)
+
+    def previous_query(self):
+        return self._query('before', self.previous_cursor)
+
+    def _query(self, name, cursor):
+        params = self.params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[name] = cursor
+        return params.urlencode()
+
+
+def _seek(ordering, values, forward):
+    """Build the filter selecting rows strictly after (or before) ``values``."""
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        lookup = 'gt' if forward != descending else 'lt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def _decode_key(queryset, ordering, cursor):
+    values = decode_cursor(cursor)
+    if values is None or len(values) != len(ordering):
+        return None
+    try:
+        return [
+            queryset.model._meta.get_field(field.lstrip('-')).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except ValidationError:
+        return None
+
+
+def paginate(queryset, params, ordering, per_page=PAGE_SIZE):
+    """Return the page of ``queryset`` selected by the cursor in ``params``.
+
+    ``ordering`` lists model fields (``-`` for descending) and must end with
+    a unique field such as ``id`` so the order is total.
+    """
+    def key(obj):
+        return [getattr(obj, field.lstrip('-')) for field in ordering]
+
+    after = _decode_key(queryset, ordering, params.get('after'))
+    before = None if after else _decode_key(queryset, ordering, params.get('before'))
+
+    if before is not None:
+        reverse = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        rows = list(queryset.filter(_seek(ordering, before, forward=False)).order_by(*reverse)[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            queryset = queryset.filter(_seek(ordering, after, forward=True))
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = after is not None
+
+    return KeysetPage(
+        rows, params,
+        next_key=key(rows[-1]) if rows and has_next else None,
+        previous_key=key(rows[0]) if rows and has_previous else None,
+    )
+
+
+def paginate_search(kind, text, queryset, params, per_page=PAGE_SIZE):
+    """Page through full-text search results in rank order, keyed on (rank, id).
+
+    A filtered ``queryset`` (e.g. FAQs of one category) restricts the hits
+    inside the ranking query, so every page but the last holds ``per_page``
+    rows.
+    """
+    def decode(cursor):
+        values = decode_cursor(cursor)
+        if values and len(values) == 2 and all(isinstance(v, (int, float)) for v in values):
+            return values
+        return None
+
+    after = decode(params.get('after'))
+    before = None if after else decode(params.get('before'))
+
+    within = queryset if queryset.query.has_filters() else None
+    hits = search.search(kind, text, per_page + 1, after=after, before=before, within=within)
+    if before is not None:
+        has_previous = len(hits) > per_page
+        hits = hits[-per_page:]
+        has_next = True
+    else:
+        has_next = len(hits) > per_page
+        hits = hits[:per_page]
+        has_previous = after is not None
+
+    return KeysetPage(
+        search.attach_objects(hits, queryset), params,
+        next_key=(hits[-1].rank, hits[-1].object_id) if hits and has_next else None,
+        previous_key=(hits[0].rank, hits[0].object_id) if hits and has_previous else None,
+    )
@@ -0,0 +1,215 @@
+"""
+On-demand profiling of live requests.
+
+Staff start a ``ProfilingSession`` in the admin. ``ProfilerMiddleware``
+then profiles a random ``sample_rate`` share of the requests that match
+the session's route, either with a statistical sampler (a thread that
+records the request thread's stack every ``interval_ms``) or with
+cProfile, and stores one ``ProfileCapture`` per kept request. The admin
+merges a session's captures into one download: collapsed stacks
+(``frame;frame;frame count`` lines, the input of flamegraph.pl and
+speedscope) for the sampler, a pstats file for cProfile.
+
+Every worker keeps the active session in a ``VersionedCache``, so while
+profiling is off a request costs one read of the version stamp file and
+nothing else; starting or stopping a session reaches every worker on its
+next request.
+
+The sampler follows the thread that runs the middleware, so under ASGI it
+sees the synchronous parts of async views only.
+"""
+import cProfile
+import logging
+import marshal
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+from .cache import VersionedCache
+from .models import ProfilingSession, ProfileCapture
+
+
+logger = logging.getLogger(__name__)
+
+settings_cache = VersionedCache('profiling')
+
+CONVERTER = re.compile(r'<(?:\w+:)?(\w+)>')
+
+
+def active_session():
+    return settings_cache.get_or_set('session', lambda: ProfilingSession.objects.filter(active=True).first())
+
+
+def normalize_route(route):
+    """``/portal/<page_key>/`` and Django's ``portal/<str:page_key>/`` compare equal."""
+    return CONVERTER.sub(r'<\1>', route).strip('/')
+
+
+def matches(session, request):
+    if not session.route:
+        return True
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    return normalize_route(match.route) == normalize_route(session.route)
+
+
+def frame_name(frame):
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+def collapse(frame, stop_code=None):
+    """The stack from ``frame`` outwards as ``root;...;leaf``, starting below ``stop_code``."""
+    names = []
+    while frame is not None and frame.f_code is not stop_code:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """Records the stack of one thread every ``interval`` seconds until stopped."""
+
+    def __init__(self, thread_id, interval, stop_code=None):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stop_code = stop_code
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame, self.stop_code)] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        # Drop the sample taken while the profiled thread was already waiting in here
+        own = f'{__name__}:{Sampler.stop.__qualname__}'
+        for stack in [stack for stack in self.stacks if stack.startswith(own)]:
+            del self.stacks[stack]
+        return self.stacks
+
+
+def format_stacks(stacks):
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+def parse_stacks(text):
+    stacks = Counter()
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack:
+            stacks[stack] += int(count)
+    return stacks
+
+
+class _Stats:
+    """What ``pstats.Stats`` needs to load a stats dict: an object with ``create_stats`` and ``stats``."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def merged_stacks(session):
+    """The session's sampler captures summed into one collapsed-stacks file."""
+    stacks = Counter()
+    for text in session.captures.values_list('stacks', flat=True).iterator():
+        stacks.update(parse_stacks(text))
+    return format_stacks(stacks)
+
+
+def merged_stats(session):
+    """The session's cProfile captures combined into one pstats file (marshalled), or None."""
+    combined = None
+    for data in session.captures.exclude(stats=None).values_list('stats', flat=True).iterator():
+        profile = _Stats(marshal.loads(bytes(data)))
+        if combined is None:
+            combined = pstats.Stats(profile)
+        else:
+            combined.add(profile)
+    return marshal.dumps(combined.stats) if combined else None
+
+
+def stop(session):
+    ProfilingSession.objects.filter(pk=session.pk, active=True).update(active=False, stopped_at=timezone.now())
+    settings_cache.invalidate()
+
+
+def save_capture(session, request, duration_ms, samples=0, stacks='', stats=None):
+    """Keep a profile unless the session already has ``max_captures`` of them."""
+    with db_transaction.atomic():
+        claimed = ProfilingSession.objects.filter(
+            pk=session.pk, active=True, captured__lt=session.max_captures
+        ).update(captured=F('captured') + 1)
+        if claimed:
+            ProfileCapture.objects.create(session_id=session.pk, path=request.get_full_path()[:500],
+                                          duration_ms=duration_ms, samples=samples, stacks=stacks, stats=stats)
+    if not claimed:
+        stop(session)  # It has all the profiles it asked for
+
+
+class ProfilerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = active_session()
+        if session is None or random.random() >= session.sample_rate or not matches(session, request):
+            return self.get_response(request)
+        if session.mode == 'cprofile':
+            return self.profile(request, session)
+        return self.sample(request, session)
+
+    def sample(self, request, session):
+        sampler = Sampler(threading.get_ident(), session.interval_ms / 1000, stop_code=self.sample.__code__)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            return self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+            duration_ms = (time.perf_counter() - started) * 1000
+            if stacks and duration_ms >= session.min_duration_ms:
+                self.save(session, request, duration_ms, samples=sum(stacks.values()), stacks=format_stacks(stacks))
+
+    def profile(self, request, session):
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler at a time: another thread's request holds it
+            logger.debug("Not profiling %s: another profiler is active", request.path)
+            return self.get_response(request)
+        try:
+            return self.get_response(request)
+        finally:
+            profiler.disable()
+            duration_ms = (time.perf_counter() - started) * 1000
+            if duration_ms >= session.min_duration_ms:
+                profiler.create_stats()
+                self.save(session, request, duration_ms, stats=marshal.dumps(profiler.stats))
+
+    def save(self, session, request, duration_ms, **data):
+        # A profiling problem must never turn into a failed request
+        try:
+            save_capture(session, request, duration_ms, **data)
+        except Exception:
+            logger.exception("Could not save the profile of %s", request.path)
@@ -0,0 +1,244 @@
+"""
+Student accounts for a whole intake at once.
+
+A roster is a CSV or JSONL file, read like the files of dashboard.importer,
+with a ``username`` and optionally ``first_name``, ``last_name`` and
+``email`` for each student. Every account gets a random initial password.
+
+Hashing a password is deliberately slow (around half a second per core with
+Django's default PBKDF2), so for an intake it is nearly all the work.
+Passwords are hashed across a process pool, ``HASH_CHUNK`` per task. Users
+and their Profiles are then inserted with ``bulk_create`` in batches of
+``BATCH_SIZE`` rows, each batch in one transaction with the Roster
+checkpoint. Bulk inserts skip the per-row post_save chain, so the student
+count in the admin statistics is adjusted once per batch instead.
+
+Invalid rows, usernames used twice in the file and usernames already taken
+are skipped and reported with their row number. The accounts created and
+their passwords never reach the database: each batch appends them to a
+credentials file readable by the app's user alone. The provision_students
+command writes that file where it is told. A roster provisioned from the
+admin keeps it in ``PORTAL_CREDENTIALS_DIR`` until a superuser downloads
+it, once (``take_credentials`` deletes it), or until it is older than
+``PORTAL_CREDENTIALS_MAX_AGE`` and ``purge_credentials`` deletes it.
+"""
+import csv
+import io
+import logging
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from .concurrency import process_pool
+from .importer import MAX_STORED_ERRORS, RowError, file_format, read_records
+from .models import Profile, Roster
+from . import stats
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+HASH_CHUNK = 20
+PASSWORD_LENGTH = 12
+PASSWORD_CHARS = 'abcdefghjkmnpqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ23456789'  # Nothing to misread: no 0/O or 1/l/I
+CREDENTIAL_FIELDS = ['username', 'password', 'first_name', 'last_name', 'email']
+
+
+def _text(record, field, required=False):
+    value = record.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f"missing {field}")
+    if len(value) > User._meta.get_field(field).max_length:
+        raise RowError(f"{field} is longer than {User._meta.get_field(field).max_length} characters")
+    return value
+
+
+def parse(record):
+    """``(username, first_name, last_name, email)`` of one roster record."""
+    username = _text(record, 'username', required=True)
+    try:
+        User.username_validator(username)
+    except ValidationError:
+        raise RowError(f"invalid username {username!r}")
+    email = _text(record, 'email')
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError:
+            raise RowError(f"invalid email {email!r}")
+    return username, _text(record, 'first_name'), _text(record, 'last_name'), email
+
+
+def hash_passwords(passwords):
+    """Hash ``passwords`` with the preferred hasher; run in the pool's processes."""
+    return [make_password(password) for password in passwords]
+
+
+def _hash_all(passwords, pool):
+    if pool is None:
+        return hash_passwords(passwords)
+    chunks = [passwords[start:start + HASH_CHUNK] for start in range(0, len(passwords), HASH_CHUNK)]
+    return [hashed for chunk in pool.map(hash_passwords, chunks) for hashed in chunk]
+
+
+def _create(accounts, hashes):
+    now = timezone.now()
+    User.objects.bulk_create([
+        User(username=username, first_name=first_name, last_name=last_name, email=email, password=hashed,
+             date_joined=now)
+        for (username, first_name, last_name, email), hashed in zip(accounts, hashes)
+    ], batch_size=500)
+    # Looked up rather than read off the created objects: not every database returns bulk-inserted keys
+    user_ids = User.objects.filter(username__in=[account[0] for account in accounts]).values_list('pk', flat=True)
+    Profile.objects.bulk_create([Profile(user_id=user_id) for user_id in user_ids], batch_size=500)
+    stats.adjust(total_students=len(accounts))
+
+
+def credentials_header():
+    header = io.StringIO()
+    csv.writer(header).writerow(CREDENTIAL_FIELDS)
+    return header.getvalue()
+
+
+def open_credentials(path, append=True):
+    """Open ``path`` to write credentials to; a new file is readable by this user alone."""
+    flags = os.O_WRONLY | os.O_CREAT | (os.O_APPEND if append else os.O_TRUNC)
+    return open(os.open(path, flags, 0o600), 'a' if append else 'w', newline='')
+
+
+def credentials_path(roster):
+    """Where the credentials of a roster provisioned by a job wait to be taken."""
+    return os.path.join(settings.PORTAL_CREDENTIALS_DIR, f'roster-{roster.pk}.csv')
+
+
+def take_credentials(rosters):
+    """The credentials report of ``rosters`` (a queryset), whose files are then deleted; None if none are left.
+
+    Each password is handed out once: a file is renamed before it is read,
+    so of two concurrent takers only one gets it.
+    """
+    rows, taken = [], []
+    for roster in rosters.order_by('created_at'):
+        path = credentials_path(roster)
+        claimed = f'{path}.taken'
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            continue
+        with open(claimed, newline='') as f:
+            rows.append(f.read())
+        os.remove(claimed)
+        taken.append(roster.pk)
+    if not taken:
+        return None
+    Roster.objects.filter(pk__in=taken).update(credentials_taken_at=timezone.now())
+    return credentials_header() + ''.join(rows)
+
+
+def purge_credentials():
+    """Delete the credentials files no one took within ``PORTAL_CREDENTIALS_MAX_AGE``. Runs as a job."""
+    try:
+        names = os.listdir(settings.PORTAL_CREDENTIALS_DIR)
+    except FileNotFoundError:
+        return
+    cutoff = time.time() - settings.PORTAL_CREDENTIALS_MAX_AGE
+    for name in names:
+        path = os.path.join(settings.PORTAL_CREDENTIALS_DIR, name)
+        try:
+            if os.stat(path).st_mtime < cutoff:
+                os.remove(path)
+                logger.warning("Deleted the credentials in %s, which were never downloaded", name)
+        except FileNotFoundError:
+            pass  # Taken meanwhile
+
+
+def provision(roster, fileobj, report, fmt=None, workers=1, batch_size=BATCH_SIZE):
+    """Create the accounts listed in ``fileobj`` (a binary file) and return ``roster`` with the outcome.
+
+    The accounts created and their passwords are written to ``report``, a
+    text file, as CSV rows. ``workers`` processes hash the passwords; 1
+    hashes them in this process. A roster provisioned before carries on after its checkpoint.
+    A failure is logged and recorded on the roster, whose status is then
+    ``failed``.
+    """
+    roster.status = 'running'
+    roster.failure = ''
+    roster.save(update_fields=['status', 'failure'])
+    pool = process_pool(workers) if workers > 1 else None
+    try:
+        records = islice(read_records(fileobj, fmt or file_format(roster.file.name or roster.name)),
+                         roster.rows_processed, None)
+        while True:
+            chunk = list(islice(records, batch_size))
+            if not chunk:
+                break
+            accounts, errors = [], []
+            for number, record in chunk:
+                try:
+                    if isinstance(record, RowError):
+                        raise record
+                    accounts.append((number, parse(record)))
+                except RowError as exc:
+                    errors.append((number, str(exc)))
+            taken = set(User.objects.filter(username__in={account[0] for _, account in accounts})
+                        .values_list('username', flat=True))
+            new = []
+            for number, account in accounts:
+                if account[0] in taken:
+                    errors.append((number, f"username {account[0]!r} is already taken"))
+                else:
+                    taken.add(account[0])  # Later rows with the same username are rejected
+                    new.append(account)
+
+            passwords = [get_random_string(PASSWORD_LENGTH, PASSWORD_CHARS) for _ in new]
+            hashes = _hash_all(passwords, pool)
+            with db_transaction.atomic():
+                if new:
+                    _create(new, hashes)
+                errors.sort()
+                roster.created_count += len(new)
+                roster.error_count += len(errors)
+                room = MAX_STORED_ERRORS - len(roster.errors)
+                roster.errors.extend({'row': row, 'message': message} for row, message in errors[:max(room, 0)])
+                roster.rows_processed = chunk[-1][0]
+                roster.save()
+                # Last, so a failed write rolls the batch back rather than lose its passwords
+                csv.writer(report).writerows(
+                    [username, password, first_name, last_name, email]
+                    for (username, first_name, last_name, email), password in zip(new, passwords)
+                )
+                report.flush()
+    except Exception as exc:
+        logger.exception("Provisioning roster %s failed", roster.pk)
+        roster.refresh_from_db()  # Drop the counts of the batch that rolled back
+        roster.status = 'failed'
+        roster.failure = f"{type(exc).__name__}: {exc}"
+        roster.save(update_fields=['status', 'failure'])
+        return roster
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    roster.status = 'finished'
+    roster.finished_at = timezone.now()
+    roster.save(update_fields=['status', 'finished_at'])
+    return roster
+
+
+def provision_roster(roster_id, workers=None):
+    """Provision an uploaded roster. Runs as a job."""
+    roster = Roster.objects.get(pk=roster_id)
+    os.makedirs(settings.PORTAL_CREDENTIALS_DIR, mode=0o700, exist_ok=True)
+    # Appended to: a failed roster provisioned again keeps the passwords issued before
+    with roster.file.open('rb') as fileobj, open_credentials(credentials_path(roster)) as report:
+        provision(roster, fileobj.file, report, workers=workers or os.cpu_count() or 1)
@@ -0,0 +1,148 @@
+"""
+Per-student read model for the portal tabs.
+
+Every tab served by ``views.portal_page`` is built here with a fixed number of
+queries, no matter how many enrollments, grades or transactions the student
+has. Related rows are joined up front so templates never trigger per-row
+lookups, and listings are keyset-paginated so a page costs the same however
+deep the student goes.
+"""
+from django.db.models import Q
+
+from . import search
+from .pagination import paginate, paginate_search
+from .models import Enrollment, Grade, Transaction, LibraryItem, Event, FAQ, Profile, StudentLedger, StudentGPA
+
+
+# Queries each portal tab may run for a logged-in student, including the
+# session and user lookups done by the auth middleware, the response cache's
+# change-stamp check, the PortalPage fetch and the navbar context processor.
+QUERY_BUDGETS = {
+    'dashboard': 6,
+    'courses': 6,
+    'grades': 7,
+    'finance': 8,
+    'library': 8,  # Searching adds the FTS ranking and snippet queries
+    'events': 6,
+    'profile': 6,
+    'help': 6,
+}
+
+
+class StudentPortal:
+    """Loads the data behind each portal tab for one student.
+
+    Listing methods take the request's query parameters (search, filters and
+    pagination cursor) and return one ``KeysetPage``.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def enrollments(self, params):
+        search_query = params.get('search', '')
+        enrollments = Enrollment.objects.filter(student=self.user).select_related('course')
+        if search_query:
+            enrollments = enrollments.filter(self._course_filter(search_query))
+        return paginate(enrollments, params, ('-date_enrolled', '-id'))
+
+    def grades(self, params):
+        search_query = params.get('search', '')
+        grades = Grade.objects.filter(student=self.user).select_related('course')
+        if search_query:
+            grades = grades.filter(self._course_filter(search_query))
+        return paginate(grades, params, ('id',))
+
+    def _course_filter(self, search_query):
+        # Codes are matched as substrings ("101" finds CSC101), which the word-prefix FTS query cannot do
+        by_code = Q(course__code__icontains=search_query)
+        if not search.available():
+            return Q(course__name__icontains=search_query) | by_code
+        matches = search.matching('course', search_query)
+        return by_code if matches is None else by_code | Q(course_id__in=matches)
+
+    def transactions(self, params):
+        search_query = params.get('search', '')
+        type_filter = params.get('type', '')
+        transactions = Transaction.objects.filter(student=self.user)
+        if search_query:
+            transactions = transactions.filter(description__icontains=search_query)
+        if type_filter == 'credit':
+            transactions = transactions.filter(is_credit=True)
+        elif type_filter == 'debit':
+            transactions = transactions.filter(is_credit=False)
+        return paginate(transactions, params, ('-date', '-id'))
+
+    def ledger(self):
+        """Running balance and totals; an empty ledger if the student has no transactions yet."""
+        return StudentLedger.objects.filter(student=self.user).first() or StudentLedger(student=self.user)
+
+    def ledger_terms(self):
+        return list(self.user.ledger_terms.all())
+
+    def gpa(self):
+        """CGPA and term GPAs; zeros if the student has no grades yet."""
+        return StudentGPA.objects.filter(student=self.user).first() or StudentGPA(student=self.user)
+
+    def library_items(self, params):
+        """Library items by title, or full-text matches (with snippets) in rank order when searching."""
+        search_query = params.get('search', '')
+        items = LibraryItem.objects.all()
+        if search_query and search.available():
+            return paginate_search('library', search_query, items, params)
+        if search_query:
+            items = items.filter(
+                Q(title__icontains=search_query) |
+                Q(author__icontains=search_query)
+            )
+        return paginate(items, params, ('title', 'id'))
+
+    def events(self, params):
+        category_filter = params.get('category', '')
+        events = Event.objects.all()
+        if category_filter:
+            events = events.filter(category=category_filter)
+        return paginate(events, params, ('date', 'id'))
+
+    def faqs(self, params):
+        search_query = params.get('search', '')
+        category_filter = params.get('category', '')
+        faqs = FAQ.objects.all()
+        if category_filter:
+            faqs = faqs.filter(category=category_filter)
+        if search_query and search.available():
+            return paginate_search('faq', search_query, faqs, params)
+        if search_query:
+            faqs = faqs.filter(
+                Q(question__icontains=search_query) |
+                Q(answer__icontains=search_query)
+            )
+        return paginate(faqs, params, ('id',))
+
+    def profile(self):
+        profile, _ = Profile.objects.get_or_create(user=self.user)
+        return profile
+
+    def tab_context(self, page_key, params):
+        """Return the template context for one portal tab."""
+        search_query = params.get('search', '')
+        if page_key == 'courses':
+            return {'enrollments': self.enrollments(params), 'search_query': search_query}
+        if page_key == 'grades':
+            return {'grades': self.grades(params), 'gpa': self.gpa(), 'search_query': search_query}
+        if page_key == 'finance':
+            return {
+                'transactions': self.transactions(params),
+                'ledger': self.ledger(),
+                'ledger_terms': self.ledger_terms(),
+                'search_query': search_query,
+            }
+        if page_key == 'library':
+            return {'library_items': self.library_items(params), 'search_query': search_query}
+        if page_key == 'events':
+            return {'events': self.events(params)}
+        if page_key == 'profile':
+            return {'profile': self.profile()}
+        if page_key == 'help':
+            return {'faqs': self.faqs(params)}
+        return {}
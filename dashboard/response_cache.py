@@ -0,0 +1,176 @@
+"""
+Per-user cache of rendered portal tabs.
+
+Students reload their courses, grades and finance tabs far more often than
+the rows behind them change. ``cache_portal_tab`` keeps each rendered page
+in a per-process LRU keyed by user, tab and normalised query string,
+together with the versions of the change stamps it depends on (the
+student's own rows plus the shared content the page embeds). One indexed
+query for those versions decides whether the stored page is still exact;
+any save or delete of a dependency moves its stamp, so the entry is
+replaced on the next request in every worker.
+
+Memory is bounded by ``settings.PORTAL_RESPONSE_CACHE_MAX_BYTES`` and
+``ResponseCache.stats()`` reports hits, misses and evictions.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+
+from . import stamps
+
+
+# Stamp groups each portal tab renders, besides the portal pages themselves
+TAB_DEPENDENCIES = {
+    'dashboard': (),
+    'courses': ('enrollment', 'course'),
+    'grades': ('grade', 'enrollment', 'course'),
+    'finance': ('transaction',),
+    'library': ('libraryitem',),
+    'events': ('event',),
+    'help': ('faq',),
+    'profile': ('profile',),
+}
+
+
+class ResponseCache:
+    """Thread-safe LRU of rendered pages, bounded by the total size of their bodies."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != versions:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, key, versions, content, content_type):
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[key] = (versions, content, content_type)
+            self._size += len(content)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[1])
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+responses = ResponseCache(getattr(settings, 'PORTAL_RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+
+def normalized_query(params):
+    """Sorted query string without empty values, so equivalent URLs share an entry."""
+    return urlencode(sorted((key, value) for key, values in params.lists() for value in values if value))
+
+
+def user_fingerprint(request):
+    # The page shows the user's name and email, and embeds a CSRF token tied
+    # to the browser's cookie; a change to any of them needs a fresh render.
+    user = request.user
+    identity = [user.username, user.first_name, user.last_name, user.email, str(user.is_staff)] if user.is_authenticated else []
+    data = '\0'.join(identity + [request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def dependency_keys(request, tab):
+    """Stamp keys whose versions decide whether ``tab`` needs a fresh render for this user."""
+    user_id = request.user.pk
+    return ['portalpage'] + [stamps.key_for(group, user_id) for group in TAB_DEPENDENCIES[tab]]
+
+
+def _lookup(request, page_key, view_name):
+    """Return the cache key, the dependency versions and the stored page (or None)."""
+    keys = dependency_keys(request, page_key)
+    versions = tuple(version for version, _ in stamps.read_for_request(request, keys).values())
+    cache_key = (request.user.pk, view_name, page_key, normalized_query(request.GET), user_fingerprint(request))
+    return cache_key, versions, responses.get(cache_key, versions)
+
+
+def _store(cache_key, versions, response):
+    if response.status_code == 200 and not response.streaming and not response.cookies:
+        responses.set(cache_key, versions, response.content, response['Content-Type'])
+
+
+def _cacheable(request, page_key):
+    return (request.method == 'GET' and request.user.is_authenticated
+            and page_key in TAB_DEPENDENCIES
+            and settings.CSRF_COOKIE_NAME in request.COOKIES)
+
+
+def cache_portal_tab(tab=None):
+    """Cache a portal view's rendered output per user.
+
+    ``tab`` names the entry in TAB_DEPENDENCIES; when omitted the view's
+    ``page_key`` argument is used. Works on sync and async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                page_key = tab or kwargs.get('page_key')
+                if not await sync_to_async(_cacheable)(request, page_key):
+                    return await view(request, *args, **kwargs)
+                cache_key, versions, cached = await sync_to_async(_lookup)(request, page_key, view.__name__)
+                if cached is not None:
+                    response = HttpResponse(cached[0], content_type=cached[1])
+                else:
+                    response = await view(request, *args, **kwargs)
+                    _store(cache_key, versions, response)
+                patch_cache_control(response, private=True)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            page_key = tab or kwargs.get('page_key')
+            if not _cacheable(request, page_key):
+                return view(request, *args, **kwargs)
+            cache_key, versions, cached = _lookup(request, page_key, view.__name__)
+            if cached is not None:
+                response = HttpResponse(cached[0], content_type=cached[1])
+            else:
+                response = view(request, *args, **kwargs)
+                _store(cache_key, versions, response)
+            patch_cache_control(response, private=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,246 @@
+"""
+Full-text search over library items, FAQs and courses.
+
+Each searchable model has its own SQLite FTS5 table whose rowid is the
+object's primary key, with three columns: ``title``, ``byline`` and ``body``.
+HTML is stripped before indexing so TinyMCE markup is never matched. Results
+are ranked with bm25 (title matches weigh most) and come back with
+highlighted snippets.
+
+The index is kept in sync by signal handlers and can be rebuilt with the
+``rebuild_search_index`` management command. On databases without FTS5
+``available()`` returns False and callers fall back to ``icontains`` filters.
+"""
+import re
+from dataclasses import dataclass
+from html import unescape
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape, strip_tags
+
+from .models import LibraryItem, FAQ, Course
+
+
+# Control characters never appear in indexed text, so they can mark matches
+# safely before the snippet is HTML-escaped.
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+SNIPPET_TOKENS = 16
+
+# bm25 weights for the title, byline and body columns
+WEIGHTS = (10.0, 5.0, 1.0)
+
+
+@dataclass(frozen=True)
+class Source:
+    model: type
+    table: str
+
+    def document(self, obj):
+        """Return the (title, byline, body) text indexed for ``obj``."""
+        if self.model is LibraryItem:
+            return obj.title, obj.author, html_to_text(obj.description)
+        if self.model is FAQ:
+            return obj.question, obj.get_category_display(), html_to_text(obj.answer)
+        return obj.name, obj.code, html_to_text(obj.description)
+
+
+SOURCES = {
+    'library': Source(LibraryItem, 'dashboard_search_library'),
+    'faq': Source(FAQ, 'dashboard_search_faq'),
+    'course': Source(Course, 'dashboard_search_course'),
+}
+
+
+@dataclass
+class Hit:
+    object_id: int
+    rank: float
+    title: str    # HTML-safe, matches wrapped in <mark>
+    snippet: str  # HTML-safe, matches wrapped in <mark>
+
+
+def html_to_text(html):
+    """Strip tags and entities from rich-text content."""
+    return ' '.join(unescape(strip_tags(html or '')).split())
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def source_for(model):
+    for kind, source in SOURCES.items():
+        if source.model is model:
+            return kind, source
+    return None, None
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    words = re.findall(r'\w+', text or '')
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _markup(text):
+    return (escape(text)
+            .replace(MATCH_START, '<mark>')
+            .replace(MATCH_END, '</mark>'))
+
+
+def search(kind, text, limit=50, after=None, before=None, within=None):
+    """Return up to ``limit`` ranked hits for ``text`` in the given source.
+
+    ``after``/``before`` take a ``(rank, object_id)`` key from a previous hit
+    and return the hits that follow or precede it, so results can be paged
+    with cursors. ``within``, a queryset of the source's model, restricts
+    the hits to its objects inside the ranking query, so a limit still
+    returns ``limit`` hits when it filters some out.
+    """
+    query = build_match_query(text)
+    if not query:
+        return []
+    table = SOURCES[kind].table
+    restrict, restrict_params = '', []
+    if within is not None:
+        subquery, restrict_params = within.order_by().values('pk').query.sql_with_params()
+        restrict = f" AND rowid IN ({subquery})"
+    # Rank first, using bm25 only; LIMIT -1 keeps SQLite from flattening the
+    # subquery, which mis-evaluates the OR'd seek condition against the
+    # virtual table.
+    sql = (
+        f"SELECT id, score FROM (SELECT rowid AS id, bm25({table}, %s, %s, %s) AS score "
+        f"FROM {table} WHERE {table} MATCH %s{restrict} ORDER BY score, id LIMIT -1)"
+    )
+    params = [*WEIGHTS, query, *restrict_params]
+    order = "score, id"
+    if after is not None:
+        sql += " WHERE score > %s OR (score = %s AND id > %s)"
+        params += [after[0], after[0], after[1]]
+    elif before is not None:
+        sql += " WHERE score < %s OR (score = %s AND id < %s)"
+        params += [before[0], before[0], before[1]]
+        order = "score DESC, id DESC"
+    sql += f" ORDER BY {order} LIMIT %s"
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ranked = cursor.fetchall()
+        if before is not None:
+            ranked.reverse()
+        if not ranked:
+            return []
+        # Then highlight only the rows on this page
+        placeholders = ', '.join(['%s'] * len(ranked))
+        cursor.execute(
+            f"SELECT rowid, highlight({table}, 0, %s, %s), snippet({table}, -1, %s, %s, '…', %s) "
+            f"FROM {table} WHERE {table} MATCH %s AND rowid IN ({placeholders})",
+            [MATCH_START, MATCH_END, MATCH_START, MATCH_END, SNIPPET_TOKENS, query, *[row[0] for row in ranked]],
+        )
+        markup = {rowid: (title, snippet) for rowid, title, snippet in cursor.fetchall()}
+
+    return [
+        Hit(rowid, score, _markup(markup[rowid][0]), _markup(markup[rowid][1]))
+        for rowid, score in ranked
+    ]
+
+
+def attach_objects(hits, queryset):
+    """Return the model instances for ``hits`` in rank order.
+
+    Each instance gets ``search_title`` and ``search_snippet`` attributes
+    holding the highlighted text. Hits filtered out by ``queryset`` are
+    dropped.
+    """
+    objects = queryset.in_bulk([hit.object_id for hit in hits])
+    results = []
+    for hit in hits:
+        obj = objects.get(hit.object_id)
+        if obj is not None:
+            obj.search_title = hit.title
+            obj.search_snippet = hit.snippet
+            results.append(obj)
+    return results
+
+
+def search_objects(kind, text, queryset=None, limit=50):
+    """Return model instances for the best hits, in rank order (see ``attach_objects``)."""
+    if queryset is None:
+        queryset = SOURCES[kind].model.objects.all()
+    return attach_objects(search(kind, text, limit), queryset)
+
+
+def matching_ids(kind, text):
+    """Return the ids of every object matching ``text``, best first."""
+    query = build_match_query(text)
+    if not query:
+        return []
+    table = SOURCES[kind].table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY bm25({table}, %s, %s, %s)",
+            [query, *WEIGHTS],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def matching(kind, text):
+    """A subquery of the ids of every object matching ``text``, for ``pk__in``; None if nothing can match."""
+    query = build_match_query(text)
+    if not query:
+        return None
+    table = SOURCES[kind].table
+    return RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [query])
+
+
+def index(obj):
+    """Add or replace the index entry for a library item, FAQ or course."""
+    kind, source = source_for(type(obj))
+    if source is None or not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {source.table} WHERE rowid = %s", [obj.pk])
+        cursor.execute(
+            f"INSERT INTO {source.table} (rowid, title, byline, body) VALUES (%s, %s, %s, %s)",
+            [obj.pk, *source.document(obj)],
+        )
+
+
+def remove(obj):
+    kind, source = source_for(type(obj))
+    if source is None or not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {source.table} WHERE rowid = %s", [obj.pk])
+
+
+def rebuild(kinds=None, batch_size=1000):
+    """Re-index every object of the given sources from scratch.
+
+    Returns a mapping of source name to the number of documents indexed.
+    """
+    counts = {}
+    for kind in kinds or SOURCES:
+        source = SOURCES[kind]
+        counts[kind] = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {source.table}")
+            batch = []
+            for obj in source.model.objects.order_by('pk').iterator(chunk_size=batch_size):
+                batch.append([obj.pk, *source.document(obj)])
+                if len(batch) >= batch_size:
+                    counts[kind] += _insert(cursor, source, batch)
+                    batch = []
+            counts[kind] += _insert(cursor, source, batch)
+            cursor.execute(f"INSERT INTO {source.table} ({source.table}) VALUES ('optimize')")
+    return counts
+
+
+def _insert(cursor, source, rows):
+    if rows:
+        cursor.executemany(
+            f"INSERT INTO {source.table} (rowid, title, byline, body) VALUES (%s, %s, %s, %s)", rows
+        )
+    return len(rows)
@@ -1,13 +1,247 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Profile
+from .models import HomePage, PortalPage, PortalSection, Profile, Course, Event, Enrollment, Grade, Transaction, LibraryItem, FAQ, ProfilingSession
+from . import analytics, cache, images, ledger, library, profiling, search, stamps, stats
 
+
+def deleted_with(origin, model):
+    """True when a cascade delete was started from an instance or queryset of ``model``."""
+    return isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+# ===== Remember the stored row so edits can be applied as deltas =====
+PREVIOUS_FIELDS = {
+    Transaction: ('student_id', 'date', 'amount', 'is_credit'),
+    Enrollment: ('student_id', 'course_id'),
+    Grade: ('student_id', 'course_id', 'grade'),
+    Course: ('credit_units',),
+}
+
+def _saved_fields(sender, update_fields):
+    """The tracked fields a save writes."""
+    if update_fields is None:
+        return PREVIOUS_FIELDS[sender]
+    return [name for name in PREVIOUS_FIELDS[sender]
+            if name in update_fields or sender._meta.get_field(name).name in update_fields]
+
+def remember_previous(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._previous = None
+    if not instance.pk or raw:
+        return
+    fields = PREVIOUS_FIELDS[sender]
+    loaded = getattr(instance, '_loaded_values', {})
+    if not _saved_fields(sender, update_fields):
+        # The stored values stay as they are; the handlers see no change
+        instance._previous = {name: getattr(instance, name) for name in fields}
+    elif all(name in loaded for name in fields):
+        instance._previous = {name: loaded[name] for name in fields}
+    else:
+        # Not loaded from the database (built with its pk), or loaded without these fields
+        instance._previous = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+def remember_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    # What the next save of this instance is compared with
+    if not raw:
+        loaded = instance.__dict__.setdefault('_loaded_values', {})
+        loaded.update((name, getattr(instance, name)) for name in _saved_fields(sender, update_fields))
+
+for model in PREVIOUS_FIELDS:
+    pre_save.connect(remember_previous, sender=model, dispatch_uid=f'remember_previous_{model.__name__}')
+    post_save.connect(remember_saved, sender=model, dispatch_uid=f'remember_saved_{model.__name__}')
+
+
+# ===== Ledger: keep StudentLedger in step with Transaction =====
+@receiver(post_save, sender=Transaction)
+def post_transaction_to_ledger(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        ledger.post(previous['student_id'], previous['date'], previous['amount'], previous['is_credit'], sign=-1)
+    ledger.post(instance.student_id, instance.date, instance.amount, instance.is_credit)
+
+@receiver(post_delete, sender=Transaction)
+def reverse_transaction_in_ledger(sender, instance, origin=None, **kwargs):
+    # Deleting the student removes their ledger as well; nothing to reverse
+    if deleted_with(origin, User):
+        return
+    ledger.post(instance.student_id, instance.date, instance.amount, instance.is_credit, sign=-1)
+
+
+# ===== Admin dashboard statistics snapshot =====
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def count_new_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.adjust(total_students=1)
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    stats.adjust(total_students=-1)
+
+@receiver(post_save, sender=Course)
+def count_new_course(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.adjust(total_courses=1)
+
+@receiver(post_delete, sender=Course)
+def uncount_course(sender, instance, **kwargs):
+    stats.adjust(total_courses=-1)
+
+@receiver(post_save, sender=Enrollment)
+def count_enrollment(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
     if created:
-        # Automatically create a profile for new users
-        Profile.objects.create(user=instance)
-    else:
-        # Save profile if user is updated
-        instance.profile.save()
\ No newline at end of file
+        stats.adjust(total_enrollments=1)
+        stats.adjust_course(instance.course_id, 1)
+    elif previous and previous['course_id'] != instance.course_id:
+        stats.adjust_course(previous['course_id'], -1)
+        stats.adjust_course(instance.course_id, 1)
+
+@receiver(post_delete, sender=Enrollment)
+def uncount_enrollment(sender, instance, origin=None, **kwargs):
+    stats.adjust(total_enrollments=-1)
+    # A deleted course takes its CourseStats row with it
+    if not deleted_with(origin, Course):
+        stats.adjust_course(instance.course_id, -1)
+
+@receiver(post_save, sender=Grade)
+def count_grade(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if created:
+        stats.adjust_grade(instance.grade, 1)
+    elif previous and previous['grade'] != instance.grade:
+        stats.adjust_grade(previous['grade'], -1)
+        stats.adjust_grade(instance.grade, 1)
+
+@receiver(post_delete, sender=Grade)
+def uncount_grade(sender, instance, **kwargs):
+    stats.adjust_grade(instance.grade, -1)
+
+@receiver(post_save, sender=Transaction)
+def count_transaction(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        stats.adjust(**stats.transaction_deltas(previous['amount'], previous['is_credit'], sign=-1))
+    stats.adjust(**stats.transaction_deltas(instance.amount, instance.is_credit))
+
+@receiver(post_delete, sender=Transaction)
+def uncount_transaction(sender, instance, **kwargs):
+    stats.adjust(**stats.transaction_deltas(instance.amount, instance.is_credit, sign=-1))
+
+
+# ===== Grade analytics: recompute the GPAs and course summaries a change touches =====
+@receiver(post_save, sender=Grade)
+def refresh_grade_analytics(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None) or {}
+    analytics.refresh(
+        {instance.student_id, previous.get('student_id', instance.student_id)},
+        {instance.course_id, previous.get('course_id', instance.course_id)},
+    )
+
+@receiver(post_delete, sender=Grade)
+def refresh_grade_analytics_on_delete(sender, instance, origin=None, **kwargs):
+    # A deleted student or course takes its stored results with it
+    analytics.refresh(
+        () if deleted_with(origin, User) else {instance.student_id},
+        () if deleted_with(origin, Course) else {instance.course_id},
+    )
+
+@receiver(post_save, sender=Enrollment)
+def refresh_term_gpas(sender, instance, raw=False, **kwargs):
+    # Term GPAs are grouped by enrollment date
+    if not raw:
+        previous = getattr(instance, '_previous', None) or {}
+        analytics.refresh({instance.student_id, previous.get('student_id', instance.student_id)})
+
+@receiver(post_delete, sender=Enrollment)
+def refresh_term_gpas_on_delete(sender, instance, origin=None, **kwargs):
+    # The grade of an unenrolled course no longer falls in a term
+    if not deleted_with(origin, User):
+        analytics.refresh({instance.student_id})
+
+@receiver(post_save, sender=Course)
+def refresh_weighted_gpas(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if not raw and previous and previous['credit_units'] != instance.credit_units:
+        analytics.refresh(Grade.objects.filter(course=instance).values_list('student_id', flat=True))
+
+
+# ===== Full-text search index =====
+def index_for_search(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index(instance)
+
+def remove_from_search(sender, instance, **kwargs):
+    search.remove(instance)
+
+for model in (LibraryItem, FAQ, Course):
+    post_save.connect(index_for_search, sender=model, dispatch_uid=f'index_for_search_{model.__name__}')
+    post_delete.connect(remove_from_search, sender=model, dispatch_uid=f'remove_from_search_{model.__name__}')
+
+
+# ===== Navigation cache =====
+def invalidate_navigation(sender, **kwargs):
+    cache.navigation.invalidate()
+
+for model in (PortalPage, HomePage):
+    post_save.connect(invalidate_navigation, sender=model, dispatch_uid=f'invalidate_navigation_{model.__name__}')
+    post_delete.connect(invalidate_navigation, sender=model, dispatch_uid=f'invalidate_navigation_delete_{model.__name__}')
+
+
+# ===== Change stamps for the per-user response cache =====
+def touch_user_stamp(sender, instance, **kwargs):
+    group = sender._meta.model_name
+    user_ids = {instance.user_id if sender is Profile else instance.student_id}
+    previous = getattr(instance, '_previous', None)
+    if previous and 'student_id' in previous:
+        # Moving a row to another student changes both students' pages
+        user_ids.add(previous['student_id'])
+    stamps.touch(*(stamps.key_for(group, user_id) for user_id in user_ids))
+
+def touch_shared_stamp(sender, instance, **kwargs):
+    stamps.touch('portalpage' if sender is PortalSection else sender._meta.model_name)
+
+for model in (Enrollment, Grade, Transaction, Profile):
+    post_save.connect(touch_user_stamp, sender=model, dispatch_uid=f'touch_user_stamp_{model.__name__}')
+    post_delete.connect(touch_user_stamp, sender=model, dispatch_uid=f'touch_user_stamp_delete_{model.__name__}')
+
+for model in (PortalPage, PortalSection, HomePage, Course, Event, LibraryItem, FAQ):
+    post_save.connect(touch_shared_stamp, sender=model, dispatch_uid=f'touch_shared_stamp_{model.__name__}')
+    post_delete.connect(touch_shared_stamp, sender=model, dispatch_uid=f'touch_shared_stamp_delete_{model.__name__}')
+
+
+# ===== Profiler: every worker picks up a started or stopped session =====
+def reload_profiling_session(sender, **kwargs):
+    profiling.settings_cache.invalidate()
+
+post_save.connect(reload_profiling_session, sender=ProfilingSession, dispatch_uid='reload_profiling_session')
+post_delete.connect(reload_profiling_session, sender=ProfilingSession, dispatch_uid='reload_profiling_session_delete')
+
+
+# ===== Image variants: resize new uploads off the request path =====
+def queue_image_variants(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for field_name in images.FIELDS[sender]:
+        if images.needs_build(instance, field_name):
+            images.queue(instance, field_name)
+
+for model in images.FIELDS:
+    post_save.connect(queue_image_variants, sender=model, dispatch_uid=f'queue_image_variants_{model.__name__}')
+
+
+# ===== Library PDFs: digest new uploads, reusing stored copies of identical files =====
+def record_library_pdf(sender, instance, raw=False, **kwargs):
+    if not raw:
+        library.record_pdf(instance)
+
+pre_save.connect(record_library_pdf, sender=LibraryItem, dispatch_uid='record_library_pdf')
@@ -0,0 +1,70 @@
+"""
+Change stamps: a version number and timestamp per group of rows.
+
+Signal handlers touch a stamp whenever a row in its group is saved or
+deleted. Global groups cover shared content (``course``, ``event``, ...);
+per-user groups cover rows owned by one student (``user:42:grade``). Caches
+compare versions to decide whether what they hold is still current, and
+the timestamps serve as Last-Modified dates.
+"""
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ChangeStamp
+
+
+# Row groups owned by a single student
+USER_GROUPS = ('enrollment', 'grade', 'transaction', 'profile')
+
+
+def key_for(group, user_id=None):
+    if group in USER_GROUPS:
+        return f'user:{user_id}:{group}'
+    return group
+
+
+def touch(*keys):
+    """Record a change to each of the given stamp keys."""
+    now = timezone.now()
+    for key in keys:
+        if ChangeStamp.objects.filter(key=key).update(version=F('version') + 1, changed_at=now):
+            continue
+        try:
+            with db_transaction.atomic():
+                ChangeStamp.objects.create(key=key, version=1, changed_at=now)
+        except IntegrityError:
+            # Created concurrently; count this change on top of it
+            ChangeStamp.objects.filter(key=key).update(version=F('version') + 1, changed_at=now)
+
+
+def touch_many(keys, batch_size=500):
+    """Record a change to many stamp keys at once, e.g. after a bulk import."""
+    now = timezone.now()
+    keys = sorted(set(keys))
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        ChangeStamp.objects.filter(key__in=batch).update(version=F('version') + 1, changed_at=now)
+        existing = set(ChangeStamp.objects.filter(key__in=batch).values_list('key', flat=True))
+        ChangeStamp.objects.bulk_create(
+            [ChangeStamp(key=key, version=1, changed_at=now) for key in batch if key not in existing],
+            ignore_conflicts=True,
+        )
+
+
+def read(keys):
+    """Return ``{key: (version, changed_at)}``; keys never touched map to ``(0, None)``."""
+    found = dict(
+        (key, (version, changed_at))
+        for key, version, changed_at in ChangeStamp.objects.filter(key__in=keys).values_list('key', 'version', 'changed_at')
+    )
+    return {key: found.get(key, (0, None)) for key in keys}
+
+
+def read_for_request(request, keys):
+    """Like ``read``, but remembered on the request so the stamps are fetched once per request."""
+    known = request.__dict__.setdefault('_change_stamps', {})
+    missing = [key for key in keys if key not in known]
+    if missing:
+        known.update(read(missing))
+    return {key: known[key] for key in keys}
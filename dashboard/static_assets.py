@@ -0,0 +1,183 @@
+"""
+Fingerprinted, precompressed static files, served by the app.
+
+``CompressedManifestStorage`` is the staticfiles storage. collectstatic
+writes every file under a content-hashed name (``css/style.3f2a9c1b.css``)
+as well as its own, and for text formats a Brotli (``.br``, quality 11)
+and a gzip (``.gz``, zopfli) copy next to each. Both are compressed once,
+at deploy time, as hard as the formats allow. Hashed names are listed in
+``staticfiles.json``, which ``{% static %}`` reads.
+
+``StaticFilesMiddleware`` answers requests under STATIC_URL from
+STATIC_ROOT before any other middleware runs, so no session or database
+work is done for them. It sends the ``.br`` or ``.gz`` copy when the
+browser accepts that encoding, and lets browsers keep hashed files for a
+year without revalidating (``immutable``): a changed file gets a new name.
+Files requested by their plain name are kept for ``PORTAL_STATIC_MAX_AGE``
+seconds and revalidated by ETag. STATIC_ROOT is indexed once per process,
+so restart the app after collectstatic.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from dataclasses import dataclass, field
+
+import brotli
+import zopfli.gzip
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags
+
+
+# Worth compressing: text formats (images and fonts other than SVG are compressed already)
+COMPRESSIBLE = {'.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.md', '.ico', '.ttf',
+                '.otf', '.eot'}
+MIN_SIZE = 256  # Bytes; smaller files gain nothing that outweighs the extra header
+MIN_SAVING = 0.05  # Keep a compressed copy only if it is at least 5% smaller
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))  # In order of preference
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def compress(data):
+    """``{extension: bytes}`` of the compressed copies worth keeping for ``data``."""
+    copies = {
+        '.br': brotli.compress(data, quality=11),
+        '.gz': zopfli.gzip.compress(data),
+    }
+    return {extension: copy for extension, copy in copies.items() if len(copy) <= len(data) * (1 - MIN_SAVING)}
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes ``.br`` and ``.gz`` copies of text files."""
+
+    # Files not in the manifest (not collected with this storage yet, as in
+    # development and tests) are linked by their plain name rather than fail the page
+    manifest_strict = False
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def convert(match):
+            try:
+                return converter(match)
+            except ValueError:
+                # Minified vendor files (Bootstrap) name source maps that are not shipped: leave those as they are
+                if match['url'].strip().split('?')[0].endswith('.map'):
+                    return match[0]
+                raise
+
+        return convert
+
+    def post_process(self, paths, dry_run=False, **options):
+        written = set(paths)
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                written.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        # Not yielded: collectstatic would count every copy as another post-processed file
+
+        compressed = {}  # Content digest -> copies: a file and its hashed name usually hold the same bytes
+        for name in sorted(written):
+            if posixpath.splitext(name)[1].lower() not in COMPRESSIBLE or not self.exists(name):
+                continue
+            with self.open(name) as f:
+                data = f.read()
+            if len(data) < MIN_SIZE:
+                continue
+            digest = hashlib.sha256(data).digest()
+            if digest not in compressed:
+                compressed[digest] = compress(data)
+            for extension in ('.br', '.gz'):
+                if self.exists(name + extension):
+                    self.delete(name + extension)
+                if extension in compressed[digest]:
+                    self._save(name + extension, ContentFile(compressed[digest][extension]))
+
+
+@dataclass
+class StaticFile:
+    path: str
+    content_type: str
+    immutable: bool
+    encodings: dict = field(default_factory=dict)  # Content-Encoding -> path of the precompressed copy
+
+
+def index(root, manifest_name='staticfiles.json'):
+    """``{relative url path: StaticFile}`` of the files collected into ``root``."""
+    try:
+        with open(os.path.join(root, manifest_name)) as f:
+            hashed = set(json.load(f).get('paths', {}).values())
+    except (OSError, ValueError):
+        hashed = set()
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            if relative.endswith(('.br', '.gz')) or relative == manifest_name:
+                continue
+            content_type, _ = mimetypes.guess_type(name)
+            static_file = StaticFile(path, content_type or 'application/octet-stream', relative in hashed)
+            for encoding, extension in ENCODINGS:
+                if os.path.exists(path + extension):
+                    static_file.encodings[encoding] = path + extension
+            files[relative] = static_file
+    return files
+
+
+def accepted_encodings(header):
+    """Content codings a browser accepts, from its ``Accept-Encoding`` header (``q=0`` refuses one)."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if coding and not (match and float(match.group(1)) == 0):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.files = index(settings.STATIC_ROOT) if settings.PORTAL_SERVE_STATIC and settings.STATIC_ROOT else {}
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            static_file = self.files.get(request.path_info[len(self.prefix):])
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request)
+
+    def serve(self, request, static_file):
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        encoding = next((encoding for encoding, _ in ENCODINGS
+                         if encoding in static_file.encodings and encoding in accepted), None)
+        path = static_file.encodings[encoding] if encoding else static_file.path
+        stat = os.stat(path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'  # Differs between the copies, as their bytes do
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+            del response['Content-Disposition']  # Set from the file name; says nothing useful here
+            response['Last-Modified'] = http_date(stat.st_mtime)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            IMMUTABLE if static_file.immutable else f'public, max-age={settings.PORTAL_STATIC_MAX_AGE}'
+        )
+        if static_file.encodings:
+            patch_vary_headers(response, ['Accept-Encoding'])
+        return response
@@ -0,0 +1,93 @@
+"""
+Statistics snapshot for the admin dashboard.
+
+Signal handlers apply each User, Course, Enrollment, Transaction and Grade
+change as a delta to ``DashboardStats``, ``CourseStats`` and ``GradeStats``,
+so the dashboard renders without scanning those tables. ``reconcile``
+recounts everything from scratch and is run periodically by the
+``reconcile_stats`` management command to correct any drift (bulk imports,
+raw SQL, ...).
+"""
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Course, Enrollment, Grade, Transaction, DashboardStats, CourseStats, GradeStats
+
+
+SNAPSHOT_ID = 1
+
+
+def snapshot():
+    """Return the stats row, building it with a full recount the first time."""
+    stats = DashboardStats.objects.filter(pk=SNAPSHOT_ID).first()
+    return stats or reconcile()
+
+
+def adjust(**deltas):
+    """Add the given deltas to the site-wide counters, e.g. ``adjust(total_courses=1)``.
+
+    Without a snapshot yet there is nothing to adjust; ``snapshot()`` will
+    build one with a full recount.
+    """
+    DashboardStats.objects.filter(pk=SNAPSHOT_ID).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def adjust_course(course_id, delta):
+    with db_transaction.atomic():
+        CourseStats.objects.get_or_create(course_id=course_id)
+        CourseStats.objects.filter(course_id=course_id).update(enrollment_count=F('enrollment_count') + delta)
+
+
+def adjust_grade(grade, delta):
+    with db_transaction.atomic():
+        GradeStats.objects.get_or_create(grade=grade)
+        GradeStats.objects.filter(grade=grade).update(count=F('count') + delta)
+
+
+def transaction_deltas(amount, is_credit, sign=1):
+    """Counter deltas for adding (``sign=1``) or removing (``sign=-1``) one transaction."""
+    amount = Decimal(amount) * sign
+    if is_credit:
+        return {'total_transactions': sign, 'total_credit': amount}
+    return {'total_transactions': sign, 'total_debit': amount}
+
+
+def reconcile():
+    """Recount every statistic from the source tables and return the fresh snapshot."""
+    totals = Transaction.objects.aggregate(
+        count=Count('id'),
+        credit=Sum('amount', filter=Q(is_credit=True)),
+        debit=Sum('amount', filter=Q(is_credit=False)),
+    )
+    enrollment_counts = dict(
+        Enrollment.objects.values_list('course_id').annotate(count=Count('id')).order_by()
+    )
+    grade_counts = dict(Grade.objects.values_list('grade').annotate(count=Count('id')).order_by())
+    course_ids = list(Course.objects.values_list('id', flat=True))
+
+    with db_transaction.atomic():
+        stats, _ = DashboardStats.objects.update_or_create(pk=SNAPSHOT_ID, defaults={
+            'total_students': User.objects.count(),
+            'total_courses': len(course_ids),
+            'total_enrollments': sum(enrollment_counts.values()),
+            'total_transactions': totals['count'],
+            'total_credit': totals['credit'] or 0,
+            'total_debit': totals['debit'] or 0,
+            'reconciled_at': timezone.now(),
+        })
+        CourseStats.objects.all().delete()
+        CourseStats.objects.bulk_create([
+            CourseStats(course_id=course_id, enrollment_count=enrollment_counts.get(course_id, 0))
+            for course_id in course_ids
+        ], batch_size=500)
+        GradeStats.objects.all().delete()
+        GradeStats.objects.bulk_create([
+            GradeStats(grade=grade, count=count) for grade, count in grade_counts.items()
+        ])
+    return stats
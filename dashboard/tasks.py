@@ -0,0 +1,30 @@
+"""
+Work the job queue can run (see dashboard.jobs), registered by name.
+
+Imported when the app is ready, so web processes can enqueue these and
+run_jobs workers can run them.
+"""
+import datetime
+
+from . import analytics, documents, images, importer, jobs, ledger, provisioning, search, stats
+
+
+# A student is waiting on the page for these
+jobs.register('documents.build', documents.build, priority=10)
+
+jobs.register('images.build', images.build, priority=5)
+
+# Hashes in its own process pool, however the worker runs jobs
+jobs.register('accounts.provision', provisioning.provision_roster, timeout=3600)
+jobs.register('accounts.purge_credentials', provisioning.purge_credentials, priority=-10,
+              every=datetime.timedelta(hours=1))
+
+jobs.register('imports.run', importer.run_queued, timeout=3600)
+
+# Safety nets behind the incrementally maintained read models
+jobs.register('stats.reconcile', stats.reconcile, every=datetime.timedelta(hours=1), manual=True)
+jobs.register('ledger.rebuild', ledger.rebuild, priority=-10, timeout=3600, manual=True)
+jobs.register('analytics.rebuild', analytics.rebuild, priority=-10, manual=True)
+jobs.register('search.rebuild', search.rebuild, priority=-10, timeout=3600, manual=True)
+
+jobs.register('jobs.prune', jobs.prune, priority=-10, every=datetime.timedelta(days=1))
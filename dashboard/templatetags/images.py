@@ -0,0 +1,16 @@
+from django import template
+
+from dashboard.images import picture_html
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(image, variant, alt='', sizes=None, **attrs):
+    """``{% picture profile.profile_picture 'card' alt='...' class='...' %}``: a responsive ``<picture>``.
+
+    Falls back to the original image until its variants are built; see
+    dashboard.images.
+    """
+    return picture_html(image, variant, alt=alt, sizes=sizes, **attrs)
@@ -1,3 +1,1690 @@
-from django.test import TestCase
+import csv
+import datetime
+import json
+import marshal
+import os
+import pstats
+import tempfile
+import threading
+import time
+import unittest
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from PIL import Image
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import Permission, User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse, QueryDict, StreamingHttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from .models import (
+    HomePage, PortalPage, PortalSection, Course, Enrollment, Grade, Transaction, LibraryItem, Event, FAQ, Profile, StudentLedger,
+    DashboardStats, CourseStats, GradeStats, ChangeStamp, ImportRun, ProfilingSession, ProfileCapture,
+    StudentGPA, CourseGradeSummary, GeneratedDocument, DocumentBatch, Job, Roster,
+)
+from . import (
+    analytics, async_views, benchmark, cache, compression, documents, images, importer, instrumentation, jobs, ledger,
+    profiling, provisioning, response_cache, search, static_assets, stats, views,
+)
+from .concurrency import run_concurrently
+from .management.commands.compare_serving import serving_async_views
+from .pagination import paginate, paginate_search
+from .read_models import QUERY_BUDGETS, StudentPortal
+
+try:
+    import weasyprint
+except (ImportError, OSError):  # Not installed, or Pango missing
+    weasyprint = None
+
+
+def make_student(username, password='password123'):
+    user = User.objects.create_user(username, password=password)
+    Profile.objects.create(user=user)
+    return user
+
+
+class PortalQueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for key, label in PortalPage.PAGE_CHOICES:
+            PortalPage.objects.create(page_key=key, heading=label)
+        cls.student = make_student('student')
+
+    def add_rows(self, count):
+        for i in range(count):
+            course = Course.objects.create(code=f'CSC{i:03d}', name=f'Course {i}')
+            Enrollment.objects.create(student=self.student, course=course)
+            Grade.objects.create(student=self.student, course=course, grade='A')
+            Transaction.objects.create(student=self.student, amount=100, description=f'Fee {i}')
+            LibraryItem.objects.create(title=f'Book {i}', author='Author')
+            Event.objects.create(title=f'Event {i}', date='2025-09-01', location='Hall')
+            FAQ.objects.create(question=f'Question {i}?', answer='<p>Answer</p>')
+
+    def count_queries(self, page_key):
+        response_cache.responses.clear()  # Measure the full render, not a cache hit
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard:portal_page', args=[page_key]))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_navigation_loads_no_section_content(self):
+        self.client.force_login(self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('dashboard:portal_page', args=['events']))
+        self.assertFalse([q for q in ctx.captured_queries if 'portalsection' in q['sql']])
+
+    def test_tabs_stay_within_budget_regardless_of_row_count(self):
+        self.client.force_login(self.student)
+        self.count_queries('dashboard')  # Warm the navigation cache
+        self.add_rows(1)
+        few = {key: self.count_queries(key) for key in QUERY_BUDGETS}
+        self.add_rows(20)
+        many = {key: self.count_queries(key) for key in QUERY_BUDGETS}
+
+        for page_key, budget in QUERY_BUDGETS.items():
+            with self.subTest(page_key=page_key):
+                self.assertLessEqual(many[page_key], budget)
+                self.assertEqual(few[page_key], many[page_key])
+
+
+class StudentLedgerTests(TestCase):
+    def setUp(self):
+        self.student = make_student('payer')
+
+    def balance(self):
+        return StudentLedger.objects.get(student=self.student)
+
+    def test_saves_and_deletes_update_running_totals(self):
+        fee = Transaction.objects.create(student=self.student, amount=500, description='Tuition')
+        payment = Transaction.objects.create(student=self.student, amount=200, description='Payment', is_credit=True)
+        self.assertEqual(self.balance().balance, Decimal('300.00'))
+
+        fee.amount = 450
+        fee.save()
+        self.assertEqual(self.balance().total_debit, Decimal('450.00'))
+        self.assertEqual(self.balance().balance, Decimal('250.00'))
+
+        payment.delete()
+        ledger_row = self.balance()
+        self.assertEqual(ledger_row.balance, Decimal('450.00'))
+        self.assertEqual(ledger_row.transaction_count, 1)
+        self.assertEqual(ledger.check(), [])
+
+    def test_edits_use_the_values_loaded_with_the_row(self):
+        Transaction.objects.create(student=self.student, amount=500, description='Tuition')
+        fee = Transaction.objects.get()
+
+        def reads_of_the_row(ctx):
+            return [q for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'dashboard_transaction' in q['sql']]
+
+        with CaptureQueriesContext(connection) as ctx:
+            fee.amount = 400
+            fee.save()
+            fee.amount = 350  # Compared with what the last save wrote
+            fee.save()
+            fee.description = 'Tuition fee'
+            fee.save(update_fields=['description'])
+        self.assertEqual(reads_of_the_row(ctx), [])
+        self.assertEqual(self.balance().total_debit, Decimal('350.00'))
+
+        Transaction.objects.filter(pk=fee.pk).update(amount=300)
+        fee.refresh_from_db()
+        fee.amount = 250
+        fee.save()
+        self.assertEqual(self.balance().total_debit, Decimal('300.00'))  # 350 - 300 + 250: the refreshed amount
+
+        built = Transaction(pk=fee.pk, student=self.student, amount=200, description='Tuition', date=fee.date)
+        built.save()  # Not loaded, so the stored row is read
+        self.assertEqual(self.balance().total_debit, Decimal('250.00'))
+
+    def test_rebuild_repairs_drift(self):
+        Transaction.objects.create(student=self.student, amount=100, description='Lab fee')
+        StudentLedger.objects.filter(student=self.student).update(balance=0)
+        self.assertTrue(ledger.check())
+
+        call_command('rebuild_ledger', stdout=StringIO())
+        self.assertEqual(ledger.check(), [])
+        self.assertEqual(self.balance().balance, Decimal('100.00'))
+
+    def test_term_for_date(self):
+        self.assertEqual(ledger.term_for_date(datetime.date(2025, 9, 1)), '2025/2026 First Semester')
+        self.assertEqual(ledger.term_for_date(datetime.date(2026, 1, 15)), '2025/2026 First Semester')
+        self.assertEqual(ledger.term_for_date(datetime.date(2026, 3, 1)), '2025/2026 Second Semester')
+
+
+class ProfileTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ada', password='password123')
+
+    def test_login_leaves_the_profile_alone_until_it_is_used(self):
+        self.assertFalse(Profile.objects.exists())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('dashboard:login'), {'username': 'ada', 'password': 'password123'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse([query for query in queries if 'dashboard_profile' in query['sql']])
+
+        self.client.get(reverse('dashboard:edit_profile'))
+        self.client.get(reverse('dashboard:edit_profile'))
+        self.assertEqual(Profile.objects.filter(user=self.user).count(), 1)
+
+    def test_unchanged_profile_form_writes_nothing(self):
+        Profile.objects.create(user=self.user, phone='555', address='1 Main St')
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('dashboard:edit_profile'), {'phone': '555', 'address': '1 Main St'})
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+        self.client.post(reverse('dashboard:edit_profile'), {'phone': '556', 'address': '1 Main St'})
+        self.assertEqual(Profile.objects.get(user=self.user).phone, '556')
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        self.student = make_student('counted')
+        self.course = Course.objects.create(code='MTH101', name='Calculus I')
+        stats.reconcile()
+
+    def assertMatchesRecount(self):
+        live = DashboardStats.objects.get()
+        live_courses = dict(CourseStats.objects.filter(enrollment_count__gt=0).values_list('course_id', 'enrollment_count'))
+        live_grades = dict(GradeStats.objects.filter(count__gt=0).values_list('grade', 'count'))
+        recounted = stats.reconcile()
+        for field in ('total_students', 'total_courses', 'total_enrollments',
+                      'total_transactions', 'total_credit', 'total_debit'):
+            self.assertEqual(getattr(live, field), getattr(recounted, field), field)
+        self.assertEqual(live_courses, dict(CourseStats.objects.filter(enrollment_count__gt=0).values_list('course_id', 'enrollment_count')))
+        self.assertEqual(live_grades, dict(GradeStats.objects.values_list('grade', 'count')))
+
+    def test_signal_deltas_match_full_recount(self):
+        other = Course.objects.create(code='PHY101', name='Physics I')
+        enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        grade = Grade.objects.create(student=self.student, course=self.course, grade='B')
+        Transaction.objects.create(student=self.student, amount=300, description='Lab fee')
+        Transaction.objects.create(student=self.student, amount=100, description='Payment', is_credit=True)
+        self.assertMatchesRecount()
+
+        enrollment.course = other
+        enrollment.save()
+        grade.grade = 'A'
+        grade.save()
+        self.assertMatchesRecount()
+
+        self.course.delete()
+        other.delete()
+        self.assertMatchesRecount()
+
+    def test_deleting_a_student_updates_totals(self):
+        Enrollment.objects.create(student=self.student, course=self.course)
+        Transaction.objects.create(student=self.student, amount=300, description='Tuition')
+        self.student.delete()
+        self.assertMatchesRecount()
+
+    def test_admin_dashboard_query_count_is_constant(self):
+        staff = make_student('registrar')
+        User.objects.filter(pk=staff.pk).update(is_staff=True)
+        self.client.force_login(staff)
+        self.client.get(reverse('dashboard:admin_dashboard'))  # Warm the navigation cache
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(reverse('dashboard:admin_dashboard'))
+        for i in range(10):
+            course = Course.objects.create(code=f'GEN{i}', name=f'General {i}')
+            Enrollment.objects.create(student=self.student, course=course)
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(reverse('dashboard:admin_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(before.captured_queries), len(after.captured_queries))
+
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "SQLite settings")
+class SQLiteSettingsTests(TestCase):
+    def test_connections_are_tuned_for_concurrent_workers(self):
+        with connection.cursor() as cursor:
+            pragmas = [cursor.execute(f'PRAGMA {name}').fetchone()[0] for name in ('synchronous', 'busy_timeout')]
+        self.assertEqual(pragmas, [1, 20000])  # NORMAL; the test database is in memory, so not in WAL mode
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+@unittest.skipUnless(search.available(), "Full-text search needs SQLite's FTS5")
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.book = LibraryItem.objects.create(
+            title='Physics Fundamentals', author='Albert Newton',
+            description='<p>Classical <strong>mechanics</strong> &amp; motion.</p>',
+        )
+        LibraryItem.objects.create(title='Calculus Guide', author='Jane Smith', description='<p>Limits and strong derivatives</p>')
+        self.faq = FAQ.objects.create(question='How do I pay fees?', answer='<p>Use the <em>finance</em> portal.</p>', category='finance')
+
+    def test_matches_text_not_markup(self):
+        self.assertEqual(search.matching_ids('library', 'mechanics'), [self.book.pk])
+        # "strong" only appears as a tag in the physics book
+        self.assertEqual(len(search.matching_ids('library', 'strong')), 1)
+        self.assertEqual(search.matching_ids('faq', 'em'), [])
+
+    def test_results_are_highlighted_and_escaped(self):
+        [hit] = search.search('library', 'mech')
+        self.assertIn('<mark>mechanics</mark>', hit.snippet)
+        self.assertIn('&amp;', hit.snippet)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.book.title = 'Quantum Fundamentals'
+        self.book.save()
+        self.assertEqual(search.matching_ids('library', 'quantum'), [self.book.pk])
+        self.assertEqual(search.matching_ids('library', 'physics'), [])
+        self.book.delete()
+        self.assertEqual(search.matching_ids('library', 'quantum'), [])
+
+    def test_title_matches_rank_first(self):
+        body_match = LibraryItem.objects.create(title='Study Skills', description='<p>Notes on calculus</p>')
+        ids = search.matching_ids('library', 'calculus')
+        self.assertEqual(ids[-1], body_match.pk)
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM dashboard_search_faq")
+        self.assertEqual(search.matching_ids('faq', 'fees'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search.matching_ids('faq', 'fees'), [self.faq.pk])
+
+    def test_course_search_matches_part_of_a_code(self):
+        student = make_student('student')
+        for code, name in [('CSC101', 'Programming'), ('MTH200', 'Calculus')]:
+            Enrollment.objects.create(student=student, course=Course.objects.create(code=code, name=name))
+        portal = StudentPortal(student)
+        for text in ['101', 'progr', 'CSC']:
+            with self.subTest(search=text), self.assertNumQueries(1):  # The match is a subquery, not an id list
+                self.assertEqual([e.course.code for e in portal.enrollments(QueryDict(f'search={text}'))], ['CSC101'])
+        self.assertEqual([g.course.code for g in portal.grades(QueryDict('search=101'))], [])
+
+    def test_library_page_uses_index(self):
+        PortalPage.objects.create(page_key='library', heading='Library')
+        self.client.force_login(make_student('reader'))
+        response = self.client.get(reverse('dashboard:portal_page', args=['library']), {'search': 'newton'})
+        self.assertEqual([item.pk for item in response.context['library_items']], [self.book.pk])
+
+
+class KeysetPaginationTests(TestCase):
+    def walk(self, fetch, params):
+        """Follow next cursors to the end, then previous cursors back; return both id sequences."""
+        forward, pages = [], []
+        page = fetch(QueryDict(params))
+        while True:
+            pages.append(page)
+            forward.extend(obj.pk for obj in page)
+            if not page.has_next:
+                break
+            page = fetch(QueryDict(page.next_query()))
+        backward = [obj.pk for obj in page]
+        while page.has_previous:
+            page = fetch(QueryDict(page.previous_query()))
+            backward = [obj.pk for obj in page] + backward
+        return forward, backward, pages
+
+    def test_walks_every_row_once_in_both_directions(self):
+        for i in range(23):
+            # Repeated dates force the id tie-breaker
+            Event.objects.create(title=f'Event {i}', date=datetime.date(2025, 9, 1 + i % 4),
+                                 location='Hall', category='seminar' if i % 2 else 'sports')
+        seminars = Event.objects.filter(category='seminar')
+        expected = list(seminars.order_by('date', 'id').values_list('id', flat=True))
+
+        forward, backward, pages = self.walk(
+            lambda params: paginate(seminars, params, ('date', 'id'), per_page=4), 'category=seminar',
+        )
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+        self.assertIn('category=seminar', pages[0].next_query())
+
+    def test_descending_order(self):
+        student = make_student('spender')
+        for i in range(7):
+            Transaction.objects.create(student=student, amount=i + 1, description=f'Fee {i}')
+        transactions = Transaction.objects.filter(student=student)
+        expected = list(transactions.order_by('-date', '-id').values_list('id', flat=True))
+        forward, backward, _ = self.walk(
+            lambda params: paginate(transactions, params, ('-date', '-id'), per_page=3), '',
+        )
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_search_results_page_in_rank_order(self):
+        for i in range(9):
+            LibraryItem.objects.create(title=f'Algebra volume {i}', description='<p>algebra ' * (i % 3 + 1) + '</p>')
+        expected = search.matching_ids('library', 'algebra')
+        forward, backward, _ = self.walk(
+            lambda params: paginate_search('library', 'algebra', LibraryItem.objects.all(), params, per_page=4),
+            'search=algebra',
+        )
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_filtered_search_pages_are_full(self):
+        for i in range(12):
+            FAQ.objects.create(question=f'Fees question {i}', answer='<p>fees</p>',
+                               category='finance' if i % 3 == 0 else 'academic')
+        finance = FAQ.objects.filter(category='finance')
+        expected = [pk for pk in search.matching_ids('faq', 'fees') if pk in set(finance.values_list('id', flat=True))]
+        forward, backward, pages = self.walk(
+            lambda params: paginate_search('faq', 'fees', finance, params, per_page=2), 'search=fees&category=finance',
+        )
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+        self.assertEqual([len(page) for page in pages], [2, 2])
+
+    def test_garbage_cursor_starts_from_the_beginning(self):
+        Event.objects.create(title='Only', date=datetime.date(2025, 9, 1), location='Hall')
+        page = paginate(Event.objects.all(), QueryDict('after=not-a-cursor'), ('date', 'id'))
+        self.assertEqual(len(page), 1)
+        self.assertFalse(page.has_previous)
+
+
+class PortalSectionTests(TestCase):
+    def test_active_content_comes_from_the_page_section(self):
+        page = PortalPage.objects.create(page_key='dashboard', heading='Dashboard')
+        PortalSection.objects.create(page=page, key='main', content='<p>Welcome back</p>')
+        PortalSection.objects.create(page=page, key='courses', content='<p>Unused here</p>')
+        self.assertEqual(page.get_active_content(), '<p>Welcome back</p>')
+
+    def test_missing_section_shows_placeholder(self):
+        page = PortalPage.objects.create(page_key='grades', heading='Grades')
+        self.assertIn('Content coming soon', page.get_active_content())
+
+
+@override_settings(PORTAL_CACHE_DIR=tempfile.mkdtemp())
+class NavigationCacheTests(TestCase):
+    def setUp(self):
+        cache.navigation.invalidate()
+        PortalPage.objects.create(page_key='events', heading='Events')
+
+    def test_second_lookup_runs_no_queries(self):
+        cache.portal_nav_pages()
+        cache.home_page()
+        with self.assertNumQueries(0):
+            self.assertEqual([p.heading for p in cache.portal_nav_pages()], ['Events'])
+            self.assertIsNone(cache.home_page())
+
+    def test_saving_a_page_invalidates_this_process_immediately(self):
+        cache.portal_nav_pages()
+        PortalPage.objects.create(page_key='help', heading='Help')
+        self.assertEqual(len(cache.portal_nav_pages()), 2)
+
+    def test_stamp_bumped_by_another_worker_drops_local_copy(self):
+        cache.home_page()
+        # Another process saves a HomePage: the row changes and the shared stamp moves
+        HomePage.objects.bulk_create([HomePage(title='Welcome', background_image='homepage/x.png')])
+        self.assertIsNone(cache.home_page())
+        cache.VersionStamp('navigation').bump()
+        self.assertEqual(cache.home_page().title, 'Welcome')
+
+    def test_stamp_is_bumped_when_the_change_commits(self):
+        before = cache.navigation.stamp.read()
+        with self.captureOnCommitCallbacks(execute=True):
+            PortalPage.objects.create(page_key='grades', heading='Grades')
+        self.assertNotEqual(cache.navigation.stamp.read(), before)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        response_cache.responses.clear()
+        PortalPage.objects.create(page_key='grades', heading='Grades')
+        self.course = Course.objects.create(code='CSC101', name='Programming')
+        self.student = make_student('student')
+        self.other = make_student('other')
+        self.grade = Grade.objects.create(student=self.student, course=self.course, grade='B')
+        self.url = reverse('dashboard:portal_page', args=['grades'])
+        self.client.force_login(self.student)
+        self.client.get(reverse('dashboard:portal_page', args=['grades']))  # Sets the CSRF cookie
+
+    def test_repeat_request_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url)
+        self.assertEqual(first.content, second.content)
+        self.assertFalse([q for q in ctx.captured_queries if 'dashboard_grade' in q['sql']])
+        self.assertIn('private', second['Cache-Control'])
+        self.assertGreaterEqual(response_cache.responses.stats()['hits'], 1)
+
+    def test_own_changes_invalidate_the_page(self):
+        self.client.get(self.url)
+        self.grade.grade = 'A'
+        self.grade.save()
+        self.assertContains(self.client.get(self.url), '<td>A</td>', html=True)
+
+    def test_other_students_changes_keep_the_entry(self):
+        self.client.get(self.url)
+        hits = response_cache.responses.stats()['hits']
+        Grade.objects.create(student=self.other, course=self.course, grade='C')
+        self.client.get(self.url)
+        self.assertEqual(response_cache.responses.stats()['hits'], hits + 1)
+
+    def test_query_strings_are_normalized(self):
+        self.assertEqual(
+            response_cache.normalized_query(QueryDict('b=2&a=1&empty=')),
+            response_cache.normalized_query(QueryDict('a=1&b=2')),
+        )
+
+    def test_lru_stays_within_its_byte_bound(self):
+        lru = response_cache.ResponseCache(max_bytes=10)
+        lru.set('a', (1,), b'12345', 'text/html')
+        lru.set('b', (1,), b'12345', 'text/html')
+        self.assertIsNotNone(lru.get('a', (1,)))
+        lru.set('c', (1,), b'12345', 'text/html')
+        self.assertIsNone(lru.get('b', (1,)))
+        self.assertIsNone(lru.get('a', (2,)))
+        self.assertEqual(lru.stats()['bytes'], 10)
+        self.assertEqual(lru.stats()['evictions'], 1)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        response_cache.responses.clear()
+        PortalPage.objects.create(page_key='grades', heading='Grades')
+        PortalPage.objects.create(page_key='events', heading='Events')
+        self.course = Course.objects.create(code='CSC101', name='Programming')
+        self.student = make_student('student')
+        self.other = make_student('other')
+        self.client.force_login(self.student)
+        self.url = reverse('dashboard:portal_page', args=['grades'])
+        self.client.get(self.url)  # Sets the CSRF cookie
+
+    def revisit(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_page_answers_304_without_listing_queries(self):
+        first = self.client.get(self.url)
+        self.assertIn('no-cache', first['Cache-Control'])
+        self.assertIn('private', first['Cache-Control'])
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.revisit(self.url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if 'dashboard_grade' in q['sql']])
+
+    def test_own_rows_change_the_etag(self):
+        first = self.client.get(self.url)
+        Grade.objects.create(student=self.student, course=self.course, grade='A')
+        self.assertEqual(self.revisit(self.url, first).status_code, 200)
+
+    def test_other_students_rows_keep_the_etag(self):
+        first = self.client.get(self.url)
+        Grade.objects.create(student=self.other, course=self.course, grade='A')
+        self.assertEqual(self.revisit(self.url, first).status_code, 304)
+
+    def test_shared_content_and_query_string_change_the_etag(self):
+        url = reverse('dashboard:portal_page', args=['events'])
+        first = self.client.get(url)
+        self.assertEqual(self.client.get(url + '?category=sports', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        Event.objects.create(title='Open day', date='2025-09-01', location='Hall')
+        self.assertEqual(self.revisit(url, first).status_code, 200)
+
+    def test_last_modified_follows_the_latest_change(self):
+        Grade.objects.create(student=self.student, course=self.course, grade='A')
+        response = self.client.get(self.url)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304,
+        )
+
+    def test_public_home_page_is_conditional(self):
+        self.client.logout()
+        first = self.client.get(reverse('dashboard:home'))
+        self.assertEqual(self.revisit(reverse('dashboard:home'), first).status_code, 304)
+        HomePage.objects.create(title='Welcome', background_image='homepage/x.png')
+        self.assertEqual(self.revisit(reverse('dashboard:home'), first).status_code, 200)
+
+
+
+class CompressionTests(TestCase):
+    html = '<html><body>' + '<tr><td>CSC101</td><td>Programming</td><td>A</td></tr>' * 200 + '</body></html>'
+
+    def compressed(self, response, accept='gzip, deflate, br'):
+        middleware = compression.CompressionMiddleware(lambda request: response)
+        return middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept))
+
+    def test_prefers_brotli_and_falls_back_to_gzip(self):
+        response = self.compressed(HttpResponse(self.html, headers={'ETag': '"v1"'}))
+        self.assertEqual((response['Content-Encoding'], response['Vary'], response['ETag']),
+                         ('br', 'Accept-Encoding', 'W/"v1"'))
+        self.assertEqual(compression.brotli.decompress(response.content).decode(), self.html)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(self.html) // 10)
+
+        response = self.compressed(HttpResponse(self.html), accept='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(compression.gzip.decompress(response.content).decode(), self.html)
+        response = self.compressed(HttpResponse(self.html), accept='identity')
+        self.assertEqual((response.get('Content-Encoding'), response['Vary']), (None, 'Accept-Encoding'))
+
+    def test_leaves_small_binary_and_partial_responses_alone(self):
+        for response in [HttpResponse('<p>short</p>'), HttpResponse(self.html, content_type='application/pdf'),
+                         HttpResponse(self.html, status=206),
+                         HttpResponse(self.html, headers={'Cache-Control': 'no-transform'})]:
+            self.assertNotIn('Content-Encoding', self.compressed(response))
+
+    def test_streams_are_compressed_chunk_by_chunk(self):
+        chunks = [self.html[:1000], self.html[1000:]]
+        response = self.compressed(StreamingHttpResponse(iter(chunks)))
+        self.assertNotIn('Content-Length', response)
+        decompressor, received = compression.brotli.Decompressor(), b''
+        body = iter(response.streaming_content)
+        received += decompressor.process(next(body))
+        self.assertEqual(received.decode(), chunks[0])  # Flushed: the first chunk is readable on arrival
+        received += b''.join(decompressor.process(part) for part in body)
+        self.assertEqual(received.decode(), self.html)
+
+        async def parts():
+            for chunk in chunks:
+                yield chunk
+
+        async def read(response):
+            return b''.join([part async for part in response.streaming_content])
+
+        response = self.compressed(StreamingHttpResponse(parts()), accept='gzip')
+        self.assertEqual(compression.gzip.decompress(async_to_sync(read)(response)).decode(), self.html)
+
+    def test_portal_page_keeps_answering_304(self):
+        PortalPage.objects.create(page_key='grades', heading='Grades')
+        self.client.force_login(make_student('student'))
+        url = reverse('dashboard:portal_page', args=['grades'])
+        self.client.get(url)  # Sets the CSRF cookie
+        first = self.client.get(url, HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(first['Content-Encoding'], 'br')
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=first['ETag']).status_code,
+                         304)
+
+    def test_reflected_input_gets_padded_gzip_only(self):
+        middleware = compression.CompressionMiddleware(lambda request: HttpResponse(self.html))
+        lengths = set()
+        for _ in range(20):
+            response = middleware(RequestFactory().get('/', {'search': 'CSC'}, HTTP_ACCEPT_ENCODING='gzip, br'))
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(compression.gzip.decompress(response.content).decode(), self.html)
+            lengths.add(len(response.content))
+        self.assertGreater(len(lengths), 1)  # Padded: the length varies from response to response
+
+        middleware = compression.CompressionMiddleware(lambda request: StreamingHttpResponse(iter([self.html])))
+        self.assertNotIn('Content-Encoding', middleware(RequestFactory().post('/', HTTP_ACCEPT_ENCODING='br')))
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        response_cache.responses.clear()
+        for key, label in PortalPage.PAGE_CHOICES:
+            PortalPage.objects.create(page_key=key, heading=label)
+        self.student = make_student('student')
+        Transaction.objects.create(student=self.student, amount=250, description='Tuition', date='2025-10-01')
+
+    def test_portal_pages_match_the_sync_views(self):
+        self.client.force_login(self.student)
+        sync_pages = {key: self.client.get(reverse('dashboard:portal_page', args=[key])) for key in QUERY_BUDGETS}
+        response_cache.responses.clear()
+        with serving_async_views():
+            self.assertTrue(iscoroutinefunction(resolve('/portal/finance/').func))
+            self.async_client.force_login(self.student)
+            for key, sync_response in sync_pages.items():
+                with self.subTest(page_key=key):
+                    response = async_to_sync(self.async_client.get)(reverse('dashboard:portal_page', args=[key]))
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.templates[0].name if response.templates else None,
+                                     sync_response.templates[0].name if sync_response.templates else None)
+        self.assertContains(sync_pages['finance'], 'Tuition')
+
+    def test_async_views_keep_the_query_budgets(self):
+        for name in ('home', 'portal_page', 'admin_dashboard', 'help_page'):
+            with self.subTest(view=name):
+                self.assertEqual(getattr(async_views, name).query_budget, getattr(views, name).query_budget)
+        with serving_async_views(), override_settings(
+                PORTAL_QUERY_INSTRUMENTATION=True, PORTAL_QUERY_BUDGET_MODE='raise'):
+            self.async_client.force_login(self.student)
+            response = async_to_sync(self.async_client.get)(reverse('dashboard:portal_page', args=['grades']))
+            self.assertEqual(response.status_code, 200)
+
+    def test_finance_and_admin_dashboard(self):
+        staff = make_student('staff')
+        User.objects.filter(pk=staff.pk).update(is_staff=True)
+        with serving_async_views():
+            self.async_client.force_login(self.student)
+            finance = async_to_sync(self.async_client.get)(reverse('dashboard:portal_page', args=['finance']))
+            self.assertContains(finance, 'Tuition')
+            self.assertEqual(async_to_sync(self.async_client.get)('/portal/missing/').status_code, 404)
+            self.async_client.force_login(staff)
+            admin = async_to_sync(self.async_client.get)(reverse('dashboard:admin_dashboard'))
+            self.assertEqual(admin.status_code, 200)
+            self.assertEqual(admin.context['total_transactions'], 1)
+
+
+class RunConcurrentlyTests(TransactionTestCase):
+    def test_calls_run_on_separate_threads_and_keep_their_order(self):
+        Course.objects.create(code='CSC101', name='Programming')
+        seen = []
+
+        def record(value):
+            def call():
+                seen.append(threading.get_ident())
+                return value, Course.objects.count()
+            return call
+
+        results = async_to_sync(run_concurrently)(record('a'), record('b'))
+        self.assertEqual(list(results), [('a', 1), ('b', 1)])
+        self.assertNotIn(threading.get_ident(), seen)
+
+    @override_settings(PORTAL_CONCURRENT_QUERIES=False)
+    def test_can_be_switched_off(self):
+        results = async_to_sync(run_concurrently)(lambda: 1, lambda: 2)
+        self.assertEqual(results, [1, 2])
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.alice = make_student('alice')
+        self.bob = make_student('bob')
+        self.course = Course.objects.create(code='CSC101', name='Programming')
+        Course.objects.create(code='MTH101', name='Calculus')
+
+    def run_import(self, kind, text, name='rows.csv', **kwargs):
+        return importer.run_import(kind, BytesIO(text.encode()), name, **kwargs)
+
+    def test_enrollments_skip_existing_and_report_bad_rows(self):
+        Enrollment.objects.create(student=self.alice, course=self.course)
+        run = self.run_import('enrollment', (
+            "student,course\n"
+            "alice,CSC101\n"
+            "bob,CSC101\n"
+            "bob,MTH101\n"
+            "carol,CSC101\n"
+            "bob,PHY999\n"
+        ))
+        self.assertEqual(run.status, 'finished')
+        self.assertEqual((run.created_count, run.skipped_count, run.error_count), (2, 1, 2))
+        self.assertEqual(run.errors, [
+            {'row': 4, 'message': "unknown student 'carol'"},
+            {'row': 5, 'message': "unknown course 'PHY999'"},
+        ])
+        self.assertEqual(Enrollment.objects.filter(student=self.bob).count(), 2)
+        self.assertEqual(stats.snapshot().total_enrollments, 3)
+
+    def test_grades_update_existing_rows(self):
+        Grade.objects.create(student=self.alice, course=self.course, grade='C')
+        run = self.run_import('grade', '{"student": "alice", "course": "CSC101", "grade": "a"}\n\n'
+                                       '{"student": "bob", "course": "CSC101", "grade": "B"}\n', name='grades.jsonl')
+        self.assertEqual((run.created_count, run.updated_count), (1, 1))
+        self.assertEqual(Grade.objects.get(student=self.alice).grade, 'A')
+        self.assertEqual(StudentGPA.objects.get(student=self.alice).cgpa, 4.0)
+        self.assertEqual(CourseGradeSummary.objects.get(course=self.course).distribution, {'A': 1, 'B': 1})
+
+    def test_transactions_keep_their_dates_and_update_ledgers(self):
+        before = ChangeStamp.objects.filter(key=f'user:{self.alice.pk}:transaction').first()
+        run = self.run_import('transaction', (
+            "student,amount,description,date,is_credit\n"
+            "alice,1500.00,Tuition,2025-09-15,false\n"
+            "alice,500,Payment,2025-10-01,true\n"
+            "alice,abc,Broken,,\n"
+        ))
+        self.assertEqual((run.created_count, run.error_count), (2, 1))
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('date', flat=True)),
+            [datetime.date(2025, 9, 15), datetime.date(2025, 10, 1)],
+        )
+        self.assertEqual(StudentLedger.objects.get(student=self.alice).balance, Decimal('1000.00'))
+        self.assertEqual(ledger.check(), [])
+        self.assertIsNone(before)
+        self.assertTrue(ChangeStamp.objects.filter(key=f'user:{self.alice.pk}:transaction').exists())
+
+    def test_dry_run_writes_nothing(self):
+        run = self.run_import('enrollment', "student,course\nalice,CSC101\nnobody,CSC101\n", dry_run=True)
+        self.assertEqual((run.rows_processed, run.error_count), (2, 1))
+        self.assertFalse(Enrollment.objects.exists())
+
+    def test_failed_import_resumes_from_its_checkpoint(self):
+        rows = "student,course\n" + "alice,CSC101\nalice,MTH101\nbob,CSC101\nbob,MTH101\n"
+        original = importer.Importer.write
+        calls = []
+
+        def fail_on_second_chunk(self, valid):
+            calls.append(valid)
+            if len(calls) == 2:
+                raise RuntimeError('database went away')
+            return original(self, valid)
+
+        with mock.patch.object(importer.Importer, 'write', fail_on_second_chunk), \
+                self.assertLogs('dashboard.importer', 'ERROR'):
+            failed = self.run_import('enrollment', rows, chunk_size=2)
+        self.assertEqual((failed.status, failed.rows_processed, failed.created_count), ('failed', 2, 2))
+
+        resumed = self.run_import('enrollment', rows, chunk_size=2, resume=True)
+        self.assertEqual(resumed.pk, failed.pk)
+        self.assertEqual((resumed.status, resumed.rows_processed, resumed.created_count), ('finished', 4, 4))
+        self.assertEqual(Enrollment.objects.count(), 4)
+
+    def test_command_and_upload_view(self):
+        path = os.path.join(tempfile.mkdtemp(), 'enrollments.csv')
+        with open(path, 'w') as f:
+            f.write("student,course\nalice,CSC101\n")
+        out = StringIO()
+        call_command('import_records', 'enrollment', path, stdout=out)
+        self.assertIn('1 created', out.getvalue())
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        User.objects.filter(pk=self.bob.pk).update(is_staff=True)
+        self.client.force_login(self.bob)
+        upload = SimpleUploadedFile('grades.csv', b"student,course,grade\nalice,CSC101,A\nalice,CSC101,ABC\n")
+        response = self.client.post(reverse('dashboard:import_records'), {'kind': 'grade', 'file': upload})
+        run = ImportRun.objects.get(source='grades.csv')
+        self.assertRedirects(response, reverse('dashboard:import_run', args=[run.pk]))
+        self.assertEqual((run.status, Grade.objects.count()), ('queued', 0))  # Left to a worker
+        response = self.client.get(response.url)
+        self.assertContains(response, 'Waiting for a worker')
+        self.assertEqual(response['Refresh'], '5')
+
+        jobs.run_worker(workers=1, burst=True)
+        response = self.client.get(response.wsgi_request.path)
+        self.assertContains(response, 'is longer than 2 characters')
+        self.assertNotIn('Refresh', response)
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.created_count, run.file.name), ('finished', 1, ''))
+        self.assertEqual(os.listdir(os.path.join(media.name, 'imports')), [])  # Deleted once imported
+
+
+class ProvisioningTests(TestCase):
+    roster = (
+        "username,first_name,last_name,email\n"
+        "ada,Ada,Lovelace,ada@example.edu\n"
+        "alice,Alice,,\n"
+        "bad name!,,,\n"
+        "grace,Grace,Hopper,\n"
+        "ada,Ada,Again,\n"
+        "linus,,,not-an-email\n"
+    )
+
+    def setUp(self):
+        make_student('alice')
+        stats.reconcile()
+        credentials = tempfile.TemporaryDirectory()
+        self.addCleanup(credentials.cleanup)
+        self.credentials_dir = os.path.join(credentials.name, 'credentials')
+        self.enterContext(override_settings(PORTAL_CREDENTIALS_DIR=self.credentials_dir))
+
+    def test_command_creates_accounts_and_writes_the_report(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'intake.csv')
+        with open(path, 'w') as f:
+            f.write(self.roster)
+        out = StringIO()
+        call_command('provision_students', path, workers=1, batch_size=2, stdout=out, stderr=StringIO())
+        self.assertIn('2 accounts created, 4 rows rejected', out.getvalue())
+
+        roster = Roster.objects.get()
+        self.assertEqual((roster.status, roster.rows_processed), ('finished', 6))
+        self.assertEqual(roster.errors, [
+            {'row': 2, 'message': "username 'alice' is already taken"},
+            {'row': 3, 'message': "invalid username 'bad name!'"},
+            {'row': 5, 'message': "username 'ada' is already taken"},
+            {'row': 6, 'message': "invalid email 'not-an-email'"},
+        ])
+        self.assertEqual(stats.snapshot().total_students, 3)
+        self.assertTrue(Profile.objects.filter(user__username='grace').exists())
+
+        report = os.path.join(directory, 'intake-credentials.csv')
+        self.assertEqual(os.stat(report).st_mode & 0o777, 0o600)
+        with open(report) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['username'] for row in rows], ['ada', 'grace'])
+        self.assertTrue(User.objects.get(username='ada').check_password(rows[0]['password']))
+        self.assertEqual(User.objects.get(username='ada').email, 'ada@example.edu')
+        roster.refresh_from_db()
+        self.assertIsNotNone(roster.credentials_taken_at)
+        self.assertFalse(os.path.exists(self.credentials_dir))  # Only in the report
+
+    @mock.patch('os.cpu_count', return_value=1)
+    def test_admin_action_provisions_an_uploaded_roster(self, cpu_count):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        User.objects.filter(username='alice').update(is_staff=True, is_superuser=True)
+        self.client.force_login(User.objects.get(username='alice'))
+        roster = Roster.objects.create(name='Autumn intake', file=ContentFile(self.roster, 'autumn.csv'))
+        url = reverse('admin:dashboard_roster_changelist')
+
+        self.client.post(url, {'action': 'provision', '_selected_action': [roster.pk]})
+        self.assertEqual(Roster.objects.get(pk=roster.pk).status, 'queued')
+        self.assertEqual(Job.objects.get(task='accounts.provision').args, [roster.pk])
+        jobs.run_worker(workers=1, burst=True)
+        roster.refresh_from_db()
+        self.assertEqual((roster.status, roster.created_count, roster.error_count), ('finished', 2, 4))
+        path = provisioning.credentials_path(roster)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+        response = self.client.post(url, {'action': 'download_credentials', '_selected_action': [roster.pk]})
+        self.assertIn('attachment', response['Content-Disposition'])
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines[0], 'username,password,first_name,last_name,email')
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ['ada', 'grace'])
+        self.assertTrue(User.objects.get(username='grace').check_password(lines[2].split(',')[1]))
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNotNone(Roster.objects.get(pk=roster.pk).credentials_taken_at)
+
+        # Handed out once, and only to superusers
+        response = self.client.post(url, {'action': 'download_credentials', '_selected_action': [roster.pk]},
+                                    follow=True)
+        self.assertContains(response, 'handed out only once')
+        User.objects.filter(username='alice').update(is_superuser=False)
+        User.objects.get(username='alice').user_permissions.add(*Permission.objects.filter(codename__endswith='_roster'))
+        self.assertNotContains(self.client.get(url), 'download_credentials')
+
+    def test_credentials_never_taken_are_purged(self):
+        os.makedirs(self.credentials_dir)
+        roster = Roster.objects.create(name='Spring intake')
+        with provisioning.open_credentials(provisioning.credentials_path(roster)) as f:
+            f.write('ada,secret,,,\n')
+        provisioning.purge_credentials()
+        self.assertIsNotNone(provisioning.take_credentials(Roster.objects.filter(pk=roster.pk)))
+
+        with provisioning.open_credentials(provisioning.credentials_path(roster)) as f:
+            f.write('grace,secret,,,\n')
+        with override_settings(PORTAL_CREDENTIALS_MAX_AGE=-1), self.assertLogs('dashboard.provisioning', 'WARNING'):
+            provisioning.purge_credentials()
+        self.assertIsNone(provisioning.take_credentials(Roster.objects.filter(pk=roster.pk)))
+
+
+class GenerateDatasetTests(TestCase):
+    def generate(self, **options):
+        call_command('generate_dataset', students=12, seed=3, stdout=StringIO(), **options)
+        return {
+            'users': list(User.objects.filter(username__startswith='stu').order_by('username')
+                          .values_list('username', 'first_name', 'last_name')),
+            'grades': sorted(Grade.objects.values_list('student__username', 'course__code', 'grade')),
+            'transactions': sorted(Transaction.objects.values_list('student__username', 'amount', 'date', 'is_credit')),
+        }
+
+    def test_same_seed_rebuilds_the_same_consistent_dataset(self):
+        first = self.generate()
+        self.assertEqual(len(first['users']), 12)
+        self.assertEqual(Profile.objects.filter(user__username__startswith='stu').count(), 12)
+        self.assertEqual(ledger.check(), [])
+        self.assertEqual(stats.snapshot().total_enrollments, Enrollment.objects.count())
+        self.client.login(username='stu000001', password='password123')
+        self.assertEqual(self.client.get(reverse('dashboard:portal_page', args=['finance'])).status_code, 200)
+
+        self.assertEqual(self.generate(reset=True), first)
+
+    def test_reset_removes_the_students_documents(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.generate()
+        document = documents.request_document('transcript', User.objects.get(username='stu000001'))
+        document.path = default_storage.save('documents/transcript.pdf', ContentFile(b'%PDF-1.7'))
+        document.save()
+
+        self.generate(reset=True)
+        self.assertFalse(GeneratedDocument.objects.exists())
+        self.assertFalse(default_storage.exists(document.path))
+
+    def test_refuses_to_mix_with_existing_data(self):
+        Course.objects.create(code='CSC101', name='Programming')
+        with self.assertRaises(CommandError):
+            self.generate()
+
+    def test_reset_keeps_other_students_records(self):
+        self.generate()
+        Enrollment.objects.create(student=make_student('alice'), course=Course.objects.first())
+        with self.assertRaises(CommandError):
+            self.generate(reset=True)
+        self.assertEqual(Enrollment.objects.filter(student__username='alice').count(), 1)
+        self.assertTrue(User.objects.filter(username__startswith='stu').exists())
+
+    def test_enrollments_and_library_keep_their_generated_dates(self):
+        self.generate()
+        self.assertGreater(Enrollment.objects.values('date_enrolled').distinct().count(), 2)
+        self.assertGreater(max(len(terms) for terms in StudentGPA.objects.values_list('terms', flat=True)), 1)
+        self.assertLess(LibraryItem.objects.order_by('date_added').first().date_added, timezone.localdate())
+        self.assertTrue(LibraryItem._meta.get_field('date_added').auto_now_add)
+
+
+class BenchmarkTests(TransactionTestCase):
+    def setUp(self):
+        for key, label in PortalPage.PAGE_CHOICES:
+            PortalPage.objects.create(page_key=key, heading=label)
+        self.students = [make_student(f'stu00000{i}') for i in range(1, 3)]
+
+    def test_discovers_each_page_once_and_skips_logout(self):
+        routes = {route.name: route for route in benchmark.discover_routes()}
+        self.assertIn('portal_page[finance]', routes)
+        self.assertNotIn('portal_finance', routes)  # Same path as portal_page[finance]
+        self.assertNotIn('logout', routes)
+        self.assertTrue(routes['admin_dashboard'].staff)
+
+    def test_run_reports_latency_and_queries(self):
+        routes = [route for route in benchmark.discover_routes() if route.name == 'portal_page[grades]']
+        results = benchmark.run(routes, self.students, requests_per_route=6, concurrency=2)
+        grades = results['routes']['portal_page[grades]']
+        self.assertEqual((grades['requests'], grades['errors']), (6, 0))
+        self.assertLessEqual(grades['p50_ms'], grades['p99_ms'])
+        self.assertGreater(grades['queries_mean'], 0)
+        json.dumps(results)
+
+    def test_logins_are_counted_with_their_writes(self):
+        # One at a time: the in-memory test database fails concurrent writers rather than waiting
+        results = benchmark.run_logins(self.students, 'password123', logins=4, concurrency=1)
+        login = results['routes']['login']
+        self.assertEqual((login['requests'], login['errors']), (4, 0))
+        self.assertEqual(login['writes_mean'], 3)  # Session insert and update, last_login
+        self.assertEqual(benchmark.run_logins(self.students, 'wrong', logins=1, concurrency=1)['routes']['login']['errors'], 1)
+
+    def test_compare_flags_slower_or_chattier_routes(self):
+        baseline = {'routes': {'home': {'p95_ms': 10.0, 'queries_mean': 3, 'errors': 0}}}
+        same = {'routes': {'home': {'p95_ms': 11.0, 'queries_mean': 3, 'errors': 0}}}
+        worse = {'routes': {'home': {'p95_ms': 20.0, 'queries_mean': 4, 'errors': 1}}}
+        self.assertEqual(benchmark.compare(same, baseline), [])
+        self.assertEqual(len(benchmark.compare(worse, baseline)), 3)
+
+    def test_command_fails_on_regression(self):
+        directory = tempfile.mkdtemp()
+        baseline = os.path.join(directory, 'baseline.json')
+        with open(baseline, 'w') as f:
+            json.dump({'routes': {'home': {'p95_ms': 0.0, 'queries_mean': 0, 'errors': 0}}}, f)
+        with self.assertRaises(CommandError):
+            call_command('benchmark', route=['home'], requests=2, concurrency=1, compare=baseline,
+                         output=os.path.join(directory, 'run.json'), stdout=StringIO(), stderr=StringIO())
+        with open(os.path.join(directory, 'run.json')) as f:
+            self.assertIn('home', json.load(f)['routes'])
+
+
+@override_settings(PORTAL_QUERY_INSTRUMENTATION=True, PORTAL_QUERY_SAMPLE_RATE=1)
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        instrumentation.report.clear()
+        response_cache.responses.clear()
+        PortalPage.objects.create(page_key='events', heading='Events')
+        self.student = make_student('student')
+        self.staff = make_student('staff')
+        User.objects.filter(pk=self.staff.pk).update(is_staff=True)
+        self.url = reverse('dashboard:portal_page', args=['events'])
+
+    def test_staff_responses_carry_query_headers(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url)
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+        self.assertEqual(response['X-DB-Budget'], str(QUERY_BUDGETS['events']))
+        self.assertIn('X-DB-Time-ms', response)
+
+        self.client.force_login(self.student)
+        self.assertNotIn('X-DB-Queries', self.client.get(self.url))
+
+    def test_report_groups_requests_by_view(self):
+        self.client.force_login(self.student)
+        self.client.get(self.url)
+        self.client.get(self.url)
+        view = next(v for v in instrumentation.report.summary() if v['view'] == 'dashboard:portal_page[events]')
+        self.assertEqual(view['requests'], 2)
+        self.assertEqual(view['budget'], QUERY_BUDGETS['events'])
+        self.assertEqual(view['over_budget'], 0)
+
+        self.client.force_login(self.staff)
+        self.assertContains(self.client.get(reverse('dashboard:query_report')), 'dashboard:portal_page[events]')
+
+    def test_budget_overrun_is_logged_or_raised(self):
+        self.client.force_login(self.student)
+        with mock.patch.dict(QUERY_BUDGETS, {'events': 1}):
+            with self.assertLogs('dashboard.queries', 'WARNING') as logs:
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+            self.assertIn('over its budget of 1', logs.output[0])
+
+            response_cache.responses.clear()
+            with override_settings(PORTAL_QUERY_BUDGET_MODE='raise'):
+                with self.assertRaises(instrumentation.QueryBudgetExceeded):
+                    self.client.get(self.url)
+
+    def test_repeated_queries_are_traced_to_the_template_line(self):
+        for i in range(6):
+            course = Course.objects.create(code=f'CSC{i}', name=f'Course {i}')
+            Enrollment.objects.create(student=self.student, course=course)
+        template = Template('<ul>\n{% for e in enrollments %}\n<li>{{ e.course.name }}</li>\n{% endfor %}\n</ul>')
+        inspector = instrumentation.QueryInspector()
+        with connection.execute_wrapper(inspector):
+            template.render(Context({'enrollments': Enrollment.objects.filter(student=self.student)}))
+
+        repeated = inspector.repeated(threshold=5)
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0]['count'], 6)
+        self.assertTrue(repeated[0]['origin'].endswith(':3'), repeated[0]['origin'])
+        self.assertIn('"dashboard_course"', repeated[0]['sql'])
+        self.assertNotIn('CSC', repeated[0]['sql'])
+
+    def test_off_or_unsampled_requests_are_not_inspected(self):
+        self.client.force_login(self.staff)
+        for options in ({'PORTAL_QUERY_INSTRUMENTATION': False}, {'PORTAL_QUERY_SAMPLE_RATE': 0}):
+            with self.subTest(**options), override_settings(**options):
+                self.assertNotIn('X-DB-Queries', self.client.get(self.url))
+        self.assertEqual(instrumentation.report.summary(), [])
+
+    def test_in_lists_collapse_to_one_shape(self):
+        self.assertEqual(
+            instrumentation.sql_shape('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+            instrumentation.sql_shape('SELECT * FROM t WHERE id IN (%s)  LIMIT 21'),
+        )
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        profiling.settings_cache.invalidate()
+        response_cache.responses.clear()
+        PortalPage.objects.create(page_key='events', heading='Events')
+        self.student = make_student('student')
+        self.client.force_login(self.student)
+
+    def start(self, **options):
+        return ProfilingSession.objects.create(**{'sample_rate': 1, **options})
+
+    def test_costs_no_queries_while_off(self):
+        middleware = profiling.ProfilerMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get('/')
+        middleware(request)
+        with self.assertNumQueries(0):
+            middleware(request)
+
+    def test_cprofile_captures_matching_route_only(self):
+        session = self.start(mode='cprofile', route='/portal/<page_key>/')
+        self.client.get(reverse('dashboard:portal_page', args=['events']))
+        self.client.get(reverse('dashboard:help_page'))
+
+        capture = ProfileCapture.objects.get(session=session)
+        self.assertEqual(capture.path, reverse('dashboard:portal_page', args=['events']))
+        stats = marshal.loads(profiling.merged_stats(session))
+        self.assertTrue(any(name == 'portal_page' for _, _, name in stats))
+        pstats.Stats(profiling._Stats(stats))  # Loads as a regular pstats file
+
+    def test_session_stops_after_max_captures(self):
+        session = self.start(mode='cprofile', max_captures=1)
+        for _ in range(2):
+            self.client.get(reverse('dashboard:portal_page', args=['events']))
+        session.refresh_from_db()
+        self.assertFalse(session.active)
+        self.assertEqual(session.captures.count(), 1)
+        self.assertIsNone(profiling.active_session())
+
+    def test_request_is_served_unprofiled_when_another_profiler_is_active(self):
+        session = self.start(mode='cprofile')
+        with mock.patch('dashboard.profiling.cProfile.Profile') as profile:
+            profile.return_value.enable.side_effect = ValueError("Another profiling tool is already active")
+            response = self.client.get(reverse('dashboard:portal_page', args=['events']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.captures.count(), 0)
+
+    def test_sampler_collects_collapsed_stacks(self):
+        def slow_function():
+            time.sleep(0.05)
+
+        sampler = profiling.Sampler(threading.get_ident(), 0.002)
+        sampler.start()
+        slow_function()
+        stacks = sampler.stop()
+        self.assertTrue(any(stack.endswith('slow_function') for stack in stacks))
+        self.assertEqual(profiling.parse_stacks(profiling.format_stacks(stacks)), stacks)
+
+    def test_admin_downloads_merged_stacks(self):
+        User.objects.filter(pk=self.student.pk).update(is_staff=True, is_superuser=True)
+        session = self.start(mode='sample', active=False)
+        for stacks in ('a;b 2\na;c 1\n', 'a;b 3\n'):
+            ProfileCapture.objects.create(session=session, path='/', duration_ms=10, stacks=stacks)
+        response = self.client.post(reverse('admin:dashboard_profilingsession_changelist'), {
+            'action': 'download_profile', '_selected_action': [session.pk],
+        })
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(response.content.decode(), 'a;b 5\na;c 1\n')
+
+
+class GradeAnalyticsTests(TestCase):
+    def setUp(self):
+        self.student = make_student('student')
+        self.other = make_student('other')
+        self.programming = Course.objects.create(code='CSC101', name='Programming', credit_units=4)
+        self.writing = Course.objects.create(code='ENG101', name='Writing', credit_units=2)
+
+    def gpa(self, student):
+        return StudentGPA.objects.get(student=student)
+
+    def test_cgpa_is_weighted_by_credit_units(self):
+        Grade.objects.create(student=self.student, course=self.programming, grade='A')
+        Grade.objects.create(student=self.student, course=self.writing, grade='C')
+        Grade.objects.create(student=self.student, course=Course.objects.create(code='X', name='X'), grade='I')
+        gpa = self.gpa(self.student)
+        self.assertAlmostEqual(gpa.cgpa, (4.0 * 4 + 2.0 * 2) / 6)
+        self.assertEqual(gpa.credit_units, 6)
+
+    def test_term_gpas_follow_enrollment_dates(self):
+        for course, day in ((self.programming, '2025-10-01'), (self.writing, '2026-03-01')):
+            Enrollment.objects.create(student=self.student, course=course)
+            Enrollment.objects.filter(course=course).update(date_enrolled=day)
+        Grade.objects.create(student=self.student, course=self.programming, grade='B')
+        Grade.objects.create(student=self.student, course=self.writing, grade='A')
+        self.assertEqual(self.gpa(self.student).terms, [
+            {'term': '2025/2026 First Semester', 'gpa': 3.0, 'credit_units': 4},
+            {'term': '2025/2026 Second Semester', 'gpa': 4.0, 'credit_units': 2},
+        ])
+
+    def test_term_gpas_follow_moved_and_deleted_enrollments(self):
+        enrollment = Enrollment.objects.create(student=self.student, course=self.programming)
+        Grade.objects.create(student=self.student, course=self.programming, grade='B')
+        Grade.objects.create(student=self.other, course=self.programming, grade='A')
+        self.assertEqual(len(self.gpa(self.student).terms), 1)
+
+        enrollment.student = self.other
+        enrollment.save()
+        self.assertEqual((self.gpa(self.student).terms, len(self.gpa(self.other).terms)), ([], 1))
+
+        enrollment.delete()
+        self.assertEqual(self.gpa(self.other).terms, [])
+        self.assertEqual(self.gpa(self.other).cgpa, 4.0)  # Still counted, outside any term
+
+    def test_changes_are_applied_incrementally(self):
+        grade = Grade.objects.create(student=self.student, course=self.programming, grade='B')
+        Grade.objects.create(student=self.student, course=self.writing, grade='A')
+        grade.grade = 'F'
+        grade.save()
+        self.assertAlmostEqual(self.gpa(self.student).cgpa, (0 * 4 + 4.0 * 2) / 6)
+
+        self.writing.credit_units = 4
+        self.writing.save()
+        self.assertAlmostEqual(self.gpa(self.student).cgpa, 2.0)
+
+        grade.student = self.other
+        grade.save()
+        self.assertEqual(self.gpa(self.student).cgpa, 4.0)
+        self.assertEqual(self.gpa(self.other).cgpa, 0.0)
+
+        grade.delete()
+        self.assertFalse(StudentGPA.objects.filter(student=self.other).exists())
+        self.assertFalse(CourseGradeSummary.objects.filter(course=self.programming).exists())
+
+    def test_course_summary_matches_numpy(self):
+        letters = ['A', 'A', 'B+', 'C', 'F', 'B-', 'I']
+        for i, letter in enumerate(letters):
+            Grade.objects.create(student=make_student(f's{i}'), course=self.programming, grade=letter)
+        summary = CourseGradeSummary.objects.get(course=self.programming)
+        points = [analytics.GRADE_POINTS[letter] for letter in letters if letter != 'I']
+        self.assertEqual(summary.graded_count, 6)
+        self.assertAlmostEqual(summary.mean_points, np.mean(points))
+        self.assertAlmostEqual(summary.median_points, np.percentile(points, 50))
+        self.assertAlmostEqual(summary.p90_points, np.percentile(points, 90))
+        self.assertEqual(summary.distribution, {'A': 2, 'B+': 1, 'B-': 1, 'C': 1, 'F': 1, 'I': 1})
+
+    def test_grouped_percentile_matches_numpy(self):
+        rng = np.random.default_rng(1)
+        groups = [np.sort(rng.random(n)) for n in (1, 2, 7, 50)]
+        counts = np.array([len(group) for group in groups])
+        starts = np.cumsum(counts) - counts
+        for p in analytics.PERCENTILES:
+            np.testing.assert_allclose(
+                analytics.grouped_percentile(np.concatenate(groups), starts, counts, p),
+                [np.percentile(group, p) for group in groups],
+            )
+
+    def test_rebuild_matches_incremental_results(self):
+        Grade.objects.create(student=self.student, course=self.programming, grade='A-')
+        Grade.objects.create(student=self.other, course=self.programming, grade='b+')
+        Grade.objects.create(student=self.other, course=self.writing, grade='D')
+        incremental = list(StudentGPA.objects.order_by('student').values_list('student', 'cgpa', 'credit_units'))
+        StudentGPA.objects.all().delete()
+        self.assertEqual(analytics.rebuild(), (2, 2))
+        self.assertEqual(list(StudentGPA.objects.order_by('student').values_list('student', 'cgpa', 'credit_units')),
+                         incremental)
+
+    def test_grade_report_command(self):
+        Grade.objects.create(student=self.student, course=self.programming, grade='A')
+        out = StringIO()
+        call_command('grade_report', stdout=out, stderr=StringIO())
+        self.assertIn('CSC101,Programming,4,1,4.00', out.getvalue())
+        out = StringIO()
+        call_command('grade_report', by='student', stdout=out, stderr=StringIO())
+        self.assertIn('student,4.00,4', out.getvalue())
+
+
+class DocumentTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.student = make_student('student')
+        User.objects.filter(pk=self.student.pk).update(first_name='Ada', last_name='Obi')
+        self.student.refresh_from_db()
+        self.other = make_student('other')
+        self.course = Course.objects.create(code='CSC101', name='Programming', credit_units=4)
+
+    def digest(self, kind, student):
+        return documents.content_hash(kind, student, documents.document_content(kind, student))
+
+    def test_hash_changes_only_with_the_students_own_rows(self):
+        before = self.digest('transcript', self.student)
+        Grade.objects.create(student=self.other, course=self.course, grade='A')
+        Transaction.objects.create(student=self.student, amount=100, description='Fee')
+        self.assertEqual(self.digest('transcript', self.student), before)
+
+        Grade.objects.create(student=self.student, course=self.course, grade='B')
+        self.assertNotEqual(self.digest('transcript', self.student), before)
+        self.assertNotEqual(self.digest('transcript', self.other), self.digest('transcript', self.student))
+
+    def test_transcript_hash_follows_the_term_gpas(self):
+        Grade.objects.create(student=self.student, course=self.course, grade='B')
+        enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        before = self.digest('transcript', self.student)
+        enrollment.date_enrolled = enrollment.date_enrolled - datetime.timedelta(days=200)  # An earlier term
+        enrollment.save()
+        self.assertNotEqual(self.digest('transcript', self.student), before)
+
+    def test_html_shows_the_rows(self):
+        Grade.objects.create(student=self.student, course=self.course, grade='B')
+        html = documents.render_html('transcript', self.student,
+                                     documents.document_content('transcript', self.student))
+        self.assertIn('Ada Obi', html)
+        self.assertIn('CSC101', html)
+        self.assertIn('3.00', html)  # The CGPA
+
+        Transaction.objects.create(student=self.student, amount=300, description='Tuition Fee')
+        Transaction.objects.create(student=self.student, amount=120, description='Payment', is_credit=True)
+        html = documents.render_html('fee_statement', self.student,
+                                     documents.document_content('fee_statement', self.student))
+        self.assertIn('Tuition Fee', html)
+        self.assertIn('180.00', html)  # The running balance
+
+    @mock.patch.object(documents, 'render_pdf', return_value=b'%PDF-1.7 fake')
+    def test_build_renders_only_when_the_rows_change(self, render_pdf):
+        self.assertEqual(documents.build('transcript', self.student.pk), 'rendered')
+        first = GeneratedDocument.objects.get(student=self.student)
+        self.assertEqual(first.status, 'ready')
+        self.assertEqual(first.size, len(b'%PDF-1.7 fake'))
+        self.assertEqual(documents.build('transcript', self.student.pk), 'unchanged')
+        self.assertEqual(render_pdf.call_count, 1)
+
+        Grade.objects.create(student=self.student, course=self.course, grade='A')
+        self.assertEqual(documents.build('transcript', self.student.pk), 'rendered')
+        self.assertEqual(render_pdf.call_count, 2)
+        self.assertFalse(default_storage.exists(first.path))
+        self.assertTrue(default_storage.exists(GeneratedDocument.objects.get(student=self.student).path))
+
+    def test_failed_render_is_recorded(self):
+        with mock.patch.object(documents, 'render_pdf', side_effect=RuntimeError('no fonts')), \
+                self.assertLogs('dashboard.documents', 'ERROR'):
+            self.assertEqual(documents.build('fee_statement', self.student.pk), 'failed')
+        document = GeneratedDocument.objects.get(student=self.student)
+        self.assertEqual(document.status, 'failed')
+        self.assertIn('no fonts', document.failure)
+
+    def test_view_queues_a_render_then_serves_the_file(self):
+        self.client.force_login(self.student)
+        url = reverse('dashboard:document', kwargs={'kind': 'transcript'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Refresh'], '3')
+        job = Job.objects.get(task='documents.build')
+        self.assertEqual((job.task, job.args), ('documents.build', ['transcript', self.student.pk]))
+        self.assertEqual(GeneratedDocument.objects.get(student=self.student).status, 'pending')
+
+        # Asking again while it renders queues nothing more
+        self.client.get(url)
+        self.assertEqual(Job.objects.filter(task='documents.build').count(), 1)
+
+        with mock.patch.object(documents, 'render_pdf', return_value=b'%PDF-1.7 fake'):
+            jobs.run_worker(workers=1, burst=True)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'succeeded')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.7 fake')
+        self.assertIn('attachment', response['Content-Disposition'])
+
+        self.assertEqual(self.client.get(reverse('dashboard:document', kwargs={'kind': 'diploma'})).status_code, 404)
+
+    def test_failed_render_is_retried_on_request(self):
+        GeneratedDocument.objects.create(student=self.student, kind='transcript', status='failed',
+                                         content_hash=self.digest('transcript', self.student),
+                                         requested_at=datetime.datetime.now(datetime.timezone.utc))
+        self.client.force_login(self.student)
+        url = reverse('dashboard:document', kwargs={'kind': 'transcript'})
+        self.assertContains(self.client.get(url), 'Try again', status_code=202)
+        self.assertFalse(Job.objects.filter(task='documents.build').exists())
+        self.assertRedirects(self.client.post(url), url, target_status_code=202)
+        self.assertEqual(Job.objects.get(task='documents.build').args, ['transcript', self.student.pk])
+
+    @mock.patch.object(documents, 'render_pdf', return_value=b'%PDF-1.7 fake')
+    def test_generate_documents_records_the_batch(self, render_pdf):
+        out = StringIO()
+        call_command('generate_documents', 'transcript', '--workers', '1', '--chunk-size', '1', stdout=out)
+        call_command('generate_documents', 'transcript', '--workers', '1', stdout=out)
+        second, first = DocumentBatch.objects.all()
+        self.assertEqual((first.status, first.total, first.rendered, first.unchanged), ('finished', 2, 2, 0))
+        self.assertEqual((second.rendered, second.unchanged), (0, 2))
+        self.assertIn('0 rendered, 2 unchanged, 0 failed of 2', out.getvalue())
+
+    @unittest.skipUnless(weasyprint, "WeasyPrint and its system libraries are not installed")
+    def test_renders_a_real_pdf(self):
+        Grade.objects.create(student=self.student, course=self.course, grade='A')
+        self.assertEqual(documents.build('transcript', self.student.pk), 'rendered')
+        with default_storage.open(GeneratedDocument.objects.get(student=self.student).path) as pdf:
+            self.assertTrue(pdf.read().startswith(b'%PDF'))
+
+
+calls = []
+
+
+def record_call(*args, **kwargs):
+    calls.append((args, kwargs))
+
+
+def fail_call(*args):
+    raise ValueError('flaky')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        # Periodic tasks left out, so workers here only run what a test queues
+        self.enterContext(mock.patch.dict(
+            jobs.registry, {name: t for name, t in jobs.registry.items() if not t.every}, clear=True))
+        jobs.register('test.record', record_call)
+        jobs.register('test.fail', fail_call, max_attempts=2)
+
+    def run_jobs(self):
+        return jobs.run_worker(workers=1, burst=True)
+
+    def test_jobs_run_by_priority_then_due_time(self):
+        jobs.enqueue('test.record', 'late', delay=datetime.timedelta(hours=1))
+        jobs.enqueue('test.record', 'second', run_at=timezone.now() - datetime.timedelta(minutes=1))
+        jobs.enqueue('test.record', 'third')
+        jobs.enqueue('test.record', 'first', priority=5, key='value')
+        self.assertEqual(self.run_jobs(), 3)
+        self.assertEqual(calls, [(('first',), {'key': 'value'}), (('second',), {}), (('third',), {})])
+        self.assertEqual(Job.objects.filter(status='queued').get().args, ['late'])
+
+    def test_dedupe_key_allows_one_queued_job(self):
+        first = jobs.enqueue('test.record', 1, dedupe_key='k', delay=datetime.timedelta(hours=1))
+        second = jobs.enqueue('test.record', 1, dedupe_key='k', priority=3)
+        self.assertEqual(first.pk, second.pk)
+        job = Job.objects.get()
+        self.assertEqual(job.priority, 3)
+        self.assertLessEqual(job.run_at, timezone.now())  # Moved up to the sooner request
+        self.run_jobs()
+        self.assertNotEqual(jobs.enqueue('test.record', 1, dedupe_key='k').pk, first.pk)
+
+    def test_failures_are_retried_with_backoff_then_left_failed(self):
+        job = jobs.enqueue('test.fail')
+        with self.assertLogs('dashboard.jobs', 'ERROR'):
+            self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('ValueError: flaky', job.error_summary)
+        self.assertGreater(job.run_at, timezone.now() + datetime.timedelta(seconds=8))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('dashboard.jobs', 'ERROR'):
+            self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_jobs_of_a_lost_worker_are_retried(self):
+        job = jobs.enqueue('test.record')
+        jobs.claim(1, 'gone:1')
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - datetime.timedelta(hours=1))
+        with self.assertLogs('dashboard.jobs', 'WARNING'):
+            self.assertEqual(jobs.recover_lost(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertIn('gone:1', job.last_error)
+
+    def test_periodic_tasks_schedule_their_next_run(self):
+        jobs.register('test.periodic', record_call, every=datetime.timedelta(hours=1))
+        self.assertEqual(self.run_jobs(), 1)
+        upcoming = Job.objects.get(task='test.periodic', status='queued')
+        self.assertAlmostEqual(upcoming.run_at.timestamp(), (timezone.now() + datetime.timedelta(hours=1)).timestamp(),
+                               delta=60)
+        jobs.schedule_periodic()
+        self.assertEqual(Job.objects.filter(task='test.periodic', status='queued').count(), 1)
+
+    def test_queue_page_shows_depth_and_runs_manual_tasks(self):
+        jobs.register('test.manual', record_call, manual=True)
+        jobs.enqueue('test.record')
+        jobs.enqueue('test.record')
+        staff = make_student('staff')
+        User.objects.filter(pk=staff.pk).update(is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('dashboard:job_queue')
+        response = self.client.get(url)
+        depth = {row['task']: row['due'] for row in response.context['tasks']}
+        self.assertEqual(depth['test.record'], 2)
+        self.assertContains(response, 'Run test.manual')
+
+        self.client.post(url, {'task': 'test.manual'})
+        self.client.post(url, {'task': 'test.manual'})
+        self.client.post(url, {'task': 'test.record'})  # Not offered on the page
+        self.assertEqual(Job.objects.filter(task='test.manual').count(), 1)
+        self.assertEqual(Job.objects.filter(task='test.record').count(), 2)
+
+
+class JobWorkerPoolTests(TransactionTestCase):
+    def test_thread_pool_runs_every_job_once(self):
+        calls.clear()
+        with mock.patch.dict(jobs.registry, clear=True):
+            jobs.register('test.record', record_call)
+            for i in range(20):
+                jobs.enqueue('test.record', i)
+            self.assertEqual(jobs.run_worker(workers=4, burst=True, poll_interval=0.01), 20)
+        self.assertEqual(sorted(args[0] for args, _ in calls), list(range(20)))
+        self.assertEqual(Job.objects.filter(status='succeeded').count(), 20)
+
+
+def image_bytes(size, image_format='JPEG', mode='RGB', **options):
+    buffer = BytesIO()
+    Image.new(mode, size, 'red').save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.profile = make_student('student').profile
+
+    def upload(self, name, content):
+        self.profile.profile_picture.save(name, ContentFile(content))
+        jobs.run_worker(workers=1, burst=True)
+        self.profile.refresh_from_db()
+        return self.profile.profile_picture_variants
+
+    def test_variants_are_resized_and_stripped_of_metadata(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        variants = self.upload('ada.jpg', image_bytes((600, 400), exif=exif.tobytes()))
+        self.assertEqual(variants['source'], self.profile.profile_picture.name)
+        self.assertEqual([width for width, _ in variants['thumb']['files']['webp']], [64, 128])
+        self.assertEqual([width for width, _ in variants['card']['files']['jpeg']], [160, 320])
+
+        with default_storage.open(variants['card']['files']['webp'][-1][1]) as stored:
+            card = Image.open(stored)
+            self.assertEqual((card.format, card.size), ('WEBP', (320, 320)))
+        with default_storage.open(variants['thumb']['files']['jpeg'][0][1]) as stored:
+            thumb = Image.open(stored)
+            self.assertEqual((thumb.format, thumb.size), ('JPEG', (64, 64)))
+            self.assertEqual(dict(thumb.getexif()), {})
+
+    def test_small_images_are_not_enlarged(self):
+        self.assertEqual(images.output_sizes(images.VARIANTS['thumb'], 100, 50), [(50, 50)])
+        self.assertEqual(images.output_sizes(images.VARIANTS['hero'], 800, 400), [(640, 320), (800, 400)])
+        variants = self.upload('tiny.png', image_bytes((40, 40), 'PNG', mode='RGBA'))
+        self.assertEqual(variants['card']['files']['jpeg'], [[40, variants['card']['files']['jpeg'][0][1]]])
+
+    def test_picture_tag_falls_back_to_the_original_until_built(self):
+        template = Template("{% load images %}{% picture profile.profile_picture 'card' alt='Ada' class='round' %}")
+        self.profile.profile_picture = 'profile_pics/elsewhere.jpg'
+        html = template.render(Context({'profile': self.profile}))
+        self.assertInHTML('<img src="/media/profile_pics/elsewhere.jpg" alt="Ada" class="round" loading="lazy">', html)
+
+        self.upload('ada.jpg', image_bytes((600, 400)))
+        html = template.render(Context({'profile': self.profile}))
+        self.assertIn('<picture><source type="image/webp" srcset="/media/profile_pics/ada.card-160.webp 160w, '
+                      '/media/profile_pics/ada.card-320.webp 320w" sizes="160px">', html)
+        self.assertIn('srcset="/media/profile_pics/ada.card-160.jpg 160w, /media/profile_pics/ada.card-320.jpg 320w"',
+                      html)
+        for attribute in ('width="320"', 'height="320"', 'alt="Ada"', 'loading="lazy"', 'class="round"'):
+            self.assertIn(attribute, html)
+
+    def test_replacing_a_picture_removes_the_old_variants(self):
+        old = self.upload('ada.jpg', image_bytes((600, 400)))
+        new = self.upload('grace.jpg', image_bytes((600, 400)))
+        self.assertEqual(new['source'], 'profile_pics/grace.jpg')
+        old_path = old['thumb']['files']['webp'][0][1]
+        self.assertFalse(default_storage.exists(old_path))
+        self.assertTrue(default_storage.exists(new['thumb']['files']['webp'][0][1]))
+
+    def test_default_picture_queues_no_build(self):
+        self.assertFalse(Job.objects.filter(task='images.build').exists())
+        self.assertFalse(images.needs_build(self.profile, 'profile_picture'))
+        self.upload('ada.jpg', image_bytes((600, 400)))
+        self.profile.profile_picture = images.Profile._meta.get_field('profile_picture').default
+        self.profile.save()
+        jobs.run_worker(workers=1, burst=True)  # Back to the default: the upload's variants go
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.profile_picture_variants, {})
+        self.assertEqual(default_storage.listdir('profile_pics')[1], ['ada.jpg'])
+
+    def test_missing_source_is_recorded_once(self):
+        self.profile.profile_picture = 'profile_pics/gone.jpg'
+        self.profile.save()
+        with self.assertLogs('dashboard.images', 'WARNING'):
+            jobs.run_worker(workers=1, burst=True)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.profile_picture_variants, {'source': 'profile_pics/gone.jpg'})
+        self.profile.phone = '555'
+        self.profile.save()
+        self.assertFalse(Job.objects.filter(task='images.build', status='queued').exists())
+
+
+
+class LibraryDownloadTests(TestCase):
+    pdf = b'%PDF-1.7 ' + bytes(range(256)) * 4
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name, PORTAL_SENDFILE=''))
+        self.item = LibraryItem.objects.create(title='Linear Algebra', pdf_file=ContentFile(self.pdf, 'algebra.pdf'))
+        self.url = reverse('dashboard:library_pdf', kwargs={'pk': self.item.pk})
+        self.client.force_login(make_student('reader'))
+
+    def test_identical_uploads_share_one_stored_file(self):
+        copy = LibraryItem.objects.create(title='Algebra again', pdf_file=ContentFile(self.pdf, 'copy.pdf'))
+        other = LibraryItem.objects.create(title='Calculus', pdf_file=ContentFile(b'%PDF-1.7 other', 'calc.pdf'))
+        self.assertEqual((self.item.pdf_size, len(self.item.pdf_sha256)), (len(self.pdf), 64))
+        self.assertEqual(copy.pdf_file.name, self.item.pdf_file.name)
+        self.assertNotEqual(other.pdf_sha256, self.item.pdf_sha256)
+        self.assertEqual(sorted(default_storage.listdir('library_pdfs')[1]), ['algebra.pdf', 'calc.pdf'])
+
+    def test_downloads_whole_partial_and_conditional(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.pdf)
+        etag = response['ETag']
+        self.assertEqual(etag, f'"{self.item.pdf_sha256}"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Disposition'], 'inline; filename="linear-algebra.pdf"')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.pdf[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.pdf)}')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.pdf[-5:])
+        # Resuming after the file changed starts over
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.pdf)}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{len(self.pdf)}'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_library_tab_links_to_the_download(self):
+        PortalPage.objects.create(page_key='library', heading='Library')
+        LibraryItem.objects.create(title='No file')
+        response = self.client.get(reverse('dashboard:portal_page', args=['library']))
+        self.assertContains(response, f'href="{self.url}"', count=1)
+
+    def test_front_end_server_sends_the_file_when_configured(self):
+        with override_settings(PORTAL_SENDFILE='x-accel-redirect'):
+            response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/library_pdfs/algebra.pdf')
+        self.assertEqual(response.content, b'')
+
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        self.item.pdf_file = None
+        self.item.save()
+        self.client.force_login(User.objects.get(username='reader'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class StaticAssetTests(TestCase):
+    css = b'body { background: url("../img/dot.png"); }\n' + b'.unused { color: #123456; }\n' * 40
+
+    def setUp(self):
+        source, root = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        self.addCleanup(root.cleanup)
+        for name, data in [('css/site.css', self.css), ('img/dot.png', b'\x89PNG dot'),
+                           ('css/vendor.min.css', b'a{}\n/*# sourceMappingURL=vendor.min.css.map */')]:
+            os.makedirs(os.path.join(source.name, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(source.name, name), 'wb') as f:
+                f.write(data)
+        self.root = root.name
+        self.enterContext(override_settings(
+            STATIC_ROOT=root.name, STATICFILES_DIRS=[source.name], PORTAL_SERVE_STATIC=True, PORTAL_STATIC_MAX_AGE=60,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        ))
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(root.name, 'staticfiles.json')) as f:
+            self.hashed = json.load(f)['paths']
+
+    def test_collectstatic_writes_hashed_names_and_compressed_copies(self):
+        site = self.hashed['css/site.css']
+        self.assertRegex(site, r'^css/site\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.root, site), 'rb') as f:
+            self.assertIn(self.hashed['img/dot.png'].encode(), f.read())
+        for extension in ('.br', '.gz'):
+            self.assertTrue(os.path.exists(os.path.join(self.root, site + extension)))
+        # Too small to be worth it; the missing source map is left alone
+        self.assertFalse(os.path.exists(os.path.join(self.root, self.hashed['css/vendor.min.css'] + '.br')))
+        self.assertIn(self.hashed['css/vendor.min.css'], Template('{% load static %}{% static "css/vendor.min.css" %}')
+                      .render(Context()))
+
+    def test_serves_negotiated_encoding_with_caching_headers(self):
+        url = '/static/' + self.hashed['css/site.css']
+        with open(os.path.join(self.root, self.hashed['css/site.css']), 'rb') as f:
+            css = f.read()
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response['Content-Encoding'], response['Content-Type']), ('br', 'text/css'))
+        self.assertEqual(static_assets.brotli.decompress(b''.join(response.streaming_content)), css)
+        self.assertEqual(response['Cache-Control'], static_assets.IMMUTABLE)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response = self.client.get(url)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), css)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        response = self.client.get('/static/css/site.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(self.client.get('/static/css/missing.css').status_code, 404)
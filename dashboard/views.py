@@ -1,85 +1,55 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
 
-from .models import HomePage, PortalPage, Course, Enrollment, Grade, Transaction, LibraryItem, Event, FAQ
+from .models import PortalPage, Course, LibraryItem, Event, FAQ
 
 from django.contrib.admin.views.decorators import staff_member_required
-from django.contrib.auth.models import User  
-from django.db.models import Sum, Count
-from django.db.models import Q
-from .models import Profile
-from .forms import ProfileForm  
+from django.db.models.functions import Coalesce
+from .models import Profile, GradeStats, ImportRun, Job
+from .forms import ProfileForm, ImportForm
+from .read_models import StudentPortal, QUERY_BUDGETS
+from . import cache, documents, importer, instrumentation, jobs, library, response_cache, stats
+from .response_cache import cache_portal_tab
+from .conditional import conditional_page
+from .instrumentation import query_budget
 
 
 
 # Home page view
+@query_budget(5)
+@conditional_page('home')
 def home(request):
-    home_page = HomePage.objects.first()
-    pages = PortalPage.objects.all()
+    home_page = cache.home_page()
+    pages = cache.portal_nav_pages()
     return render(request, 'dashboard/home.html', {
         'home_page': home_page,
         'pages': pages
     })
 
 
+@query_budget(QUERY_BUDGETS)
 @login_required
+@conditional_page()
+@cache_portal_tab()
 def portal_page(request, page_key):
     page = get_object_or_404(PortalPage, page_key=page_key)
-    context = {'page': page}
+    context = {'page': page}  # Section content is loaded only if the template shows it
 
-    search_query = request.GET.get('search', '')
-
-    if page_key == "courses":
-        enrollments = Enrollment.objects.filter(student=request.user)
-        if search_query:
-            enrollments = enrollments.filter(course__name__icontains=search_query)
-        context['enrollments'] = enrollments
-        context['search_query'] = search_query
-
-    elif page_key == "grades":
-        grades = Grade.objects.filter(student=request.user)
-        if search_query:
-            grades = grades.filter(course__name__icontains=search_query)
-        context['grades'] = grades
-        context['search_query'] = search_query
-
-    elif page_key == "library":
-        library_items = LibraryItem.objects.all()
-        if search_query:
-            library_items = library_items.filter(
-                Q(title__icontains=search_query) | Q(author__icontains=search_query)
-            )
-        context['library_items'] = library_items
-        context['search_query'] = search_query
-
-    elif page_key == "finance":
-        transactions = Transaction.objects.filter(student=request.user)
-        if search_query:
-            transactions = transactions.filter(description__icontains=search_query)
-        context['transactions'] = transactions
-        context['search_query'] = search_query
-
-    elif page_key == "events":
-        events = Event.objects.all().order_by('date')
-        context['events'] = events
-
-    elif page_key == "profile":
-        profile, _ = Profile.objects.get_or_create(user=request.user)
-        context['profile'] = profile
-
-    elif page_key == "help":
-        faqs = FAQ.objects.all()
-        context['faqs'] = faqs
+    context.update(StudentPortal(request.user).tab_context(page_key, request.GET))
 
     return render(request, 'dashboard/page.html', context)
 
 
 # Portal landing page view
 @login_required
+@conditional_page('landing')
 def portal_landing(request):
-    pages = PortalPage.objects.all()
+    pages = cache.portal_nav_pages()
     return render(request, 'dashboard/portal_landing.html', {'pages': pages})
 
 
@@ -97,53 +67,104 @@ def register(request):
     return render(request, 'dashboard/register.html', {'form': form})
 
 
-@staff_member_required
-def admin_dashboard(request):
-    # Total counts
-    total_students = User.objects.count()
-    total_courses = Course.objects.count()
-    total_enrollments = Enrollment.objects.count()
-    total_transactions = Transaction.objects.count()
-
+def course_enrollment_counts():
     # Enrollments per course
-    courses = Course.objects.all()
-    for course in courses:
-        course.enrollment_count = Enrollment.objects.filter(course=course).count()
+    return list(Course.objects.only('name').annotate(
+        enrollment_count=Coalesce('stats__enrollment_count', 0)
+    ))
 
-    # Transaction totals
-    total_credit = Transaction.objects.filter(is_credit=True).aggregate(total=Sum('amount'))['total'] or 0
-    total_debit = Transaction.objects.filter(is_credit=False).aggregate(total=Sum('amount'))['total'] or 0
 
-    # Grades distribution
-    grade_distribution = Grade.objects.values('grade').annotate(count=Count('grade'))
-    grade_labels = [item['grade'] for item in grade_distribution]
-    grade_counts = [item['count'] for item in grade_distribution]
+def grade_distribution():
+    return list(GradeStats.objects.filter(count__gt=0))
 
-    context = {
-        'total_students': total_students,
-        'total_courses': total_courses,
-        'total_enrollments': total_enrollments,
-        'total_transactions': total_transactions,
+
+def admin_dashboard_context(snapshot, courses, grades):
+    return {
+        'total_students': snapshot.total_students,
+        'total_courses': snapshot.total_courses,
+        'total_enrollments': snapshot.total_enrollments,
+        'total_transactions': snapshot.total_transactions,
         'courses': courses,
-        'total_credit': total_credit,
-        'total_debit': total_debit,
-        'grade_labels': grade_labels,
-        'grade_counts': grade_counts,
+        'total_credit': snapshot.total_credit,
+        'total_debit': snapshot.total_debit,
+        'grade_labels': [item.grade for item in grades],
+        'grade_counts': [item.count for item in grades],
+        'stats_reconciled_at': snapshot.reconciled_at,
+        'response_cache': response_cache.responses.stats(),
     }
+
+
+@query_budget(6)
+@staff_member_required
+def admin_dashboard(request):
+    # All counters come from the incrementally maintained snapshot
+    context = admin_dashboard_context(stats.snapshot(), course_enrollment_counts(), grade_distribution())
     return render(request, 'dashboard/admin_dashboard.html', context)
 
 
 
+@staff_member_required
+def import_records(request):
+    if request.method == 'POST':
+        form = ImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            run = importer.queue_import(
+                form.cleaned_data['kind'], form.cleaned_data['file'],
+                dry_run=form.cleaned_data['dry_run'], resume=form.cleaned_data['resume'], user=request.user,
+            )
+            return redirect('dashboard:import_run', pk=run.pk)
+    else:
+        form = ImportForm()
+
+    return render(request, 'dashboard/import_records.html', {
+        'form': form,
+        'recent_runs': ImportRun.objects.select_related('started_by')[:10],
+    })
+
+
+@staff_member_required
+def import_run(request, pk):
+    run = get_object_or_404(ImportRun.objects.select_related('started_by'), pk=pk)
+    response = render(request, 'dashboard/import_run.html', {'run': run})
+    if run.status in ('queued', 'running'):
+        response['Refresh'] = '5'  # Poll until the worker is done
+    return response
+
+
+@staff_member_required
+def query_report(request):
+    if request.method == 'POST':
+        instrumentation.report.clear()
+        return redirect('dashboard:query_report')
+    return render(request, 'dashboard/query_report.html', {
+        'views': instrumentation.report.summary(),
+        'report_size': instrumentation.report.entries.maxlen,
+        'threshold': settings.PORTAL_REPEATED_QUERY_THRESHOLD,
+        'enabled': settings.PORTAL_QUERY_INSTRUMENTATION,
+        'sample_rate': settings.PORTAL_QUERY_SAMPLE_RATE,
+    })
+
+
+@staff_member_required
+def job_queue(request):
+    manual_tasks = sorted(name for name, task in jobs.registry.items() if task.manual)
+    if request.method == 'POST':
+        name = request.POST.get('task')
+        if name in manual_tasks:
+            jobs.enqueue(name, dedupe_key=f'manual:{name}')
+        return redirect('dashboard:job_queue')
+    return render(request, 'dashboard/job_queue.html', {
+        'tasks': jobs.queue_stats(),
+        'manual_tasks': manual_tasks,
+        'recent_failures': Job.objects.filter(status='failed').order_by('-finished_at')[:10],
+    })
+
+
+# Shadowed by portal/<page_key>/ in urls.py, which serves these tabs through portal_page
 @login_required
 def portal_courses(request):
-    enrollments = Enrollment.objects.filter(student=request.user).select_related('course')
-    search_query = request.GET.get('search', '')  
-
-    if search_query:
-        enrollments = enrollments.filter(
-            Q(course__name__icontains=search_query) |
-            Q(course__code__icontains=search_query)
-        )
+    search_query = request.GET.get('search', '')
+    enrollments = StudentPortal(request.user).enrollments(request.GET)
 
     context = {
         'enrollments': enrollments,
@@ -155,14 +176,8 @@ def portal_courses(request):
 
 @login_required
 def portal_grades(request):
-    grades = Grade.objects.filter(student=request.user).select_related('course')
     search_query = request.GET.get('search', '')  # Get search input from URL
-
-    if search_query:
-        grades = grades.filter(
-            Q(course__name__icontains=search_query) |
-            Q(course__code__icontains=search_query)
-        )
+    grades = StudentPortal(request.user).grades(request.GET)
 
     context = {
         'grades': grades,
@@ -174,17 +189,9 @@ def portal_grades(request):
 
 @login_required
 def portal_finance(request):
-    transactions = Transaction.objects.filter(student=request.user)
     search_query = request.GET.get('search', '')  # For description search
     type_filter = request.GET.get('type', '')    # For credit/debit filter
-
-    if search_query:
-        transactions = transactions.filter(description__icontains=search_query)
-
-    if type_filter == 'credit':
-        transactions = transactions.filter(is_credit=True)
-    elif type_filter == 'debit':
-        transactions = transactions.filter(is_credit=False)
+    transactions = StudentPortal(request.user).transactions(request.GET)
 
     context = {
         'transactions': transactions,
@@ -194,28 +201,19 @@ def portal_finance(request):
     return render(request, 'dashboard/portal_finance.html', context)
 @login_required
 def library_page(request):
-    items = LibraryItem.objects.all()
     search_query = request.GET.get('search', '')  # get search input
-
-    if search_query:
-        items = items.filter(
-            Q(title__icontains=search_query) |
-            Q(author__icontains=search_query)
-        )
+    items = StudentPortal(request.user).library_items(request.GET)
 
     context = {
         'items': items,
         'search_query': search_query,
     }
-    return render(request, 'dashboard/library.html', context)@login_required
+    return render(request, 'dashboard/library.html', context)
 
 @login_required
 def events_page(request):
     category_filter = request.GET.get('category', '')
-    events = Event.objects.all().order_by('date')
-
-    if category_filter:
-        events = events.filter(category=category_filter)
+    events = StudentPortal(request.user).events(request.GET)
 
     context = {
         'events': events,
@@ -231,7 +229,8 @@ def profile_view(request):
     if request.method == "POST":
         form = ProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
-            form.save()
+            if form.has_changed():  # Resubmitting the same values writes nothing
+                form.save()
             messages.success(request, "Profile updated successfully!")
             return redirect('profile')
     else:
@@ -239,21 +238,14 @@ def profile_view(request):
 
     return render(request, 'dashboard/profile.html', {'form': form})
 
+@query_budget(QUERY_BUDGETS['help'])
 @login_required
+@conditional_page('help')
 def help_page(request):
     page = get_object_or_404(PortalPage, page_key='help')
     search_query = request.GET.get('search', '')
     category_filter = request.GET.get('category', '')
-    
-    faqs = FAQ.objects.all()
-
-    if search_query:
-        faqs = faqs.filter(
-            Q(question__icontains=search_query) |
-            Q(answer__icontains=search_query)
-        )
-    if category_filter:
-        faqs = faqs.filter(category=category_filter)
+    faqs = StudentPortal(request.user).faqs(request.GET)
 
     context = {
         'page': page,
@@ -272,9 +264,36 @@ def edit_profile(request):
     if request.method == 'POST':
         form = ProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
-            form.save()
+            if form.has_changed():
+                form.save()
             return redirect('dashboard:portal_page', page_key='profile')
     else:
         form = ProfileForm(instance=profile)
 
-    return render(request, 'dashboard/edit_profile.html', {'form': form})
\ No newline at end of file
+    return render(request, 'dashboard/edit_profile.html', {'form': form})
+
+
+@login_required
+def document_download(request, kind):
+    if kind not in documents.TEMPLATES:
+        raise Http404
+    # Posting retries a failed render
+    document = documents.request_document(kind, request.user, retry=request.method == 'POST')
+    if request.method == 'POST':
+        return redirect('dashboard:document', kind=kind)
+    if document.status == 'ready':
+        return FileResponse(default_storage.open(document.path), as_attachment=True,
+                            filename=f'{kind}-{request.user.username}.pdf', content_type='application/pdf')
+
+    response = render(request, 'dashboard/document_status.html', {
+        'document': document,
+        'title': document.get_kind_display(),
+    }, status=202)
+    if document.status == 'pending':
+        response['Refresh'] = '3'  # Poll until the worker has stored it
+    return response
+
+
+@login_required
+def library_pdf(request, pk):
+    return library.pdf_response(request, get_object_or_404(LibraryItem, pk=pk))
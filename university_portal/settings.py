@@ -65,10 +65,14 @@ TINYMCE_DEFAULT_CONFIG = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'dashboard.static_assets.StaticFilesMiddleware',
+    'dashboard.compression.CompressionMiddleware',
+    'dashboard.profiling.ProfilerMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'dashboard.instrumentation.QueryInstrumentationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -100,13 +104,40 @@ WSGI_APPLICATION = 'university_portal.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DATABASE_URL picks the database, e.g. postgres://portal:secret@db:5432/portal
+# in production; without it the SQLite file next to manage.py is used.
+# Connections are kept open across requests for PORTAL_DB_CONN_MAX_AGE
+# seconds (0 closes them after every request) and checked before reuse.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': dj_database_url.config(
+        default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
+        conn_max_age=int(os.environ.get('PORTAL_DB_CONN_MAX_AGE', 600)),
+        conn_health_checks=True,
+    ),
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # WAL lets pages be read while another process writes, and
+    # synchronous=NORMAL is safe with it. Transactions start IMMEDIATE, so
+    # concurrent writers (several gunicorn workers releasing grades) queue
+    # for the write lock for up to ``timeout`` seconds (SQLite's
+    # busy_timeout) rather than fail with "database is locked" when a read
+    # turns into a write. mmap_size reads the file through memory mapping.
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA mmap_size=268435456',
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    }
+elif os.environ.get('PORTAL_DB_POOL', '').lower() in ('1', 'true', 'yes'):
+    # A connection pool per process instead of persistent connections (the
+    # two cannot be combined). Needs psycopg 3 with its pool,
+    # pip install "psycopg[binary,pool]"; psycopg2 has no pool.
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': 2,
+        'max_size': int(os.environ.get('PORTAL_DB_POOL_SIZE', 10)),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -147,9 +178,81 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [ BASE_DIR / "static",]
 # STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Hashed file names plus Brotli and gzip copies, written by collectstatic
+# (dashboard/static_assets.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'dashboard.static_assets.CompressedManifestStorage'},
+}
+
+# Serve STATIC_ROOT from the app with far-future caching of hashed files;
+# turn off where the front-end server maps STATIC_URL itself. Files asked
+# for by their plain name may be cached for PORTAL_STATIC_MAX_AGE seconds.
+PORTAL_SERVE_STATIC = os.environ.get('PORTAL_SERVE_STATIC', '1').lower() in ('1', 'true', 'yes')
+PORTAL_STATIC_MAX_AGE = int(os.environ.get('PORTAL_STATIC_MAX_AGE', 60))
+
+# Brotli/gzip compression of dynamic responses (dashboard/compression.py):
+# smaller bodies are not worth the extra round of CPU work
+PORTAL_COMPRESS_MIN_SIZE = int(os.environ.get('PORTAL_COMPRESS_MIN_SIZE', 512))
+PORTAL_BROTLI_QUALITY = int(os.environ.get('PORTAL_BROTLI_QUALITY', 5))
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Version stamps shared by all worker processes for the in-memory caches
+# (dashboard/cache.py). Must be on a filesystem every worker can see.
+PORTAL_CACHE_DIR = os.environ.get('PORTAL_CACHE_DIR', os.path.join(BASE_DIR, 'var', 'cache'))
+
+# Initial passwords of provisioned rosters wait here, in files readable by
+# the app's user alone, until a superuser downloads them (once); never in
+# the database. Files not taken within PORTAL_CREDENTIALS_MAX_AGE seconds
+# are deleted. Keep it outside MEDIA_ROOT and every served directory.
+PORTAL_CREDENTIALS_DIR = os.environ.get('PORTAL_CREDENTIALS_DIR', os.path.join(BASE_DIR, 'var', 'credentials'))
+PORTAL_CREDENTIALS_MAX_AGE = int(os.environ.get('PORTAL_CREDENTIALS_MAX_AGE', 7 * 24 * 3600))
+
+# Upper bound on the rendered portal tabs each worker keeps in memory
+# (dashboard/response_cache.py).
+PORTAL_RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('PORTAL_RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# Release identifier mixed into page ETags (dashboard/conditional.py) so a
+# deploy that changes templates invalidates what browsers hold.
+PORTAL_RELEASE = os.environ.get('PORTAL_RELEASE', '')
+
+# Serve the read-only portal and admin views from dashboard/async_views.py.
+# Only worthwhile under an ASGI server (university_portal.asgi).
+PORTAL_ASYNC_VIEWS = os.environ.get('PORTAL_ASYNC_VIEWS', '').lower() in ('1', 'true', 'yes')
+
+# Let async views run independent queries on separate connections at once
+# (dashboard/concurrency.py); each in-flight query holds a connection.
+PORTAL_CONCURRENT_QUERIES = os.environ.get('PORTAL_CONCURRENT_QUERIES', '1').lower() in ('1', 'true', 'yes')
+
+# Per-request SQL instrumentation (dashboard/instrumentation.py), on with
+# DEBUG unless set: it adds a stack walk to every query, so in production turn
+# it on where needed and inspect only a share of requests (0 to 1). Views over
+# their query budget are logged, or fail with PORTAL_QUERY_BUDGET_MODE=raise;
+# a query shape repeated this many times from one place is reported as an N+1.
+PORTAL_QUERY_INSTRUMENTATION = (
+    os.environ.get('PORTAL_QUERY_INSTRUMENTATION', '1' if DEBUG else '').lower() in ('1', 'true', 'yes')
+)
+PORTAL_QUERY_SAMPLE_RATE = float(os.environ.get('PORTAL_QUERY_SAMPLE_RATE', 1))
+PORTAL_QUERY_BUDGET_MODE = os.environ.get('PORTAL_QUERY_BUDGET_MODE', 'log')
+PORTAL_REPEATED_QUERY_THRESHOLD = int(os.environ.get('PORTAL_REPEATED_QUERY_THRESHOLD', 5))
+PORTAL_QUERY_REPORT_SIZE = int(os.environ.get('PORTAL_QUERY_REPORT_SIZE', 500))
+
+# Job queue (dashboard/jobs.py): seconds before the first retry of a failed
+# job (doubling after each attempt), seconds a job may run before its worker
+# is assumed lost, and days succeeded jobs are kept.
+PORTAL_JOB_RETRY_DELAY = int(os.environ.get('PORTAL_JOB_RETRY_DELAY', 10))
+PORTAL_JOB_TIMEOUT = int(os.environ.get('PORTAL_JOB_TIMEOUT', 600))
+PORTAL_JOB_RETENTION_DAYS = int(os.environ.get('PORTAL_JOB_RETENTION_DAYS', 7))
+
+# Hand library PDF downloads (dashboard/library.py) to the front-end server:
+# 'x-accel-redirect' for nginx, with an internal location at
+# PORTAL_SENDFILE_PREFIX aliased to MEDIA_ROOT, or 'x-sendfile' for Apache
+# (mod_xsendfile) and lighttpd. Empty streams them from Django.
+PORTAL_SENDFILE = os.environ.get('PORTAL_SENDFILE', '').lower()
+PORTAL_SENDFILE_PREFIX = os.environ.get('PORTAL_SENDFILE_PREFIX', '/protected-media/')
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -21,10 +21,13 @@ from dashboard import views
 from django.conf import settings
 from django.conf.urls.static import static
 
+# Read-only dashboard pages come from the async module when serving through ASGI
+dashboard_urls = 'dashboard.async_urls' if settings.PORTAL_ASYNC_VIEWS else 'dashboard.urls'
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('tinymce/', include('tinymce.urls')),
-    path('', include('dashboard.urls', namespace='dashboard')),
+    path('', include(dashboard_urls, namespace='dashboard')),
    
 ]
 